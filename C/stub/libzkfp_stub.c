@@ -0,0 +1,276 @@
+/**
+*	@file		libzkfp_stub.c
+*	@brief		Stand-in for the libzkfp matcher API (no device, no real algorithm).
+*
+*	Exports the DB-cache / match / base64 symbols used by Python/Version2/zkfp.py
+*	so the in-process matcher can run on Linux without the ZKTeco SDK.
+*	Device calls report no reader attached (use capture_service.py --simulate).
+*
+*	Score = percentage of equal bytes at the same offset (0..100), so identical
+*	templates score 100 and unrelated ones score low.
+*
+*	Build:
+*		gcc -shared -fPIC -O2 -o libzkfp.so C/stub/libzkfp_stub.c
+*/
+
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef _WIN32
+#define ZKINTERFACE __declspec(dllexport)
+#define APICALL __stdcall
+#else
+#define ZKINTERFACE __attribute__((visibility("default")))
+#define APICALL
+#endif
+
+#define MAX_TEMPLATE_SIZE	2048
+#define STUB_THRESHOLD		60
+
+#define ZKFP_ERR_OK				0
+#define ZKFP_ERR_NO_DEVICE		-3
+#define ZKFP_ERR_NOT_SUPPORT	-4
+#define ZKFP_ERR_INVALID_PARAM	-5
+#define ZKFP_ERR_INVALID_HANDLE	-7
+#define ZKFP_ERR_MEMORY_NOT_ENOUGH	-11
+#define ZKFP_ERR_DEL_FINGER		-14
+#define ZKFP_ERR_FAIL			-17
+
+typedef struct _Entry
+{
+	unsigned int	fid;
+	unsigned int	size;
+	unsigned char	data[MAX_TEMPLATE_SIZE];
+	struct _Entry*	next;
+} Entry;
+
+typedef struct _Cache
+{
+	Entry*			head;
+	unsigned int	count;
+	int				threshold;
+} Cache;
+
+static int score_of(const unsigned char* a, unsigned int na, const unsigned char* b, unsigned int nb)
+{
+	unsigned int i, n = na < nb ? na : nb, m = na > nb ? na : nb, same = 0;
+	if (m == 0)
+		return 0;
+	for (i = 0; i < n; i++)
+		if (a[i] == b[i])
+			same++;
+	return (int)(same * 100 / m);
+}
+
+ZKINTERFACE int APICALL ZKFPM_Init() { return ZKFP_ERR_OK; }
+ZKINTERFACE int APICALL ZKFPM_Terminate() { return ZKFP_ERR_OK; }
+
+/* ── Device: none attached ──────────────────────────────────── */
+ZKINTERFACE int APICALL ZKFPM_GetDeviceCount() { return 0; }
+ZKINTERFACE void* APICALL ZKFPM_OpenDevice(int index) { return NULL; }
+ZKINTERFACE int APICALL ZKFPM_CloseDevice(void* h) { return ZKFP_ERR_INVALID_HANDLE; }
+ZKINTERFACE int APICALL ZKFPM_GetParameters(void* h, int code, unsigned char* value, unsigned int* cb) { return ZKFP_ERR_NO_DEVICE; }
+ZKINTERFACE int APICALL ZKFPM_AcquireFingerprint(void* h, unsigned char* img, unsigned int cbImg, unsigned char* tpl, unsigned int* cbTpl) { return ZKFP_ERR_NO_DEVICE; }
+
+ZKINTERFACE void* APICALL ZKFPM_DBInit()
+{
+	Cache* c = (Cache*)calloc(1, sizeof(Cache));
+	if (c)
+		c->threshold = STUB_THRESHOLD;
+	return c;
+}
+ZKINTERFACE void* APICALL ZKFPM_CreateDBCache() { return ZKFPM_DBInit(); }
+
+ZKINTERFACE int APICALL ZKFPM_DBClear(void* h)
+{
+	Cache* c = (Cache*)h;
+	Entry* e;
+	if (!c)
+		return ZKFP_ERR_INVALID_HANDLE;
+	while ((e = c->head) != NULL)
+	{
+		c->head = e->next;
+		free(e);
+	}
+	c->count = 0;
+	return ZKFP_ERR_OK;
+}
+ZKINTERFACE int APICALL ZKFPM_ClearDBCache(void* h) { return ZKFPM_DBClear(h); }
+
+ZKINTERFACE int APICALL ZKFPM_DBFree(void* h)
+{
+	if (!h)
+		return ZKFP_ERR_INVALID_HANDLE;
+	ZKFPM_DBClear(h);
+	free(h);
+	return ZKFP_ERR_OK;
+}
+ZKINTERFACE int APICALL ZKFPM_CloseDBCache(void* h) { return ZKFPM_DBFree(h); }
+
+ZKINTERFACE int APICALL ZKFPM_DBSetParameter(void* h, int code, unsigned char* value, unsigned int cb)
+{
+	Cache* c = (Cache*)h;
+	if (!c || !value || cb < sizeof(int))
+		return ZKFP_ERR_INVALID_PARAM;
+	if (code == 1 || code == 2)
+		memcpy(&c->threshold, value, sizeof(int));
+	return ZKFP_ERR_OK;
+}
+
+ZKINTERFACE int APICALL ZKFPM_DBDel(void* h, unsigned int fid)
+{
+	Cache* c = (Cache*)h;
+	Entry **pp, *e;
+	if (!c)
+		return ZKFP_ERR_INVALID_HANDLE;
+	for (pp = &c->head; (e = *pp) != NULL; pp = &e->next)
+	{
+		if (e->fid == fid)
+		{
+			*pp = e->next;
+			free(e);
+			c->count--;
+			return ZKFP_ERR_OK;
+		}
+	}
+	return ZKFP_ERR_DEL_FINGER;
+}
+ZKINTERFACE int APICALL ZKFPM_DelRegTemplateFromDBCache(void* h, unsigned int fid) { return ZKFPM_DBDel(h, fid); }
+
+ZKINTERFACE int APICALL ZKFPM_DBAdd(void* h, unsigned int fid, unsigned char* tpl, unsigned int cb)
+{
+	Cache* c = (Cache*)h;
+	Entry* e;
+	if (!c)
+		return ZKFP_ERR_INVALID_HANDLE;
+	if (!tpl || cb == 0 || cb > MAX_TEMPLATE_SIZE)
+		return ZKFP_ERR_INVALID_PARAM;
+	ZKFPM_DBDel(h, fid);
+	e = (Entry*)calloc(1, sizeof(Entry));
+	if (!e)
+		return ZKFP_ERR_MEMORY_NOT_ENOUGH;
+	e->fid  = fid;
+	e->size = cb;
+	memcpy(e->data, tpl, cb);
+	e->next = c->head;
+	c->head = e;
+	c->count++;
+	return ZKFP_ERR_OK;
+}
+ZKINTERFACE int APICALL ZKFPM_AddRegTemplateToDBCache(void* h, unsigned int fid, unsigned char* tpl, unsigned int cb) { return ZKFPM_DBAdd(h, fid, tpl, cb); }
+
+ZKINTERFACE int APICALL ZKFPM_DBCount(void* h, unsigned int* count)
+{
+	Cache* c = (Cache*)h;
+	if (!c || !count)
+		return ZKFP_ERR_INVALID_PARAM;
+	*count = c->count;
+	return ZKFP_ERR_OK;
+}
+ZKINTERFACE int APICALL ZKFPM_GetDBCacheCount(void* h, unsigned int* count) { return ZKFPM_DBCount(h, count); }
+
+ZKINTERFACE int APICALL ZKFPM_DBIdentify(void* h, unsigned char* tpl, unsigned int cb, unsigned int* fid, unsigned int* score)
+{
+	Cache* c = (Cache*)h;
+	Entry* e;
+	int best = -1, s;
+	if (!c)
+		return ZKFP_ERR_INVALID_HANDLE;
+	if (!tpl || !fid || !score)
+		return ZKFP_ERR_INVALID_PARAM;
+	for (e = c->head; e != NULL; e = e->next)
+	{
+		s = score_of(tpl, cb, e->data, e->size);
+		if (s > best)
+		{
+			best   = s;
+			*fid   = e->fid;
+			*score = (unsigned int)s;
+		}
+	}
+	return best >= c->threshold ? ZKFP_ERR_OK : ZKFP_ERR_FAIL;
+}
+ZKINTERFACE int APICALL ZKFPM_Identify(void* h, unsigned char* tpl, unsigned int cb, unsigned int* fid, unsigned int* score) { return ZKFPM_DBIdentify(h, tpl, cb, fid, score); }
+
+ZKINTERFACE int APICALL ZKFPM_DBMatch(void* h, unsigned char* t1, unsigned int cb1, unsigned char* t2, unsigned int cb2)
+{
+	if (!t1 || !t2)
+		return ZKFP_ERR_INVALID_PARAM;
+	return score_of(t1, cb1, t2, cb2);
+}
+ZKINTERFACE int APICALL ZKFPM_MatchFinger(void* h, unsigned char* t1, unsigned int cb1, unsigned char* t2, unsigned int cb2) { return ZKFPM_DBMatch(h, t1, cb1, t2, cb2); }
+
+ZKINTERFACE int APICALL ZKFPM_DBMerge(void* h, unsigned char* t1, unsigned char* t2, unsigned char* t3, unsigned char* reg, unsigned int* cbReg)
+{
+	return ZKFP_ERR_NOT_SUPPORT;	/* template sizes are not passed in, nothing sensible to merge */
+}
+ZKINTERFACE int APICALL ZKFPM_GenRegTemplate(void* h, unsigned char* t1, unsigned char* t2, unsigned char* t3, unsigned char* reg, unsigned int* cbReg) { return ZKFPM_DBMerge(h, t1, t2, t3, reg, cbReg); }
+
+ZKINTERFACE int APICALL ZKFPM_VerifyByID(void* h, unsigned int fid, unsigned char* tpl, unsigned int cb)
+{
+	Cache* c = (Cache*)h;
+	Entry* e;
+	if (!c)
+		return ZKFP_ERR_INVALID_HANDLE;
+	for (e = c->head; e != NULL; e = e->next)
+		if (e->fid == fid)
+			return score_of(tpl, cb, e->data, e->size);
+	return ZKFP_ERR_INVALID_PARAM;
+}
+
+/* ── Base64 ─────────────────────────────────────────────────── */
+static const char B64[] = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+
+static int b64_value(char ch)
+{
+	const char* p;
+	if (ch == '\0')
+		return -1;
+	p = strchr(B64, ch);
+	return p ? (int)(p - B64) : -1;
+}
+
+ZKINTERFACE int APICALL ZKFPM_Base64ToBlob(const char* src, unsigned char* blob, unsigned int cbBlob)
+{
+	unsigned int n = 0, bits = 0, acc = 0;
+	int v;
+	if (!src || !blob)
+		return ZKFP_ERR_INVALID_PARAM;
+	for (; *src && *src != '='; src++)
+	{
+		if ((v = b64_value(*src)) < 0)
+			return ZKFP_ERR_INVALID_PARAM;
+		acc = (acc << 6) | (unsigned int)v;
+		bits += 6;
+		if (bits >= 8)
+		{
+			bits -= 8;
+			if (n >= cbBlob)
+				return ZKFP_ERR_MEMORY_NOT_ENOUGH;
+			blob[n++] = (unsigned char)((acc >> bits) & 0xFF);
+		}
+	}
+	return (int)n;
+}
+
+ZKINTERFACE int APICALL ZKFPM_BlobToBase64(const unsigned char* src, unsigned int cbSrc, char* out, unsigned int cbOut)
+{
+	unsigned int i, n = 0, need = (cbSrc + 2) / 3 * 4 + 1;
+	unsigned long v;
+	if (!src || !out)
+		return ZKFP_ERR_INVALID_PARAM;
+	if (cbOut < need)
+		return ZKFP_ERR_MEMORY_NOT_ENOUGH;
+	for (i = 0; i < cbSrc; i += 3)
+	{
+		v = (unsigned long)src[i] << 16;
+		if (i + 1 < cbSrc) v |= (unsigned long)src[i + 1] << 8;
+		if (i + 2 < cbSrc) v |= src[i + 2];
+		out[n++] = B64[(v >> 18) & 63];
+		out[n++] = B64[(v >> 12) & 63];
+		out[n++] = i + 1 < cbSrc ? B64[(v >> 6) & 63] : '=';
+		out[n++] = i + 2 < cbSrc ? B64[v & 63] : '=';
+	}
+	out[n] = '\0';
+	return (int)n;
+}
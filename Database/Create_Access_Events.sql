@@ -0,0 +1,31 @@
+-- Access event log (one row per verify attempt), partitioned by month.
+-- Monthly partitions are created ahead of time and old ones dropped by
+-- Python/Version2/access_log.py (the app runs it at start-up and daily).
+CREATE TABLE IF NOT EXISTS access_events (
+    id          BIGSERIAL,
+    occurred_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    station     VARCHAR(64),
+    mode        VARCHAR(16) NOT NULL,      -- identify | verify | kiosk
+    result      VARCHAR(16) NOT NULL,      -- match | no_match | inconclusive | no_capture | error
+    user_id     VARCHAR(50),
+    fid         INTEGER,
+    score       SMALLINT,                  -- best score, also on a miss
+    capture_ms  REAL,
+    search_ms   REAL,
+    total_ms    REAL,
+    comparisons INTEGER,
+    coverage    REAL,
+    error       TEXT,
+    PRIMARY KEY (occurred_at, id)
+) PARTITION BY RANGE (occurred_at);
+
+-- history page: newest first, keyset on (occurred_at, id); per-user lookups.
+-- The user filter is a prefix LIKE, which a plain btree serves only under the
+-- C collation — varchar_pattern_ops works with any.
+DROP INDEX IF EXISTS access_events_user_idx;
+CREATE INDEX IF NOT EXISTS access_events_user_prefix_idx
+    ON access_events (user_id varchar_pattern_ops, occurred_at);
+
+-- catches rows outside every monthly partition so an INSERT never fails;
+-- keep it empty by running access_log.py at least monthly
+CREATE TABLE IF NOT EXISTS access_events_default PARTITION OF access_events DEFAULT;
@@ -0,0 +1,7 @@
+-- Trigram index for the RECORDS page search (user_id ILIKE '%text%').
+-- Run once on existing databases; needs the pg_trgm contrib extension.
+-- CONCURRENTLY keeps the table writable while the index builds (run it
+-- outside a transaction block).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS fingerprints_user_id_trgm_idx
+    ON fingerprints USING gin (user_id gin_trgm_ops);
@@ -3,5 +3,22 @@ CREATE TABLE fingerprints (
     user_id VARCHAR(50) NOT NULL,
     template BYTEA NOT NULL,
     template_size INTEGER NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    template_hash BYTEA,
+    template_format SMALLINT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
 );
+
+-- template_format: 0 = base64 text as bytes (legacy), 1 = raw template bytes
+-- template_hash:   sha256 of the raw template (format 1 rows)
+CREATE INDEX fingerprints_template_hash_idx ON fingerprints (template_hash);
+
+-- RECORDS page search: user_id ILIKE '%text%'
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX fingerprints_user_id_trgm_idx ON fingerprints USING gin (user_id gin_trgm_ops);
+
+-- RECORDS page incremental refresh: updated_at trigger + delete tombstones
+-- \i Track_Record_Changes.sql
+
+-- Cross-kiosk gallery sync: NOTIFY fingerprints_changed on every change
+-- \i Notify_Fingerprint_Changes.sql
@@ -0,0 +1,6 @@
+-- Raw template storage (run once on existing databases).
+-- New rows are written as raw bytes by the app; existing base64 rows keep
+-- working and can be converted with Python/Version2/migrate_templates.py.
+ALTER TABLE fingerprints ADD COLUMN IF NOT EXISTS template_hash BYTEA;
+ALTER TABLE fingerprints ADD COLUMN IF NOT EXISTS template_format SMALLINT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS fingerprints_template_hash_idx ON fingerprints (template_hash);
@@ -0,0 +1,21 @@
+-- Cross-kiosk gallery sync (run once): every INSERT / DELETE, and every
+-- UPDATE of the matching columns, sends
+--     NOTIFY fingerprints_changed, '<I|U|D>:<id>:<seq>'
+-- seq comes from fingerprints_change_seq, so a listener that sees a number
+-- skipped knows it missed a change and reloads its gallery.  (A rolled-back
+-- transaction also leaves a hole — that costs one unnecessary reload.)
+CREATE SEQUENCE IF NOT EXISTS fingerprints_change_seq;
+
+CREATE OR REPLACE FUNCTION fingerprints_notify() RETURNS trigger AS $$
+DECLARE
+    row_id INTEGER := CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END;
+BEGIN
+    PERFORM pg_notify('fingerprints_changed',
+                      left(TG_OP, 1) || ':' || row_id || ':' || nextval('fingerprints_change_seq'));
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fingerprints_notify ON fingerprints;
+CREATE TRIGGER fingerprints_notify
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, template, template_format ON fingerprints
+    FOR EACH ROW EXECUTE FUNCTION fingerprints_notify();
@@ -0,0 +1,39 @@
+-- Change tracking for the RECORDS page's incremental refresh (run once).
+--   updated_at             bumped on every UPDATE; new rows get now()
+--   fingerprints_deleted   tombstone per deleted row (id, user_id), read as
+--                          "deleted since"; user_id lets a filtered view tell
+--                          whether the row was one of its matches
+ALTER TABLE fingerprints ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS fingerprints_updated_at_idx ON fingerprints (updated_at);
+
+CREATE TABLE IF NOT EXISTS fingerprints_deleted (
+    id         INTEGER PRIMARY KEY,
+    user_id    VARCHAR(50),
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE INDEX IF NOT EXISTS fingerprints_deleted_at_idx ON fingerprints_deleted (deleted_at);
+
+CREATE OR REPLACE FUNCTION fingerprints_touch() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fingerprints_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO fingerprints_deleted (id, user_id) VALUES (OLD.id, OLD.user_id)
+        ON CONFLICT (id) DO UPDATE SET user_id = EXCLUDED.user_id, deleted_at = now();
+    RETURN OLD;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fingerprints_touch ON fingerprints;
+CREATE TRIGGER fingerprints_touch BEFORE UPDATE ON fingerprints
+    FOR EACH ROW EXECUTE FUNCTION fingerprints_touch();
+
+DROP TRIGGER IF EXISTS fingerprints_tombstone ON fingerprints;
+CREATE TRIGGER fingerprints_tombstone AFTER DELETE ON fingerprints
+    FOR EACH ROW EXECUTE FUNCTION fingerprints_tombstone();
+
+-- tombstones only need to outlive the longest time a RECORDS page stays
+-- open; prune them now and then:
+--   DELETE FROM fingerprints_deleted WHERE deleted_at < now() - interval '30 days';
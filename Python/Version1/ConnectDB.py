@@ -1,14 +1,44 @@
 import psycopg2
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_connection():
+# One connection per process, reused by every get_connection() call instead
+# of a new TCP + auth handshake per scan.  It is checked before being handed
+# out and reopened when the server went away (restart / failover).
+_conn = None
+_lock = threading.Lock()
+
+
+def _connect():
     return psycopg2.connect(
         host=os.getenv("DB_HOST"),
         database=os.getenv("DB_NAME"),
         user=os.getenv("DB_USER"),
         password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT")
-    )
\ No newline at end of file
+        port=os.getenv("DB_PORT"),
+        connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+    )
+
+
+def _alive(conn):
+    if conn is None or conn.closed:
+        return False
+    try:
+        conn.rollback()                 # drop anything the last caller left open
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def get_connection():
+    global _conn
+    with _lock:
+        if not _alive(_conn):
+            _conn = _connect()
+        return _conn
@@ -46,6 +46,6 @@ VALUES (%s, %s, %s)
 
 conn.commit()
 cur.close()
-conn.close()
+# the connection is shared (ConnectDB) — left open for the next caller
 
 print("Saved to DB ✔")
\ No newline at end of file
@@ -1,4 +1,5 @@
 import subprocess
+import base64
 import re
 import time
 from ConnectDB import get_connection
@@ -55,7 +56,7 @@ try:
             conn = get_connection()
             cur = conn.cursor()
 
-            cur.execute("SELECT user_id, template FROM fingerprints")
+            cur.execute("SELECT user_id, template, template_format FROM fingerprints")
             rows = cur.fetchall()
 
         except Exception as db_error:
@@ -68,9 +69,13 @@ try:
         # ---------- compare ----------
         matched = False
 
-        for user_id, db_template in rows:
+        for user_id, db_template, fmt in rows:
 
-            db_b64 = bytes(db_template).decode()
+            # template_format 1 = raw bytes (Version2), 0 = base64 text
+            if fmt == 1:
+                db_b64 = base64.b64encode(bytes(db_template)).decode()
+            else:
+                db_b64 = bytes(db_template).decode()
 
             compare = subprocess.run(
                 ["Application/compare.exe", scan_template, db_b64],
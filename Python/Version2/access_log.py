@@ -0,0 +1,210 @@
+"""
+access_log.py
+─────────────
+Audit trail of every verify attempt in access_events (Database/Create_Access_Events.sql).
+
+Rows are written through the write-behind queue (db_writer.WriteBehind), so
+logging never waits on PostgreSQL:
+
+    WRITER.register(access_log.TABLE)
+    WRITER.submit("access_events", access_log.event("identify", res, capture_ms, search_ms))
+
+access_events is range-partitioned by month on occurred_at
+(access_events_y2025m06, ...):
+
+    ensure_partitions(conn)     create this month's and the next months' partitions
+    drop_expired(conn, days)    DROP whole months older than the retention — no
+                                row-by-row DELETE, no table bloat
+    page(conn, since, until, ...)
+                                one page of history, newest first, keyset-paged on
+                                (occurred_at, id) so page 100 costs what page 1 does
+
+    python access_log.py                       # maintenance: partitions + retention
+    python access_log.py --retention-days 90
+"""
+
+import argparse, os, re, socket
+from datetime import datetime, timezone
+
+from db_writer import Table
+
+COLUMNS = ("occurred_at", "station", "mode", "result", "user_id", "fid", "score",
+           "capture_ms", "search_ms", "total_ms", "comparisons", "coverage", "error")
+
+TABLE   = Table("access_events", COLUMNS, returning=None)
+STATION = os.getenv("ACCESS_STATION") or socket.gethostname()
+
+PARTITION = re.compile(r"^access_events_y(\d{4})m(\d{2})$")
+
+
+def event(mode, res=None, capture_ms=None, search_ms=None, total_ms=None, error=None):
+    """WRITER payload for one attempt.
+
+    mode    "identify" | "verify" (claimed id) | "kiosk"
+    res     matcher.IdentifyResult, or None when no finger was captured / on error
+    """
+    if error is not None:
+        result = "error"
+    elif res is None:
+        result = "no_capture"
+    else:
+        result = res.status
+    best  = res.best  if res is not None else None       # score kept on a miss too
+    match = res.match if res is not None else None
+    return {
+        "occurred_at": datetime.now(timezone.utc).isoformat(),
+        "station":     STATION,
+        "mode":        mode,
+        "result":      result,
+        "user_id":     match[1] if match else None,
+        "fid":         match[0] if match else None,
+        "score":       best[2] if best else None,
+        "capture_ms":  _ms(capture_ms),
+        "search_ms":   _ms(search_ms),
+        "total_ms":    _ms(total_ms),
+        "comparisons": res.comparisons if res is not None else None,
+        "coverage":    round(res.coverage, 4) if res is not None else None,
+        "error":       error,
+    }
+
+
+def _ms(v):
+    return None if v is None else round(v, 1)
+
+
+# ══════════════════════════════════════════════════════════════
+# PARTITIONS
+# ══════════════════════════════════════════════════════════════
+def _month(year, month, add=0):
+    n = year * 12 + (month - 1) + add
+    return n // 12, n % 12 + 1
+
+
+def ensure_partitions(conn, months_ahead=2, now=None):
+    """Create the partitions for this month and `months_ahead` more → names created.
+
+    Rows that already landed in access_events_default for such a month (no
+    maintenance ran in time) are moved into the new partition — PostgreSQL
+    refuses to create it while the default partition holds rows in range."""
+    now = now or datetime.now(timezone.utc)
+    made = []
+    with conn.cursor() as cur:
+        for i in range(months_ahead + 1):
+            y, m   = _month(now.year, now.month, i)
+            ny, nm = _month(y, m, 1)
+            name   = f"access_events_y{y:04d}m{m:02d}"
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0] is not None:
+                continue
+            lo, hi = f"{y:04d}-{m:02d}-01", f"{ny:04d}-{nm:02d}-01"
+            cur.execute("SELECT EXISTS (SELECT 1 FROM access_events_default "
+                        "WHERE occurred_at >= %s AND occurred_at < %s)", (lo, hi))
+            if cur.fetchone()[0]:
+                cur.execute(f"CREATE TABLE {name} (LIKE access_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                cur.execute(f"WITH moved AS (DELETE FROM access_events_default "
+                            f"WHERE occurred_at >= %s AND occurred_at < %s RETURNING *) "
+                            f"INSERT INTO {name} SELECT * FROM moved", (lo, hi))
+                cur.execute(f"ALTER TABLE access_events ATTACH PARTITION {name} "
+                            f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+            else:
+                cur.execute(f"CREATE TABLE {name} PARTITION OF access_events "
+                            f"FOR VALUES FROM ('{lo}') TO ('{hi}')")
+            made.append(name)
+    conn.commit()
+    return made
+
+
+def partitions(conn):
+    """[(name, first day of its month)] oldest first; the DEFAULT partition is skipped."""
+    with conn.cursor() as cur:
+        cur.execute("""SELECT c.relname FROM pg_inherits i
+                         JOIN pg_class c ON c.oid = i.inhrelid
+                        WHERE i.inhparent = 'access_events'::regclass""")
+        names = [r[0] for r in cur.fetchall()]
+    out = []
+    for name in names:
+        m = PARTITION.match(name)
+        if m:
+            out.append((name, datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=timezone.utc)))
+    return sorted(out, key=lambda p: p[1])
+
+
+def drop_expired(conn, keep_days, now=None):
+    """Drop every monthly partition that ends before now - keep_days → names dropped."""
+    now    = now or datetime.now(timezone.utc)
+    cutoff = now.timestamp() - keep_days * 86400
+    gone   = []
+    for name, start in partitions(conn):
+        ny, nm = _month(start.year, start.month, 1)
+        if datetime(ny, nm, 1, tzinfo=timezone.utc).timestamp() > cutoff:
+            break
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE access_events DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+        conn.commit()
+        gone.append(name)
+    return gone
+
+
+def maintain(conn, months_ahead=2, keep_days=None):
+    """Partitions ahead + retention (ACCESS_RETENTION_DAYS, 0 = keep all)."""
+    if keep_days is None:
+        keep_days = int(os.getenv("ACCESS_RETENTION_DAYS", "365"))
+    made = ensure_partitions(conn, months_ahead)
+    gone = drop_expired(conn, keep_days) if keep_days > 0 else []
+    return made, gone
+
+
+# ══════════════════════════════════════════════════════════════
+# QUERY
+# ══════════════════════════════════════════════════════════════
+PAGE_COLUMNS = ("id", "occurred_at", "station", "mode", "result", "user_id", "score",
+                "capture_ms", "search_ms", "total_ms")
+
+
+def page(conn, since, until, after=None, user=None, result=None, limit=100):
+    """One page of events in [since, until), newest first.
+
+    after   (occurred_at, id) of the last row of the previous page, or None
+    user    user_id prefix filter;  result  exact result filter
+    Returns rows as PAGE_COLUMNS tuples; the next page starts after rows[-1].
+    """
+    where, args = ["occurred_at >= %s", "occurred_at < %s"], [since, until]
+    if after is not None:
+        where.append("(occurred_at, id) < (%s, %s)")
+        args += list(after)
+    if user:
+        where.append("user_id LIKE %s")
+        args.append(user.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if result:
+        where.append("result = %s")
+        args.append(result)
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT {', '.join(PAGE_COLUMNS)} FROM access_events "
+                    f"WHERE {' AND '.join(where)} "
+                    f"ORDER BY occurred_at DESC, id DESC LIMIT %s", args + [limit])
+        return cur.fetchall()
+
+
+def main():
+    from dotenv import load_dotenv
+    from db_pool import ConnectionPool
+    load_dotenv()
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--months-ahead",   type=int, default=2)
+    ap.add_argument("--retention-days", type=int, default=None,
+                    help="default ACCESS_RETENTION_DAYS (365); 0 keeps everything")
+    args = ap.parse_args()
+    pool = ConnectionPool.from_env()        # DB_CONNECT_TIMEOUT: never hangs on a dead host
+    conn = pool.getconn()
+    try:
+        made, gone = maintain(conn, args.months_ahead, args.retention_days)
+    finally:
+        conn.close()
+        pool.close()
+    print("created:", ", ".join(made) or "—")
+    print("dropped:", ", ".join(gone) or "—")
+
+
+if __name__ == "__main__":
+    main()
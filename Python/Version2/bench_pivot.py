@@ -0,0 +1,86 @@
+"""
+bench_pivot.py
+──────────────
+Recall vs. speedup of the pivot index (pivot_index.py) on the real gallery.
+
+    python bench_pivot.py                                  # gallery templates as probes
+    python bench_pivot.py --probes probes.tsv              # user_id<TAB>base64 per line
+    python bench_pivot.py --pivots 4 8 16 --shortlist 16 32 64 --limit 200
+
+Without --probes every probe is a template already in the gallery, so recall is
+an upper bound; use a second capture per user (probes.tsv) for realistic numbers.
+
+For each (pivots, shortlist) pair it reports:
+    recall    probes whose true user_id is inside the shortlist
+    compares  pivots + shortlist per query, vs. N for a full scan
+    speedup   N / compares
+    rank ms   time to score the pivots and rank the gallery
+"""
+
+import argparse, time
+from dotenv import load_dotenv
+
+from db_pool import ConnectionPool
+from gallery import TemplateGallery
+from matcher import make_matcher
+from pivot_index import PivotIndex
+
+load_dotenv()
+
+
+def load_probes(path, entries, limit):
+    if path:
+        probes = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if "\t" in line:
+                    uid, tpl = line.rstrip("\n").split("\t", 1)
+                    probes.append((uid, tpl.strip()))
+    else:
+        probes = [(uid, tpl) for _, uid, tpl in entries]
+    return probes[:limit] if limit else probes
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pivots",    type=int, nargs="+", default=[8])
+    ap.add_argument("--shortlist", type=int, nargs="+", default=[16, 32, 64])
+    ap.add_argument("--probes",    help="TSV file: user_id<TAB>base64 template")
+    ap.add_argument("--limit",     type=int, default=100, help="max probes (0 = all)")
+    args = ap.parse_args()
+
+    pool    = ConnectionPool.from_env()
+    gallery = TemplateGallery(pool.getconn)
+    matcher = make_matcher(gallery)
+    entries = gallery.entries()
+    probes  = load_probes(args.probes, entries, args.limit)
+    n       = len(entries)
+    print(f"gallery N={n}  probes={len(probes)}  matcher={type(matcher).__name__}\n")
+    print(f"{'pivots':>6} {'shortlist':>9} {'recall':>8} {'compares':>9} {'speedup':>8} {'rank ms':>8} {'build s':>8}")
+
+    try:
+        for p in args.pivots:
+            index = PivotIndex(matcher, gallery, pivots=p)
+            t0 = time.perf_counter()
+            index.build(entries)
+            build_s = time.perf_counter() - t0
+            for k in args.shortlist:
+                index.shortlist = k
+                hits, rank_ms = 0, 0.0
+                for uid, tpl in probes:
+                    t0 = time.perf_counter()
+                    head, _ = index.split(tpl, entries)
+                    rank_ms += (time.perf_counter() - t0) * 1000
+                    hits += any(e[1] == uid for e in head)
+                cost = index.query_cost
+                print(f"{index.pivot_count:>6} {k:>9} {hits / max(1, len(probes)):>8.1%} "
+                      f"{cost:>9} {n / max(1, cost):>7.1f}x {rank_ms / max(1, len(probes)):>8.1f} "
+                      f"{build_s:>8.1f}")
+            index.close()
+    finally:
+        matcher.close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
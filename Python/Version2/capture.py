@@ -0,0 +1,423 @@
+"""
+capture.py
+──────────
+Fingerprint capture for the GUI workers.
+
+    CaptureDaemon   client for capture_service.py — reader stays open between
+                    scans, watchdog restarts the service when it hangs
+    ExeCapture      one Application/verify.exe / save.exe run per scan, stdout
+                    parsed as it streams
+
+Both expose the same interface:
+
+    capture.capture(mode="verify" | "enroll", timeout=15, on_event=None)
+        -> base64 template, or None when no finger arrived within `timeout`
+    capture.close()
+
+Failures raise CaptureError with a `stage` (spawn / exit / service) so the
+GUI can say what went wrong instead of printing a raw exception.
+
+CAPTURE_MODE selects the implementation (make_capture):
+    daemon     (default) capture_service.py, falls back to ExeCapture on error
+    simulate   capture_service.py --simulate — no reader needed
+    exe        ExeCapture only
+"""
+
+import os, queue, re, subprocess, sys, threading, time
+from collections import deque
+
+from matcher import read_frame, write_frame
+
+SERVICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "capture_service.py")
+CAPTURE_TIMEOUT = 15.0
+
+
+class CaptureError(Exception):
+    """stage: "spawn" (exe could not start), "exit" (exe failed without a
+    template), "service" (capture_service.py unavailable), "device" (the
+    service answered with an error)."""
+
+    STAGES = {
+        "spawn":   "เปิดโปรแกรมสแกนไม่ได้",
+        "exit":    "โปรแกรมสแกนทำงานผิดพลาด",
+        "service": "capture service ไม่ตอบสนอง",
+        "device":  "เครื่องอ่านแจ้งข้อผิดพลาด",
+    }
+
+    def __init__(self, message, stage="service", code=None):
+        super().__init__(message)
+        self.stage = stage
+        self.code  = code
+
+    def describe(self):
+        """One line for the UI."""
+        head = self.STAGES.get(self.stage, "capture error")
+        code = f" (code {self.code})" if self.code is not None else ""
+        return f"{head}{code}: {self}"
+
+
+def is_base64(s):
+    return re.fullmatch(r'[A-Za-z0-9+/=]+', s) is not None
+
+
+def is_template_line(line):
+    return len(line) > 100 and is_base64(line)
+
+
+def extract_template(output):
+    """Last template line of a finished exe's whole output."""
+    for line in reversed(output.strip().splitlines()):
+        if is_template_line(line.strip()):
+            return line.strip()
+    return None
+
+
+# ══════════════════════════════════════════════════════════════
+# EXE CAPTURE — one process per scan, stdout read as it streams
+# ══════════════════════════════════════════════════════════════
+class ExeCapture:
+    """Runs save.exe / verify.exe and returns the first template line as soon
+    as it is printed.  The child's teardown (SDK close, device release) is
+    left to a background reaper, which kills it after REAP_TIMEOUT.
+
+    Stages and their timeouts:
+        spawn     Popen fails                      → CaptureError("spawn")
+        capture   no template within `timeout`     → None (child killed)
+        exit      child ends without a template    → None, or CaptureError("exit")
+                                                     when the exit code is non-zero
+        reap      REAP_TIMEOUT after the template  → child killed
+    """
+
+    EXE          = {"verify": "Application/verify.exe", "enroll": "Application/save.exe"}
+    REAP_TIMEOUT = 3.0
+
+    def __init__(self):
+        self._lock     = threading.Lock()
+        self._children = set()
+
+    def capture(self, mode="verify", timeout=CAPTURE_TIMEOUT, on_event=None):
+        exe = self.EXE[mode]
+        try:
+            proc = subprocess.Popen(
+                [exe], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, bufsize=1,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except OSError as e:
+            raise CaptureError(f"{exe}: {e}", stage="spawn")
+        with self._lock:
+            self._children.add(proc)
+        lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(proc.stdout, lines), daemon=True).start()
+
+        deadline = time.monotonic() + timeout
+        tail     = deque(maxlen=3)               # last non-template lines, for errors
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self._reap(proc, 0)             # no finger in time
+                return None
+            try:
+                line = lines.get(timeout=left)
+            except queue.Empty:
+                continue
+            if line is None:
+                break
+            line = line.strip()
+            if is_template_line(line):
+                self._reap(proc, self.REAP_TIMEOUT)
+                return line
+            if line:
+                tail.append(line)
+
+        try:
+            code = proc.wait(timeout=self.REAP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self._reap(proc, 0)
+            code = None
+        with self._lock:
+            self._children.discard(proc)
+        if code:
+            raise CaptureError(" / ".join(tail) or f"{exe} exited", stage="exit", code=code)
+        return None
+
+    @staticmethod
+    def _pump(stream, lines):
+        try:
+            for line in stream:
+                lines.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            lines.put(None)
+
+    def _reap(self, proc, grace):
+        """Wait up to `grace` s for the child in the background, then kill it."""
+        def reap():
+            try:
+                proc.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            finally:
+                with self._lock:
+                    self._children.discard(proc)
+        if grace <= 0:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        threading.Thread(target=reap, daemon=True).start()
+
+    def cancel(self):
+        with self._lock:
+            children = list(self._children)
+        for proc in children:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def close(self):
+        self.cancel()
+
+
+# ══════════════════════════════════════════════════════════════
+# CAPTURE DAEMON — resident reader
+# ══════════════════════════════════════════════════════════════
+class CaptureDaemon:
+    """Client for capture_service.py.
+
+    The service is started on first use and keeps the device handle open.
+    A watchdog thread pings it every WATCHDOG_INTERVAL seconds; if it does
+    not answer, or its device loop has been silent for HANG_AFTER seconds,
+    the process is killed and restarted.  A capture interrupted that way is
+    retried once within what is left of its timeout, then handed to
+    `fallback` (if any).  When the service cannot start (no reader / SDK)
+    captures go straight to `fallback` for START_RETRY seconds before the
+    next attempt.
+
+    stream(callback) delivers every finger placed on the reader while no
+    capture() is running — callback(template_b64) runs on the reader thread.
+    """
+
+    WATCHDOG_INTERVAL = 5.0
+    HANG_AFTER        = 5.0
+    GRACE             = 5.0      # extra seconds to wait beyond a capture's own timeout
+    START_RETRY       = 60.0     # seconds before a failed start is tried again
+
+    def __init__(self, simulate=False, fallback=None, cmd=None):
+        self._cmd        = cmd or [sys.executable, SERVICE] + (["--simulate"] if simulate else [])
+        self._fallback   = fallback
+        self._lock       = threading.Lock()
+        self._proc       = None
+        self._waiters    = {}          # request id -> (proc, queue of replies / events)
+        self._seq        = 0
+        self._stream_cb  = None
+        self._closed     = threading.Event()
+        self.device      = None
+        self.start_error = None
+        self._retry_at   = 0.0         # monotonic time the next start may be tried
+        self.restarts    = 0
+        threading.Thread(target=self._watchdog, daemon=True).start()
+
+    # ── Public API ────────────────────────────────────────────
+    def capture(self, mode="verify", timeout=CAPTURE_TIMEOUT, on_event=None):
+        deadline = time.monotonic() + timeout
+        for _ in (0, 1):                # one retry after a crash / watchdog restart
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return None
+            try:
+                reply = self._call({"op": "capture", "mode": mode, "timeout": left},
+                                   left + self.GRACE, on_event)
+                return reply.get("template")
+            except CaptureError as e:
+                if e.stage == "device":
+                    raise               # the service is fine; the reader said no
+                error = e
+                if self.start_error:    # no reader / SDK — restarting will not help
+                    break
+        if self._fallback is None:
+            raise error
+        print("capture service unavailable, using fallback:", error)
+        return self._fallback.capture(mode, max(1.0, deadline - time.monotonic()), on_event)
+
+    def cancel(self):
+        """Abort the capture in progress (it returns None)."""
+        try:
+            self._call({"op": "cancel"}, 2.0)
+        except CaptureError:
+            pass
+
+    def stream(self, callback):
+        """Push every captured template to callback; stream(None) stops."""
+        self._stream_cb = callback
+        self._call({"op": "stream", "on": callback is not None}, 5.0)
+
+    def ping(self):
+        try:
+            return self._call({"op": "ping"}, 2.0)
+        except CaptureError:
+            return None
+
+    def close(self):
+        self._closed.set()
+        with self._lock:
+            self._stop()
+        if self._fallback:
+            self._fallback.close()
+
+    # ── Process management (self._lock held) ──────────────────
+    def _start(self):
+        try:
+            self._proc = subprocess.Popen(
+                self._cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            )
+        except OSError as e:
+            self._start_failed(str(e))
+            raise CaptureError(str(e))
+        threading.Thread(target=self._reader, args=(self._proc,), daemon=True).start()
+        try:
+            self.device = self._wait(self._send({"op": "ping"}), 10.0)["device"]
+            if self._stream_cb is not None:     # reply not awaited — drop its waiter
+                self._waiters.pop(self._send({"op": "stream", "on": True}), None)
+        except CaptureError as e:
+            self._stop()
+            self._start_failed(str(e))
+            raise
+        self.start_error = None
+
+    def _start_failed(self, error):
+        self.start_error = error
+        self._retry_at   = time.monotonic() + self.START_RETRY
+
+    def _stop(self):
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=2)
+            except Exception:
+                pass
+        self._proc = None
+
+    def _ensure_started(self):
+        if self._proc is None and self.start_error and time.monotonic() < self._retry_at:
+            raise CaptureError(f"not started: {self.start_error}")
+        if self._proc is None or self._proc.poll() is not None:
+            if self._proc is not None or self._seq:
+                self.restarts += 1
+            self._stop()
+            self._start()
+
+    def _reader(self, proc):
+        while True:
+            try:
+                msg = read_frame(proc.stdout)
+            except Exception:
+                msg = None
+            if msg is None:
+                for owner, q in list(self._waiters.values()):
+                    if owner is proc:
+                        q.put(None)
+                return
+            waiter = self._waiters.get(msg.get("id"))
+            if waiter is not None:
+                waiter[1].put(msg)
+            elif msg.get("event") == "template" and self._stream_cb is not None:
+                try:
+                    self._stream_cb(msg["template"])
+                except Exception as e:
+                    print("capture stream callback error:", e)
+
+    # ── Request plumbing ──────────────────────────────────────
+    def _send(self, req):
+        """Write one request (self._lock held) → its request id."""
+        self._seq += 1
+        rid = self._seq
+        self._waiters[rid] = (self._proc, queue.Queue())
+        try:
+            write_frame(self._proc.stdin, dict(req, id=rid))
+        except (OSError, ValueError) as e:
+            self._waiters.pop(rid, None)
+            raise CaptureError(f"write failed: {e}")
+        return rid
+
+    def _wait(self, rid, timeout, on_event=None):
+        q        = self._waiters[rid][1]
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    raise CaptureError("no answer")
+                try:
+                    msg = q.get(timeout=left)
+                except queue.Empty:
+                    continue
+                if msg is None:
+                    raise CaptureError("process exited")
+                if "event" in msg:
+                    if on_event:
+                        on_event(msg)
+                    continue
+                if not msg.get("ok"):
+                    raise CaptureError(msg.get("error", "capture error"), stage="device")
+                return msg
+        finally:
+            self._waiters.pop(rid, None)
+
+    def _call(self, req, timeout, on_event=None):
+        with self._lock:
+            try:
+                self._ensure_started()
+                rid = self._send(req)
+            except OSError as e:
+                self._stop()
+                raise CaptureError(str(e))
+            proc = self._proc
+        try:
+            return self._wait(rid, timeout, on_event)
+        except CaptureError as e:
+            if e.stage == "service":        # no answer / process exited — treat as hung
+                with self._lock:
+                    if self._proc is proc:
+                        self._stop()
+            raise
+
+    # ── Watchdog ──────────────────────────────────────────────
+    def _watchdog(self):
+        while not self._closed.wait(self.WATCHDOG_INTERVAL):
+            with self._lock:
+                proc = self._proc
+                if proc is None or proc.poll() is not None:
+                    continue
+                try:
+                    rid = self._send({"op": "ping"})
+                except CaptureError:
+                    rid = None
+            try:
+                reply = self._wait(rid, 2.0) if rid else None
+            except CaptureError:
+                reply = None
+            if reply is not None and reply.get("beat_age", 0) < self.HANG_AFTER:
+                continue
+            print("capture service hung, restarting")
+            with self._lock:
+                if self._proc is proc:
+                    self._stop()
+                    if self._stream_cb is not None:
+                        try:
+                            self._ensure_started()
+                        except CaptureError as e:
+                            print("capture service restart failed:", e)
+
+
+def make_capture():
+    mode = os.getenv("CAPTURE_MODE", "daemon").lower()
+    if mode == "exe":
+        return ExeCapture()
+    if mode == "simulate":
+        return CaptureDaemon(simulate=True)
+    return CaptureDaemon(fallback=ExeCapture())
@@ -0,0 +1,252 @@
+"""
+capture_service.py
+──────────────────
+Resident capture process, started and supervised by capture.CaptureDaemon.
+
+Opens the reader once (ZKFPM_Init / ZKFPM_OpenDevice) and keeps it open, so a
+scan no longer pays the SDK start-up that every verify.exe / save.exe run did.
+Framed requests on stdin/stdout, same wire format as matcher_service.py:
+
+    ping                                -> {"device": "sdk" | "simulated",
+                                            "busy": bool, "beat_age": s}
+    capture  {"mode": "verify" | "enroll", "timeout": 15}
+                                        -> {"template": b64 | null}
+             enroll emits {"event": "press", "n": 1, "of": 3} per press
+    cancel                              abort the capture in progress
+    stream   {"on": true}               push {"event": "template", "template": b64}
+                                        for every finger while no capture runs
+
+`beat_age` is how long the device loop has been silent; the client's watchdog
+restarts the process when it stops beating.
+
+    python capture_service.py --simulate        # no reader needed
+"""
+
+import argparse, base64, os, queue, random, sys, threading, time
+
+from matcher import read_frame, write_frame
+
+POLL           = 0.1        # seconds between sensor polls (MFC demo: Sleep(100))
+ENROLL_PRESSES = 3          # ZKFPM_DBMerge takes three presses
+
+
+# ══════════════════════════════════════════════════════════════
+# DEVICES
+# ══════════════════════════════════════════════════════════════
+class SdkDevice:
+    name = "sdk"
+
+    def __init__(self, lib=None):
+        from zkfp import Device, DBCache
+        self._dev   = Device(lib=lib)
+        self._cache = DBCache(self._dev.lib)    # merge / match only
+
+    def begin(self):
+        pass
+
+    def acquire(self):
+        return self._dev.acquire()
+
+    def match(self, a, b):
+        return self._cache.match(a, b) or 0
+
+    def merge(self, *presses):
+        return self._cache.merge(*presses)
+
+    def close(self):
+        self._cache.close()
+        self._dev.close()
+
+
+class SimulatedDevice:
+    """Reader stand-in: a "finger" is placed `delay` s after each capture
+    starts and after every lift.  Templates come from CAPTURE_SIM_FILE (one
+    base64 template per line, e.g. exported from the fingerprints table) or
+    are random bytes."""
+
+    name = "simulated"
+
+    def __init__(self, source=None, delay=0.8, seed=None):
+        self._delay  = delay
+        self._rng    = random.Random(seed)
+        self._pool   = []
+        if source and os.path.exists(source):
+            with open(source, encoding="utf-8") as f:
+                self._pool = [base64.b64decode(l.strip()) for l in f if l.strip()]
+        self._finger = None
+        self._ready  = 0.0
+
+    def begin(self):
+        """New capture — a (possibly different) finger approaches the sensor."""
+        if self._pool:
+            self._finger = self._rng.choice(self._pool)
+        else:
+            self._finger = bytes(self._rng.randrange(256) for _ in range(512))
+        self._ready = time.monotonic() + self._delay
+
+    def acquire(self):
+        if self._finger is None:
+            self.begin()
+        if time.monotonic() < self._ready:
+            return None
+        self._ready = time.monotonic() + self._delay     # lifted; same finger comes back
+        return self._finger
+
+    def match(self, a, b):
+        return 100 if a == b else 0
+
+    def merge(self, *presses):
+        return presses[0]
+
+    def close(self):
+        pass
+
+
+def open_device(simulate=False):
+    if simulate:
+        return SimulatedDevice(os.getenv("CAPTURE_SIM_FILE"),
+                               delay=float(os.getenv("CAPTURE_SIM_DELAY", "0.8")))
+    return SdkDevice()
+
+
+# ══════════════════════════════════════════════════════════════
+# SERVICE
+# ══════════════════════════════════════════════════════════════
+class CaptureService:
+    def __init__(self, device, out):
+        self.device    = device
+        self._out      = out
+        self._wlock    = threading.Lock()
+        self._jobs     = queue.Queue()
+        self._cancel   = threading.Event()
+        self._stream   = False
+        self._busy     = False
+        self.beat      = time.monotonic()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def send(self, msg):
+        with self._wlock:
+            write_frame(self._out, msg)
+
+    def handle(self, req):
+        """Answers immediately, or returns None when the reply comes later."""
+        op = req.get("op")
+        if op == "ping":
+            return {"device": self.device.name, "busy": self._busy,
+                    "beat_age": round(time.monotonic() - self.beat, 3)}
+        if op == "capture":
+            if req.get("mode", "verify") not in ("verify", "enroll"):
+                raise ValueError(f"unknown mode {req.get('mode')!r}")
+            self._cancel.clear()
+            self._jobs.put(req)
+            return None
+        if op == "cancel":
+            self._cancel.set()
+            return {}
+        if op == "stream":
+            self._stream = bool(req.get("on"))
+            self._cancel.clear()
+            return {}
+        raise ValueError(f"unknown op {op!r}")
+
+    # ── Device loop ───────────────────────────────────────────
+    def _loop(self):
+        while True:
+            self.beat = time.monotonic()
+            try:
+                req = self._jobs.get(timeout=POLL)
+            except queue.Empty:
+                if self._stream:
+                    self._stream_once()
+                continue
+            self._busy = True
+            try:
+                reply = {"template": self._capture(req), "ok": True}
+            except Exception as e:
+                reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            finally:
+                self._busy = False
+            reply["id"] = req.get("id")
+            self.send(reply)
+
+    def _press(self, deadline):
+        """Next finger press as bytes, None on timeout / cancel."""
+        while not self._cancel.is_set() and time.monotonic() < deadline:
+            self.beat = time.monotonic()
+            blob = self.device.acquire()
+            if blob:
+                return blob
+            time.sleep(POLL)
+        return None
+
+    def _lift(self, deadline):
+        while time.monotonic() < deadline and not self._cancel.is_set():
+            self.beat = time.monotonic()
+            if not self.device.acquire():
+                return
+            time.sleep(POLL)
+
+    def _capture(self, req):
+        deadline = time.monotonic() + float(req.get("timeout", 15))
+        self.device.begin()
+        if req.get("mode") != "enroll":
+            blob = self._press(deadline)
+            return base64.b64encode(blob).decode() if blob else None
+        presses = []
+        while len(presses) < ENROLL_PRESSES:
+            blob = self._press(deadline)
+            if blob is None:
+                return None
+            if presses and self.device.match(presses[-1], blob) <= 0:
+                self.send({"id": req.get("id"), "event": "retry", "n": len(presses)})
+            else:
+                presses.append(blob)
+                self.send({"id": req.get("id"), "event": "press",
+                           "n": len(presses), "of": ENROLL_PRESSES})
+            if len(presses) < ENROLL_PRESSES:
+                self._lift(deadline)
+        return base64.b64encode(self.device.merge(*presses)).decode()
+
+    def _stream_once(self):
+        blob = self._press(time.monotonic() + POLL * 5)
+        if blob:
+            self.send({"id": None, "event": "template",
+                       "template": base64.b64encode(blob).decode()})
+            self._lift(time.monotonic() + 5.0)
+            self.device.begin()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--simulate", action="store_true", help="no reader: SimulatedDevice")
+    args = ap.parse_args()
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr         # stray prints must not corrupt the frame stream
+    try:
+        device = open_device(args.simulate)
+    except Exception as e:
+        device, failure = None, f"{type(e).__name__}: {e}"
+    service = CaptureService(device, stdout) if device else None
+    while True:
+        req = read_frame(stdin)
+        if req is None:
+            break
+        if service is None:         # keep answering so the client sees why
+            write_frame(stdout, {"id": req.get("id"), "ok": False, "error": failure})
+            continue
+        try:
+            reply = service.handle(req)
+            if reply is None:
+                continue
+            reply = dict(reply, ok=True)
+        except Exception as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        reply["id"] = req.get("id")
+        service.send(reply)
+    if device:
+        device.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+db_pool.py
+──────────
+Thread-safe PostgreSQL connection pool shared by the GUI and its workers.
+
+    pool = ConnectionPool.from_env()
+    with pool.connection() as conn:         # commit on success, rollback on error
+        ...
+    conn = pool.getconn()                   # old style: conn.close() hands it back
+
+Checkout hands out an idle connection, or opens a new one while fewer than
+`maxconn` exist (otherwise it waits up to `timeout` s).  A connection that
+has been idle for more than `validate_after` s is checked with SELECT 1
+first.  When that check fails the server has most likely gone away
+(restart / failover), so every idle connection is dropped and the ones in
+use are closed when they come back; new connections go to whatever DB_HOST
+now resolves to.  DB_HOST may list several hosts ("db1,db2") and
+DB_TARGET_SESSION_ATTRS=read-write makes libpq pick the current primary.
+
+The prober thread runs SELECT 1 every `probe_interval` s and reports
+(ok, latency_ms) to the on_status callbacks — StatusBar.set_db_status.
+"""
+
+import os, threading, time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolError(psycopg2.OperationalError):
+    """No connection became free within the checkout timeout."""
+
+
+class PooledConnection:
+    """psycopg2 connection whose close() returns it to the pool."""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+    def detach(self):
+        """Take the raw connection out of the wrapper without returning it."""
+        conn, self._conn = self._conn, None
+        return conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    def __init__(self, dsn, minconn=1, maxconn=8, timeout=10.0,
+                 validate_after=30.0, probe_interval=5.0):
+        self._dsn            = dsn
+        self.minconn         = minconn
+        self.maxconn         = max(minconn, maxconn)
+        self.timeout         = timeout
+        self.validate_after  = validate_after
+        self.probe_interval  = probe_interval
+        self._cond           = threading.Condition()
+        self._idle           = []        # [(conn, generation, returned_at)], most recent last
+        self._size           = 0         # idle + in use
+        self._gen            = 0         # bumped on failover; older connections are closed
+        self._owner          = {}        # id(conn) -> generation of connections in use
+        self._listeners      = []
+        self._closed         = False
+        self.ok              = None      # last probe result
+        self.latency_ms      = None
+        self.reconnects      = 0
+
+    @classmethod
+    def from_env(cls):
+        """DB_* connection settings plus DB_POOL_MIN (1), DB_POOL_MAX (8),
+        DB_POOL_TIMEOUT (10 s), DB_VALIDATE_AFTER (30 s), DB_PROBE_INTERVAL
+        (5 s, 0 = no prober), DB_CONNECT_TIMEOUT (5 s), DB_TARGET_SESSION_ATTRS."""
+        dsn = dict(
+            host=os.getenv("DB_HOST"),
+            database=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT"),
+            connect_timeout=int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+        )
+        if os.getenv("DB_TARGET_SESSION_ATTRS"):
+            dsn["target_session_attrs"] = os.getenv("DB_TARGET_SESSION_ATTRS")
+        return cls(
+            dsn,
+            minconn=int(os.getenv("DB_POOL_MIN", "1")),
+            maxconn=int(os.getenv("DB_POOL_MAX", "8")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+            validate_after=float(os.getenv("DB_VALIDATE_AFTER", "30")),
+            probe_interval=float(os.getenv("DB_PROBE_INTERVAL", "5")),
+        )
+
+    # ── Checkout / return ─────────────────────────────────────
+    def getconn(self):
+        """A live connection wrapped in PooledConnection; close() returns it."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        raise PoolError(f"no free connection after {self.timeout:g}s "
+                                        f"({self.maxconn} in use)")
+                    self._cond.wait(left)
+                if self._idle:
+                    conn, gen, since = self._idle.pop()
+                else:
+                    conn, gen, since = None, self._gen, None
+                    self._size += 1
+            if conn is None:
+                conn = self._open()
+            elif time.monotonic() - since > self.validate_after and not self._alive(conn):
+                self._failover(conn)
+                continue
+            with self._cond:
+                self._owner[id(conn)] = gen
+            return PooledConnection(self, conn)
+
+    def putconn(self, conn):
+        """Return a raw connection (PooledConnection.close() calls this)."""
+        if isinstance(conn, PooledConnection):
+            conn.close()
+            return
+        with self._cond:
+            gen = self._owner.pop(id(conn), None)
+        reusable = gen == self._gen and not self._closed and self._reset(conn)
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, gen, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not reusable:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: — commit on success, rollback on
+        error, returned to the pool either way."""
+        pc = self.getconn()
+        try:
+            yield pc
+            pc.commit()
+        except Exception:
+            try:
+                pc.rollback()
+            except psycopg2.Error:
+                pass
+            raise
+        finally:
+            pc.close()
+
+    def dedicated(self):
+        """A new connection outside the pool, for a session that has to stay
+        open (LISTEN).  TCP keepalives make a dead server show up as an error
+        instead of silence.  The caller closes it."""
+        return psycopg2.connect(keepalives=1, keepalives_idle=30, keepalives_interval=10,
+                                keepalives_count=3, **self._dsn)
+
+    # ── Connection state ──────────────────────────────────────
+    def _open(self):
+        try:
+            return psycopg2.connect(**self._dsn)
+        except psycopg2.Error:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    @staticmethod
+    def _alive(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _reset(conn):
+        """Roll back whatever the borrower left open → still usable?"""
+        if conn.closed:
+            return False
+        try:
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _failover(self, dead):
+        """A validation failed: drop this generation, reconnect lazily."""
+        with self._cond:
+            self._gen  += 1
+            stale       = [c for c, _, _ in self._idle] + [dead]
+            self._idle  = []
+            self._size -= len(stale)
+            self.reconnects += 1
+            self._cond.notify_all()
+        for conn in stale:
+            self._discard(conn)
+        print(f"database connection lost, reconnecting (dropped {len(stale)})")
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max": self.maxconn,
+                    "reconnects": self.reconnects, "latency_ms": self.latency_ms}
+
+    # ── Health prober ─────────────────────────────────────────
+    def on_status(self, fn):
+        """fn(ok, latency_ms) after every probe — called on the prober thread."""
+        self._listeners.append(fn)
+
+    def start_prober(self):
+        if self.probe_interval > 0:
+            threading.Thread(target=self._probe_loop, daemon=True).start()
+
+    def probe(self):
+        """SELECT 1 round trip on a pooled connection → (ok, latency_ms)."""
+        try:
+            pc = self.getconn()
+        except PoolError:
+            return self.ok, self.latency_ms      # busy, not down
+        except psycopg2.Error:
+            return False, None
+        try:
+            t0 = time.perf_counter()
+            with pc.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            latency = (time.perf_counter() - t0) * 1000.0
+            pc.rollback()
+            return True, latency
+        except psycopg2.Error:
+            conn = pc.detach()
+            with self._cond:
+                self._owner.pop(id(conn), None)
+            self._failover(conn)
+            return False, None
+        finally:
+            pc.close()
+
+    def _probe_loop(self):
+        while not self._closed:
+            ok, latency = self.probe()
+            if ok:
+                self._prefill()
+            self.ok, self.latency_ms = ok, latency
+            for fn in list(self._listeners):
+                try:
+                    fn(ok, latency)
+                except Exception as e:
+                    print("db status listener error:", e)
+            time.sleep(self.probe_interval)
+
+    def _prefill(self):
+        """Keep minconn connections open so the first action after idle
+        does not pay the handshake."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.minconn:
+                    return
+                self._size += 1
+                gen = self._gen
+            try:
+                conn = self._open()
+            except psycopg2.Error:
+                return
+            with self._cond:
+                self._idle.insert(0, (conn, gen, time.monotonic()))
+                self._cond.notify()
@@ -0,0 +1,224 @@
+"""
+db_writer.py
+────────────
+Write-behind INSERTs: the GUI thread queues a record and returns at once; a
+writer thread batches the queue into PostgreSQL.
+
+    writer = WriteBehind(POOL, "write_queue.db")
+    writer.register(Table("fingerprints", ("user_id", "template", ...), to_row=...))
+    writer.on_written(lambda kind, qid, db_id, payload: ...)
+    writer.on_failed(lambda kind, qid, error, payload: ...)
+    qid = writer.submit("fingerprints", {"user_id": "EMP-0042", ...})
+
+The queue is a local SQLite file, committed before submit() returns, so a
+record survives a DB outage and an application restart — whatever is still
+queued at start-up is written first.  Per batch (up to `batch` records of
+one table) the writer sends one multi-row INSERT ... VALUES ... RETURNING id:
+
+    connection errors   whole batch retried with backoff (1 s → max_backoff)
+    data errors         batch retried row by row; the bad record is kept in
+                        the queue file marked failed and reported once
+
+Delivery is at-least-once: a crash between the PostgreSQL commit and the
+queue-file delete writes that batch again on the next start.  Payloads are
+JSON; bytes values are stored as {"$b64": ...}.
+"""
+
+import base64, json, sqlite3, threading, time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+
+class Table:
+    """One insertable table: payload dict → row tuple in `columns` order."""
+
+    def __init__(self, name, columns, to_row=None, returning="id"):
+        self.name      = name
+        self.columns   = tuple(columns)
+        self.to_row    = to_row or (lambda p: tuple(p[c] for c in self.columns))
+        self.returning = returning
+
+    def insert(self, cur, rows):
+        """Multi-row INSERT → list of `returning` values (None when not set)."""
+        sql = f"INSERT INTO {self.name} ({', '.join(self.columns)}) VALUES %s"
+        if not self.returning:
+            execute_values(cur, sql, rows, page_size=len(rows))
+            return [None] * len(rows)
+        got = execute_values(cur, sql + f" RETURNING {self.returning}", rows,
+                             page_size=len(rows), fetch=True)
+        return [r[0] for r in got]
+
+
+def _dump(payload):
+    def enc(v):
+        if isinstance(v, (bytes, bytearray, memoryview)):
+            return {"$b64": base64.b64encode(bytes(v)).decode()}
+        raise TypeError(f"not serialisable: {type(v).__name__}")
+    return json.dumps(payload, default=enc)
+
+
+def _load(text):
+    def dec(d):
+        return base64.b64decode(d["$b64"]) if set(d) == {"$b64"} else d
+    return json.loads(text, object_hook=dec)
+
+
+class WriteBehind:
+    RETRYABLE = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+    def __init__(self, pool, path="write_queue.db", batch=200, linger=0.05, max_backoff=30.0):
+        self._pool        = pool
+        self._batch       = batch
+        self._linger      = linger          # s to wait for more records before a flush
+        self._max_backoff = max_backoff
+        self._tables      = {}
+        self._written_cb  = []
+        self._failed_cb   = []
+        self._lock        = threading.Lock()
+        self._wake        = threading.Event()
+        self._stop        = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS queue (
+                                id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                                kind     TEXT NOT NULL,
+                                payload  TEXT NOT NULL,
+                                queued   REAL NOT NULL,
+                                attempts INTEGER NOT NULL DEFAULT 0,
+                                error    TEXT)""")
+        self.last_error = None
+        self._thread    = None
+
+    # ── Setup ─────────────────────────────────────────────────
+    def register(self, table):
+        self._tables[table.name] = table
+
+    def on_written(self, fn):
+        """fn(kind, queue_id, db_id, payload) — called on the writer thread."""
+        self._written_cb.append(fn)
+
+    def on_failed(self, fn):
+        """fn(kind, queue_id, error, payload) — a record the DB rejected."""
+        self._failed_cb.append(fn)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            self._wake.set()            # records left over from the last run
+
+    # ── Producer side ─────────────────────────────────────────
+    def submit(self, kind, payload):
+        """Queue one record durably → queue id.  Never touches PostgreSQL."""
+        if kind not in self._tables:
+            raise KeyError(f"unknown table {kind!r}")
+        with self._lock:
+            cur = self._db.execute("INSERT INTO queue (kind, payload, queued) VALUES (?, ?, ?)",
+                                   (kind, _dump(payload), time.time()))
+        self._wake.set()
+        return cur.lastrowid
+
+    def pending(self):
+        """Records not yet written (failed ones excluded)."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM queue WHERE error IS NULL").fetchone()[0]
+
+    def failed(self):
+        """[(queue id, kind, error)] records the DB rejected."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, kind, error FROM queue WHERE error IS NOT NULL ORDER BY id").fetchall()
+
+    def flush(self, timeout=None):
+        """Block until the queue is empty (or timeout) → True when drained."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._wake.set()
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=5.0):
+        """Give the writer `timeout` s to drain, then stop.  Whatever is left
+        stays in the queue file for the next start."""
+        if self._thread is not None:
+            self.flush(timeout)
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout=2.0)
+        with self._lock:
+            self._db.close()
+
+    # ── Writer thread ─────────────────────────────────────────
+    def _next_batch(self):
+        with self._lock:
+            head = self._db.execute(
+                "SELECT kind FROM queue WHERE error IS NULL ORDER BY id LIMIT 1").fetchone()
+            if head is None:
+                return None, []
+            rows = self._db.execute(
+                "SELECT id, payload FROM queue WHERE error IS NULL AND kind = ? ORDER BY id LIMIT ?",
+                (head[0], self._batch)).fetchall()
+        return head[0], [(qid, _load(text)) for qid, text in rows]
+
+    def _run(self):
+        backoff = min(1.0, self._max_backoff)
+        while not self._stop.is_set():
+            kind, batch = self._next_batch()
+            if not batch:
+                self._wake.wait()
+                self._wake.clear()
+                if self._linger:
+                    time.sleep(self._linger)        # let a burst accumulate
+                continue
+            try:
+                self._write(self._tables[kind], batch)
+                backoff, self.last_error = min(1.0, self._max_backoff), None
+            except self.RETRYABLE as e:
+                self.last_error = str(e).strip()
+                self._bump([qid for qid, _ in batch])
+                print(f"write-behind: {len(batch)} {kind} queued, retry in {backoff:.0f}s:", self.last_error)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+            except Exception:
+                for item in batch:          # isolate the record the DB rejects
+                    try:
+                        self._write(self._tables[kind], [item])
+                    except self.RETRYABLE:
+                        break               # outage mid-way — next loop retries
+                    except Exception as e:
+                        self._reject(kind, item, e)
+
+    def _write(self, table, batch):
+        rows = [table.to_row(p) for _, p in batch]
+        with self._pool.connection() as conn, conn.cursor() as cur:
+            ids = table.insert(cur, rows)
+        with self._lock:
+            self._db.executemany("DELETE FROM queue WHERE id = ?", [(qid,) for qid, _ in batch])
+        for (qid, payload), db_id in zip(batch, ids):
+            self._emit(self._written_cb, table.name, qid, db_id, payload)
+
+    def _bump(self, qids):
+        with self._lock:
+            self._db.executemany("UPDATE queue SET attempts = attempts + 1 WHERE id = ?",
+                                 [(q,) for q in qids])
+
+    def _reject(self, kind, item, error):
+        qid, payload = item
+        msg = str(error).strip()
+        with self._lock:
+            self._db.execute("UPDATE queue SET error = ?, attempts = attempts + 1 WHERE id = ?",
+                             (msg, qid))
+        print(f"write-behind: {kind} #{qid} rejected:", msg)
+        self._emit(self._failed_cb, kind, qid, msg, payload)
+
+    @staticmethod
+    def _emit(callbacks, *args):
+        for fn in list(callbacks):
+            try:
+                fn(*args)
+            except Exception as e:
+                print("write-behind callback error:", e)
@@ -1,16 +1,25 @@
+import time
+T_START = time.perf_counter()           # cold-start clock (StartupClock)
+
 from custom_dialog import Dialog
-import sys, re, subprocess, os, time
-from datetime import datetime
+from capture import make_capture, CaptureError
+from gallery import TemplateGallery, HitStats, encode_template, TEMPLATE_RAW
+from matcher import make_matcher, SearchPolicy, MatcherError
+from pivot_index import PivotIndex
+from search import GallerySearch
+from zkfp import ZKFPError
+import sys, os, math, queue, threading, hashlib, sqlite3, importlib, traceback
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-import psycopg2
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QStackedWidget, QFrame, QMessageBox,
     QGraphicsDropShadowEffect, QSizePolicy, QTableWidget, QTableWidgetItem,
-    QHeaderView, QAbstractItemView, QSpacerItem, QGridLayout, QScrollArea
+    QHeaderView, QAbstractItemView, QSpacerItem, QGridLayout, QScrollArea, QTableView
 )
 from PyQt5.QtCore import (
-    Qt, QThread, pyqtSignal, QTimer, QSize, QRect, QPoint,
+    Qt, QThread, pyqtSignal, QTimer, QSize, QRect, QPoint, QAbstractTableModel, QModelIndex,
     QPropertyAnimation, QEasingCurve, QSequentialAnimationGroup, QParallelAnimationGroup
 )
 from PyQt5.QtGui import (
@@ -21,6 +30,78 @@ from PyQt5.QtGui import (
 
 load_dotenv()
 
+
+# ══════════════════════════════════════════════════════════════
+# STARTUP
+# ══════════════════════════════════════════════════════════════
+class Lazy:
+    """Module-level service or module created on first attribute access.
+
+    The window is on screen before psycopg2, the pool, the write-behind
+    queue, the change listener and the matcher exist; code keeps using
+    POOL.connection(), psycopg2.Error, ... unchanged."""
+
+    def __init__(self, factory):
+        self._lazy_factory = factory
+        self._lazy_obj     = None
+        self._lazy_lock    = threading.RLock()
+
+    def _lazy_get(self):
+        if self._lazy_obj is None:
+            with self._lazy_lock:
+                if self._lazy_obj is None:
+                    self._lazy_obj = self._lazy_factory()
+        return self._lazy_obj
+
+    def _lazy_built(self):
+        return self._lazy_obj is not None
+
+    def __getattr__(self, name):
+        return getattr(self._lazy_get(), name)
+
+
+class StartupClock:
+    """Cold-start timing from the first line of this module to the first
+    frame on screen, printed once and shown in the footer.
+    STARTUP_PROFILE=1 also runs cProfile over main() up to the first frame."""
+
+    def __init__(self, t0):
+        self.t0       = t0
+        self.marks    = []
+        self.total_ms = None
+        self._prof    = None
+
+    def mark(self, stage):
+        self.marks.append((stage, time.perf_counter()))
+
+    def profile(self):
+        if os.getenv("STARTUP_PROFILE", "0") == "1":
+            import cProfile
+            self._prof = cProfile.Profile()
+            self._prof.enable()
+
+    def late(self, stage):
+        """A stage finished after the first frame (background services)."""
+        print(f"startup: {stage} ready {(time.perf_counter() - self.t0) * 1000:.0f} ms")
+
+    def report(self):
+        if self.total_ms is not None:
+            return self.total_ms
+        parts, prev = [], self.t0
+        for stage, t in self.marks:
+            parts.append(f"{stage} {(t - prev) * 1000:.0f}")
+            prev = t
+        self.total_ms = (prev - self.t0) * 1000
+        print(f"startup: {' · '.join(parts)} = {self.total_ms:.0f} ms")
+        if self._prof is not None:
+            import pstats
+            self._prof.disable()
+            pstats.Stats(self._prof).sort_stats("cumulative").print_stats(25)
+        return self.total_ms
+
+STARTUP = StartupClock(T_START)
+STARTUP.mark("imports")
+
 # ══════════════════════════════════════════════════════════════
 # PALETTE — Clean Light
 # ══════════════════════════════════════════════════════════════
@@ -58,168 +139,803 @@ FONT_UI   = "Segoe UI"
 # ══════════════════════════════════════════════════════════════
 # DATABASE
 # ══════════════════════════════════════════════════════════════
-def get_connection():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST"),
-        database=os.getenv("DB_NAME"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        port=os.getenv("DB_PORT"),
-    )
+# The DB layer is imported and built on first use — after the first frame
+psycopg2   = Lazy(lambda: importlib.import_module("psycopg2"))
+access_log = Lazy(lambda: importlib.import_module("access_log"))
+
+def _make_pool():
+    from db_pool import ConnectionPool
+    return ConnectionPool.from_env()
 
-def is_base64(s):
-    return re.fullmatch(r'[A-Za-z0-9+/=]+', s) is not None
+# One pool for every page and worker (DB_POOL_MIN / DB_POOL_MAX, see db_pool.py)
+POOL = Lazy(_make_pool)
+DB_SLOW_MS = float(os.getenv("DB_SLOW_MS", "200"))     # probe latency shown amber above this
 
-def extract_template(output):
-    for line in reversed(output.strip().splitlines()):
-        l = line.strip()
-        if len(l) > 100 and is_base64(l):
-            return l
-    return None
+def get_connection():
+    """Pooled connection — close() returns it to POOL."""
+    return POOL.getconn()
+
+def fingerprint_row(p):
+    """WRITER payload {"user_id", "template": b64} → fingerprints row."""
+    raw, digest = encode_template(p["template"])
+    return (p["user_id"], psycopg2.Binary(raw), len(raw), psycopg2.Binary(digest), TEMPLATE_RAW)
+
+def _add_to_gallery(kind, qid, fid, p):
+    if kind == "fingerprints":          # searchable once it has its DB id
+        GALLERY.add(fid, p["user_id"], p["template"])
+
+def _make_writer():
+    from db_writer import WriteBehind, Table
+    writer = WriteBehind(POOL, os.getenv("WRITE_QUEUE_PATH", "write_queue.db"),
+                         batch=int(os.getenv("WRITE_BATCH", "200")))
+    writer.register(Table("fingerprints",
+                          ("user_id", "template", "template_size", "template_hash", "template_format"),
+                          to_row=fingerprint_row))
+    writer.register(access_log.TABLE)
+    writer.on_written(_add_to_gallery)
+    return writer
+
+# INSERTs leave the GUI thread: queued in a local file, batched by a writer thread
+WRITER = Lazy(_make_writer)
+
+def maintain_access_log():
+    """Monthly access_events partitions ahead + retention; run off the GUI thread."""
+    try:
+        with POOL.connection() as conn:
+            made, gone = access_log.maintain(conn)
+        if made or gone:
+            print("access_events partitions created:", made, "dropped:", gone)
+    except psycopg2.Error as e:
+        print("access_events maintenance skipped:", str(e).strip())
+
+def maintain_access_log_loop():
+    """maintain_access_log() at start-up and then every ACCESS_MAINTAIN_HOURS
+    (24) — a kiosk that stays up for months keeps getting partitions ahead
+    instead of filling access_events_default."""
+    hours = float(os.getenv("ACCESS_MAINTAIN_HOURS", "24"))
+    while True:
+        maintain_access_log()
+        time.sleep(hours * 3600)
+
+# Process-wide template cache — loaded once, kept in sync by RegisterPage.
+# HitStats puts frequent / recent users at the front of the search order.
+# GALLERY_SNAPSHOT: memory-mapped copy for instant start / DB outages ("" = off)
+GALLERY = TemplateGallery(get_connection,
+                          stats=HitStats(os.getenv("HIT_STATS_PATH", "hit_stats.json")),
+                          snapshot=os.getenv("GALLERY_SNAPSHOT", "gallery.snap") or None)
+
+def sync_gallery():
+    """Reload GALLERY from the database off the GUI thread (joins a load in
+    flight).  On failure whatever is loaded (the snapshot) stays in use."""
+    try:
+        GALLERY.refresh()
+    except psycopg2.Error as e:
+        print("gallery sync skipped:", str(e).strip())
+
+def prefetch_gallery():
+    """Start-up: snapshot first (no DB), then the database in the background."""
+    GALLERY.load_snapshot()
+    sync_gallery()
+
+def resync_after_outage(ok, latency_ms):
+    """POOL status listener: database back while serving the snapshot → reload."""
+    if ok and GALLERY.source == "snapshot" and not GALLERY.loading():
+        threading.Thread(target=sync_gallery, daemon=True).start()
+
+def start_services(window):
+    """After the first frame, off the GUI thread: import psycopg2, build the
+    DB layer and start its threads, then load the gallery."""
+    POOL.on_status(window.status_bar.db_status.emit)
+    POOL.on_status(resync_after_outage)
+    POOL.start_prober()
+    window.page_reg.watch_writer()
+    WRITER.start()
+    threading.Thread(target=maintain_access_log_loop, daemon=True).start()
+    if os.getenv("GALLERY_LISTEN", "1") != "0":
+        LISTENER.start()
+    STARTUP.late("services")
+    prefetch_gallery()       # gallery loads while the user reaches for the reader
+
+def shutdown():
+    """aboutToQuit: close what was started — services never used stay unbuilt."""
+    for svc in (LISTENER, MATCHER):
+        if svc._lazy_built():
+            svc.close()
+    CAPTURE.close()
+    GALLERY.stats.save()
+    for svc in (WRITER, POOL):
+        if svc._lazy_built():
+            svc.close()
+
+def _make_listener():
+    from gallery_sync import ChangeListener
+    return ChangeListener(POOL, GALLERY)
+
+# Enrollments / deletions on other kiosks reach GALLERY through NOTIFY
+# (Database/Notify_Fingerprint_Changes.sql); GALLERY_LISTEN=0 turns it off
+LISTENER = Lazy(_make_listener)
+
+# built on first use — MATCHER_MODE=sdk loads libzkfp, resident starts a process
+MATCHER = Lazy(lambda: make_matcher(GALLERY))
+POLICY  = SearchPolicy.from_env()
+# PIVOT_INDEX=1 → compare only the PIVOT_SHORTLIST closest candidates first
+INDEX   = PivotIndex(
+    MATCHER, GALLERY,
+    pivots=int(os.getenv("PIVOT_COUNT", "8")),
+    shortlist=int(os.getenv("PIVOT_SHORTLIST", "32")),
+) if os.getenv("PIVOT_INDEX", "0") == "1" else None
+SEARCH  = GallerySearch(GALLERY, MATCHER, POLICY, INDEX,
+                        index_fallback=os.getenv("PIVOT_FALLBACK", "1") == "1")
+# enrollment: a new template scoring above this against someone else is a duplicate
+DUP_SCORE = int(os.getenv("ENROLL_DUP_SCORE", str(POLICY.accept)))
+# Reader stays open in capture_service.py (CAPTURE_MODE=exe → save.exe / verify.exe)
+CAPTURE = make_capture()
 
 
 # ══════════════════════════════════════════════════════════════
 # WORKER THREADS
 # ══════════════════════════════════════════════════════════════
+def describe_error(e):
+    """One UI line for the failures a worker expects."""
+    if isinstance(e, CaptureError):
+        return e.describe()
+    if isinstance(e, psycopg2.Error):
+        return f"Database error: {str(e).strip()}"
+    if isinstance(e, MatcherError):
+        return f"Matcher error: {e}"
+    return f"{type(e).__name__}: {e}"
+
+def worker_errors():
+    """capture / database / matcher failures a worker expects.  Workers catch
+    Exception after these too: an exception escaping QThread.run aborts the
+    process (PyQt >= 5.5) and would leave the page's buttons disabled.
+    A function so that naming psycopg2.Error does not import it at start-up."""
+    return (CaptureError, psycopg2.Error, MatcherError, ZKFPError)
+
+
 class ScanWorker(QThread):
     captured = pyqtSignal(str)
     failed   = pyqtSignal(str)
+    progress = pyqtSignal(str)
 
     def run(self):
         try:
-            r = subprocess.run(["Application/save.exe"], capture_output=True, text=True, timeout=15)
-            t = extract_template(r.stdout)
-            if t:
-                self.captured.emit(t)
-            else:
-                self.failed.emit("ไม่พบ Template — วางนิ้วใหม่อีกครั้ง")
+            t = CAPTURE.capture("enroll", on_event=self._on_event)
+        except CaptureError as e:
+            self.failed.emit(e.describe())
+            return
         except Exception as e:
-            self.failed.emit(str(e))
+            traceback.print_exc()          # unexpected — still reported, never fatal
+            self.failed.emit(describe_error(e))
+            return
+        if t:
+            self.captured.emit(t)
+        else:
+            self.failed.emit("ไม่พบ Template — วางนิ้วใหม่อีกครั้ง")
+
+    def _on_event(self, ev):
+        if ev.get("event") == "press" and ev["n"] < ev["of"]:
+            self.progress.emit(f"ยกนิ้วแล้ววางซ้ำ ({ev['n']}/{ev['of']})")
+        elif ev.get("event") == "retry":
+            self.progress.emit("นิ้วไม่ตรงกับครั้งก่อน — วางนิ้วเดิมอีกครั้ง")
+
+
+class DuplicateWorker(QThread):
+    """Duplicate check before an enrollment INSERT: hash lookup, then 1:N."""
+
+    exact   = pyqtSignal(str)            # user_id already holding these bytes
+    similar = pyqtSignal(object)         # [(fid, user_id, score)] above DUP_SCORE
+    clear   = pyqtSignal()
+    error   = pyqtSignal(str)
+
+    def __init__(self, template, parent=None):
+        super().__init__(parent)
+        self._template = template
+
+    def run(self):
+        try:
+            exact, found = SEARCH.duplicates(self._template, DUP_SCORE)
+        except worker_errors() as e:
+            self.error.emit(describe_error(e))
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.error.emit(describe_error(e))
+            return
+        if exact:
+            self.exact.emit(exact[1])
+        elif found:
+            self.similar.emit(found)
+        else:
+            self.clear.emit()
 
 
 class VerifyWorker(QThread):
-    matched  = pyqtSignal(str)
-    no_match = pyqtSignal()
-    progress = pyqtSignal(str)
-    error    = pyqtSignal(str)
+    """Capture + 1:N, or 1:1 when `claim` (a user_id from keypad / badge) is
+    given — then only that user's templates are compared.
+
+    budget_ms bounds the identification (default MATCH_BUDGET_MS); when it
+    runs out the best-so-far candidate is still accepted if it qualifies,
+    otherwise `inconclusive` reports the fraction of the gallery covered.
+
+    Every attempt is queued to access_events with its capture / search /
+    total time (access_log.event)."""
+
+    matched      = pyqtSignal(str, int)
+    no_match     = pyqtSignal()
+    inconclusive = pyqtSignal(float)
+    progress     = pyqtSignal(str)
+    error        = pyqtSignal(str)
+
+    def __init__(self, budget_ms=None, claim=None, parent=None):
+        super().__init__(parent)
+        self._budget_ms = budget_ms
+        self._claim     = claim
+        self._mode      = "verify" if claim else "identify"
 
     def run(self):
+        t0 = time.perf_counter()
+        t1 = None
         try:
-            r = subprocess.run(["Application/verify.exe"], capture_output=True, text=True, timeout=15)
-            scan = extract_template(r.stdout)
+            if self._claim and not GALLERY.entries_of(self._claim):
+                self.error.emit(f"ไม่พบรหัส {self._claim} ในระบบ")
+                return
+            scan = CAPTURE.capture("verify")
+            t1   = time.perf_counter()
             if not scan:
                 self.no_match.emit()
+                self._log(None, t0, t1)
                 return
-            conn = get_connection()
-            cur  = conn.cursor()
-            cur.execute("SELECT user_id, template FROM fingerprints")
-            rows = cur.fetchall()
-            cur.close(); conn.close()
-            self.progress.emit(f"กำลังตรวจสอบ {len(rows)} รายการ...")
-            for uid, dbt in rows:
-                db_b64 = bytes(dbt).decode()
-                cmp = subprocess.run(
-                    ["Application/compare.exe", scan, db_b64],
-                    capture_output=True, text=True)
+            res = self._search(scan)
+            self._report(res)
+            self._log(res, t0, t1, time.perf_counter())
+        except worker_errors() as e:
+            self.error.emit(describe_error(e))
+            self._log(None, t0, t1, error=describe_error(e))
+        except Exception as e:
+            traceback.print_exc()
+            self.error.emit(describe_error(e))
+            self._log(None, t0, t1, error=describe_error(e))
+
+    def _log(self, res, t0, t1=None, t2=None, error=None):
+        """Queue the attempt for access_events (never blocks on the DB)."""
+        ms = lambda a, b: (b - a) * 1000.0 if a is not None and b is not None else None
+        try:
+            WRITER.submit("access_events", access_log.event(
+                self._mode, res, capture_ms=ms(t0, t1), search_ms=ms(t1, t2),
+                total_ms=ms(t0, t2 or time.perf_counter()), error=error))
+        except (sqlite3.Error, OSError) as e:
+            print("access event not queued:", e)
+
+    def _search(self, scan):
+        if self._claim:
+            self.progress.emit(f"กำลังตรวจสอบ {self._claim}...")
+            res = SEARCH.verify(scan, self._claim, self._budget_ms)
+        else:
+            if not GALLERY.is_loaded():
+                self.progress.emit("กำลังโหลดฐานข้อมูลลายนิ้วมือ...")
+            GALLERY.ensure_loaded()         # waits for the start-up load if it is still running
+            self.progress.emit(f"กำลังตรวจสอบ {len(GALLERY)} รายการ...")
+            res = SEARCH.identify(scan, self._budget_ms)
+        return res
+
+    def _report(self, res):
+        if res.match:
+            GALLERY.record_hit(res.match[0])
+            self.matched.emit(str(res.match[1]), res.match[2])
+        elif res.status == "inconclusive":
+            self.inconclusive.emit(res.coverage)
+        else:
+            self.no_match.emit()
+
+
+class KioskWorker(VerifyWorker):
+    """Hands-free verify: capture and matching run as a two-stage pipeline.
+
+    A capture thread keeps reading fingers into a bounded queue while this
+    thread searches the previous probe, so the reader is never idle during
+    a search.  When matching falls behind, the full queue blocks capture
+    instead of building a backlog of stale scans.
+
+    Duplicates within `dup_window` seconds are dropped twice over: identical
+    template bytes at the capture stage (finger left on the sensor) and the
+    same matched user at the result stage (same person pressing again).
+    """
+
+    STOP = object()
+
+    def __init__(self, budget_ms=None, depth=None, dup_window=None, parent=None):
+        super().__init__(budget_ms, None, parent)
+        self._mode       = "kiosk"
+        self._queue      = queue.Queue(depth or int(os.getenv("KIOSK_QUEUE", "2")))
+        self._dup_window = dup_window if dup_window is not None else float(os.getenv("KIOSK_DUP_WINDOW", "3"))
+        self._stop       = threading.Event()
+        self._done       = deque(maxlen=32)       # finish times → people per minute
+
+    def stop(self):
+        self._stop.set()
+        CAPTURE.cancel()
+        try:
+            self._queue.put_nowait(self.STOP)
+        except queue.Full:
+            pass
+
+    def run(self):
+        try:
+            GALLERY.ensure_loaded()
+        except Exception as e:          # psycopg2.Error, or no snapshot either
+            self.error.emit(describe_error(e))
+            return
+        feeder = threading.Thread(target=self._capture_loop, daemon=True)
+        feeder.start()
+        last_uid, last_at = None, 0.0
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is self.STOP:
+                break
+            scan, t0, t1 = item
+            try:
+                res = self._search(scan)
+            except worker_errors() as e:
+                self.error.emit(describe_error(e))
+                self._log(None, t0, t1, error=describe_error(e))
+                continue
+            except Exception as e:
+                traceback.print_exc()
+                self.error.emit(describe_error(e))
+                self._log(None, t0, t1, error=describe_error(e))
+                continue
+            now = time.monotonic()
+            if res.match and res.match[1] == last_uid and now - last_at < self._dup_window:
+                last_at = now
+                continue
+            if res.match:
+                last_uid, last_at = res.match[1], now
+            self._done.append(now)
+            self._report(res)
+            self._log(res, t0, t1, time.perf_counter())
+        self._stop.set()
+        feeder.join(timeout=2.0)
+
+    def _capture_loop(self):
+        last_key, last_at = None, 0.0
+        while not self._stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                scan = CAPTURE.capture("verify")
+            except Exception as e:          # CaptureError, or a bug — keep the kiosk alive
+                if self._stop.is_set():
+                    break                   # stop() killed the capture — not an error
+                self.error.emit(describe_error(e))
+                self._stop.wait(1.0)
+                continue
+            if not scan or self._stop.is_set():
+                continue
+            key = hashlib.sha1(scan.encode()).digest()
+            now = time.monotonic()
+            if key == last_key and now - last_at < self._dup_window:
+                last_at = now
+                continue
+            last_key, last_at = key, now
+            while not self._stop.is_set():
                 try:
-                    if int(cmp.stdout.strip()) > 60:
-                        self.matched.emit(str(uid))
+                    self._queue.put((scan, t0, time.perf_counter()), timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+
+    def rate(self):
+        """People per minute over the recent results."""
+        if len(self._done) < 2:
+            return 0.0
+        span = self._done[-1] - self._done[0]
+        return 60.0 * (len(self._done) - 1) / span if span > 0 else 0.0
+
+
+class RecordsWorker(QThread):
+    """One keyset page of fingerprints (newest first) for RecordsModel.
+
+    The page is read through a server-side cursor and handed over CHUNK
+    rows at a time, so the first matches show before the page is complete.
+    A search (`text`) is user_id ILIKE '%text%', served by the pg_trgm index
+    (Database/Create_Search_Index.sql); its count stops at COUNT_CAP.
+
+    `generation` is echoed back so the model can drop results of a query it
+    has replaced; cancel() also stops the statement on the server.
+
+    The first page (count=True) runs in one REPEATABLE READ transaction and
+    also returns the watermark (server now(), max id) the page and count are
+    consistent with — RecordsDeltaWorker continues from it."""
+
+    CHUNK     = 50
+    COUNT_CAP = 10000
+
+    rows  = pyqtSignal(int, object)             # generation, chunk of rows
+    done  = pyqtSignal(int, int, object, object)    # generation, rows in page, total, watermark
+    error = pyqtSignal(int, str)
+
+    def __init__(self, generation, after, text, limit, count=False, parent=None):
+        super().__init__(parent)
+        self._gen, self._after, self._text = generation, after, text
+        self._limit, self._count           = limit, count
+        self._lock      = threading.Lock()
+        self._conn      = None               # set only while a statement may run
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except psycopg2.Error:
+                    pass
+
+    def run(self):
+        cond, args = records_filter(self._text)
+        where = [cond] if cond else []
+        if self._after is not None:
+            where.append("id < %s")
+            args = args + [self._after]
+        total, mark, n = None, None, 0
+        try:
+            with POOL.connection() as conn:
+                with self._lock:
+                    if self._cancelled:         # replaced while waiting for a connection
                         return
-                except:
-                    continue
-            self.no_match.emit()
+                    self._conn = conn
+                try:
+                    if self._count:
+                        mark = records_watermark(conn)
+                    with conn.cursor(name=f"records_{self._gen}") as cur:
+                        cur.itersize = self.CHUNK
+                        cur.execute(
+                            "SELECT id, user_id, template_size, created_at FROM fingerprints"
+                            + (f" WHERE {' AND '.join(where)}" if where else "")
+                            + " ORDER BY id DESC LIMIT %s", args + [self._limit])
+                        while not self._cancelled:
+                            chunk = cur.fetchmany(self.CHUNK)
+                            if not chunk:
+                                break
+                            n += len(chunk)
+                            self.rows.emit(self._gen, chunk)
+                    if self._count and not self._cancelled:
+                        total = self._count_rows(conn, cond, args[:1] if cond else [])
+                finally:
+                    with self._lock:
+                        self._conn = None
+        except psycopg2.Error as e:
+            if not self._cancelled:
+                self.error.emit(self._gen, describe_error(e))
+            return
         except Exception as e:
-            self.error.emit(str(e))
+            traceback.print_exc()
+            self.error.emit(self._gen, describe_error(e))
+            return
+        if not self._cancelled:
+            self.done.emit(self._gen, n, total, mark)
+
+    def _count_rows(self, conn, cond, args):
+        with conn.cursor() as cur:
+            if not cond:
+                cur.execute("SELECT count(*) FROM fingerprints")
+            else:                       # a broad search must not cost a full count
+                cur.execute(f"SELECT count(*) FROM (SELECT 1 FROM fingerprints WHERE {cond} "
+                            f"LIMIT {self.COUNT_CAP + 1}) t", args)
+            return cur.fetchone()[0]
+
+
+def records_filter(text):
+    """RECORDS search → (SQL condition or "", args): user_id ILIKE '%text%'."""
+    if not text:
+        return "", []
+    pattern = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return "user_id ILIKE %s", [f"%{pattern}%"]
+
+
+def records_watermark(conn):
+    """Start a REPEATABLE READ snapshot on conn → (server now(), max id) for
+    RecordsDeltaWorker.  Must be the first statement of the transaction."""
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cur.execute("SELECT now(), COALESCE(max(id), 0) FROM fingerprints")
+        return cur.fetchone()
+
+
+class RecordsDeltaWorker(QThread):
+    """What changed in fingerprints since a RecordsWorker watermark.
+
+    Reads rows with updated_at after the watermark and tombstones from
+    fingerprints_deleted (Database/Track_Record_Changes.sql), each with a
+    `hit` flag for the current search, in one snapshot:
+
+        delta(generation, changed, deleted, mark)
+            changed   [(id, user_id, template_size, created_at, hit)]
+            deleted   [(id, hit)]
+            mark      watermark for the next call
+
+    Both lists are re-read SLACK s before the watermark, so a transaction
+    that committed late is not missed; applying a row twice is harmless.
+    More than `limit` changes → overflow: the model reloads instead.
+    Without the tracking schema only new ids (id > max id) are found."""
+
+    SLACK = float(os.getenv("RECORDS_DELTA_SLACK", "5"))
+
+    delta    = pyqtSignal(int, object, object, object)
+    overflow = pyqtSignal(int)
+    error    = pyqtSignal(int, str)
+
+    def __init__(self, generation, mark, text, limit, parent=None):
+        super().__init__(parent)
+        self._gen, self._mark, self._text, self._limit = generation, mark, text, limit
+
+    def run(self):
+        cond, args = records_filter(self._text)
+        hit = cond or "TRUE"
+        since, max_id = self._mark
+        try:
+            with POOL.connection() as conn:
+                try:
+                    mark = records_watermark(conn)
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            f"SELECT id, user_id, template_size, created_at, {hit} FROM fingerprints "
+                            f"WHERE updated_at > %s - make_interval(secs => %s) "
+                            f"ORDER BY id DESC LIMIT %s",
+                            args + [since, self.SLACK, self._limit + 1])
+                        changed = cur.fetchall()
+                        cur.execute(
+                            f"SELECT id, {hit} FROM fingerprints_deleted "
+                            f"WHERE deleted_at > %s - make_interval(secs => %s) LIMIT %s",
+                            args + [since, self.SLACK, self._limit + 1])
+                        deleted = cur.fetchall()
+                except psycopg2.ProgrammingError:
+                    conn.rollback()         # no updated_at / tombstones yet: new ids only
+                    mark = records_watermark(conn)
+                    with conn.cursor() as cur:
+                        cur.execute(
+                            f"SELECT id, user_id, template_size, created_at, {hit} FROM fingerprints "
+                            f"WHERE id > %s ORDER BY id DESC LIMIT %s",
+                            args + [max_id, self._limit + 1])
+                        changed, deleted = cur.fetchall(), []
+        except psycopg2.Error as e:
+            self.error.emit(self._gen, describe_error(e))
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.error.emit(self._gen, describe_error(e))
+            return
+        if len(changed) > self._limit or len(deleted) > self._limit:
+            self.overflow.emit(self._gen)
+        else:
+            self.delta.emit(self._gen, changed, deleted, mark)
+
+
+class HistoryWorker(QThread):
+    """One access_events page off the GUI thread (access_log.page)."""
+
+    loaded = pyqtSignal(object)
+    error  = pyqtSignal(str)
+
+    def __init__(self, since, until, after=None, user=None, result=None, limit=100, parent=None):
+        super().__init__(parent)
+        self._args = dict(since=since, until=until, after=after, user=user, result=result, limit=limit)
+
+    def run(self):
+        try:
+            with POOL.connection() as conn:
+                rows = access_log.page(conn, **self._args)
+        except psycopg2.Error as e:
+            self.error.emit(describe_error(e))
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.error.emit(describe_error(e))
+            return
+        self.loaded.emit(rows)
 
 
 # ══════════════════════════════════════════════════════════════
 # CUSTOM WIDGETS
 # ══════════════════════════════════════════════════════════════
 class ScannerRing(QWidget):
-    """Animated fingerprint scanner ring — HMI style."""
+    """Animated fingerprint scanner ring — HMI style.
+
+    Only "scanning" moves, so the frame timer runs only in that state and
+    only while the ring is on screen.  Everything that does not move is
+    painted once into QPixmap layers per (size, state); a frame draws those
+    layers plus the sweep arc, the ripples and the pulsing ridges.
+
+    The animation advances by elapsed time, and the frame interval adapts
+    to RING_CPU_BUDGET (share of one core spent in paint, default 0.05):
+    over budget it steps down towards FRAME_MS[-1], well under it back up.
+    `cpu_load` is the last measured share."""
+
+    FRAME_MS   = (16, 33, 50, 100)
+    CPU_BUDGET = float(os.getenv("RING_CPU_BUDGET", "0.05"))
+    TICK_MS    = 16.0                 # the speeds below are per 16 ms
 
     def __init__(self, size=200, parent=None):
         super().__init__(parent)
         self.setFixedSize(size, size)
         self._state  = "idle"
-        self._angle  = 0
+        self._angle  = 0.0
         self._pulse  = 0.0
         self._ripple = []
+        self._layers = {}             # (w, h, dpr, state) -> {name: QPixmap}
+        self._rate   = 0              # index into FRAME_MS
+        self._last   = None           # perf_counter of the previous tick
+        self._busy   = 0.0            # s spent painting since _window
+        self._window = time.perf_counter()
+        self.cpu_load = 0.0
         self._timer  = QTimer(self)
         self._timer.timeout.connect(self._tick)
-        self._timer.start(16)
 
     def set_state(self, state):
         self._state = state
-        if state == "scanning":
-            self._ripple.clear()
+        self._ripple.clear()
+        self._run()
         self.update()
 
+    # ── Timer: scanning and on screen only ────────────────────
+    def _run(self):
+        if self._state == "scanning" and self.isVisible():
+            if not self._timer.isActive():
+                self._last = None
+                self._busy, self._window = 0.0, time.perf_counter()   # idle time is not load
+                self._timer.start(self.FRAME_MS[self._rate])
+        elif self._timer.isActive():
+            self._timer.stop()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._run()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._timer.stop()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._layers.clear()
+
     def _tick(self):
-        self._angle = (self._angle + 2) % 360
-        self._pulse = (self._pulse + 0.04) % (2 * 3.14159)
-        new_ripple  = []
-        for r, a in self._ripple:
-            if a > 4:
-                new_ripple.append((r + 1.5, a - 4))
-        if self._state == "scanning" and len(self._ripple) < 4:
-            import math
-            if int(self._pulse * 10) % 15 == 0:
-                new_ripple.append((0, 255))
-        self._ripple = new_ripple
-        if self._state in ("scanning",):
-            self.update()
+        now = time.perf_counter()
+        steps = 1.0 if self._last is None else (now - self._last) * 1000.0 / self.TICK_MS
+        self._last = now
+        self._angle = (self._angle + 2 * steps) % 360
+        before      = int(self._pulse * 10) // 15
+        self._pulse = (self._pulse + 0.04 * steps) % (2 * math.pi)
+        self._ripple = [(r + 1.5 * steps, a - 4 * steps) for r, a in self._ripple if a - 4 * steps > 0]
+        if len(self._ripple) < 4 and int(self._pulse * 10) // 15 != before:
+            self._ripple.append((0.0, 255.0))
+        self.update()
+        if now - self._window >= 1.0:
+            self._pace(now)
+
+    def _pace(self, now):
+        """Once a second: measured paint share → frame interval."""
+        self.cpu_load = self._busy / (now - self._window)
+        self._busy, self._window = 0.0, now
+        rate = self._rate
+        if self.cpu_load > self.CPU_BUDGET and rate < len(self.FRAME_MS) - 1:
+            rate += 1
+        elif self.cpu_load < self.CPU_BUDGET / 3 and rate > 0:
+            rate -= 1
+        if rate != self._rate:
+            self._rate = rate
+            self._timer.setInterval(self.FRAME_MS[rate])
+
+    # ── Painting ──────────────────────────────────────────────
+    def _colors(self):
+        if   self._state == "success":  return QColor(C["green"])
+        elif self._state == "fail":     return QColor(C["red"])
+        elif self._state == "scanning": return QColor(C["cyan"])
+        elif self._state == "ready":    return QColor(C["amber"])
+        return QColor(C["border_hi"])
+
+    def _geometry(self):
+        w, h = self.width(), self.height()
+        R    = w / 2 - 6
+        return w / 2, h / 2, R, R * 0.52
+
+    def _layer(self, paint):
+        """Transparent device-pixel QPixmap painted by paint(QPainter)."""
+        dpr = self.devicePixelRatioF()
+        pm  = QPixmap(int(self.width() * dpr), int(self.height() * dpr))
+        pm.setDevicePixelRatio(dpr)
+        pm.fill(Qt.transparent)
+        p = QPainter(pm)
+        p.setRenderHint(QPainter.Antialiasing)
+        paint(p)
+        p.end()
+        return pm
+
+    def _cached(self):
+        key = (self.width(), self.height(), self.devicePixelRatioF(), self._state)
+        layers = self._layers.get(key)
+        if layers is None:
+            if self._state == "scanning":
+                layers = {
+                    "back":   self._layer(self._paint_glow),
+                    "track":  self._layer(self._paint_track),
+                    "disc":   self._layer(self._paint_disc),
+                    "ridges": self._layer(lambda p: self._paint_ridges(p, 255)),
+                    "front":  self._layer(self._paint_front),
+                }
+            else:               # nothing moves: one layer
+                layers = {"static": self._layer(self._paint_static)}
+            self._layers[key] = layers
+        return layers
 
     def paintEvent(self, event):
-        import math
+        t0 = time.perf_counter()
+        layers = self._cached()
         p = QPainter(self)
+        if "static" in layers:
+            p.drawPixmap(0, 0, layers["static"])
+            p.end()
+            return
         p.setRenderHint(QPainter.Antialiasing)
-        w, h   = self.width(), self.height()
-        cx, cy = w / 2, h / 2
-        R      = w / 2 - 6
+        cx, cy, R, _ = self._geometry()
+        c_main = self._colors()
+        p.drawPixmap(0, 0, layers["back"])
+
+        # ripple rings
+        p.setBrush(Qt.NoBrush)
+        for radius, alpha in self._ripple:
+            rc = QColor(c_main); rc.setAlpha(int(alpha))
+            p.setPen(QPen(rc, 1.5))
+            rr = R * 0.4 + radius
+            p.drawEllipse(int(cx - rr), int(cy - rr), int(rr * 2), int(rr * 2))
 
-        if   self._state == "success":  c_main = QColor(C["green"]); c_glow = QColor(C["green_glow"])
-        elif self._state == "fail":     c_main = QColor(C["red"]);   c_glow = QColor(C["red_glow"])
-        elif self._state == "scanning": c_main = QColor(C["cyan"]);  c_glow = QColor(C["cyan_glow"])
-        elif self._state == "ready":    c_main = QColor(C["amber"]); c_glow = QColor(C["amber_glow"])
-        else:                           c_main = QColor(C["border_hi"]); c_glow = QColor(C["bg"])
+        p.drawPixmap(0, 0, layers["track"])
+
+        # sweep arc + trail
+        sweep   = 110
+        angle   = int(self._angle)
+        pen_arc = QPen(c_main, 4); pen_arc.setCapStyle(Qt.RoundCap)
+        p.setPen(pen_arc)
+        p.drawArc(int(cx - R), int(cy - R), int(R * 2), int(R * 2), angle * 16, sweep * 16)
+        c_trail = QColor(c_main); c_trail.setAlpha(60)
+        pen_t   = QPen(c_trail, 2); pen_t.setCapStyle(Qt.RoundCap)
+        p.setPen(pen_t)
+        p.drawArc(int(cx - R), int(cy - R), int(R * 2), int(R * 2), (angle + sweep) * 16, 80 * 16)
+
+        p.drawPixmap(0, 0, layers["disc"])
+        p.setOpacity((100 + 80 * math.sin(self._pulse)) / 255.0)
+        p.drawPixmap(0, 0, layers["ridges"])
+        p.setOpacity(1.0)
+        p.drawPixmap(0, 0, layers["front"])
+        p.end()
+        self._busy += time.perf_counter() - t0
+
+    def _paint_static(self, p):
+        self._paint_glow(p)
+        self._paint_track(p)
+        self._paint_disc(p)
+        self._paint_ridges(p, 180 if self._state != "idle" else 70)
+        self._paint_front(p)
 
-        # glow background
+    def _paint_glow(self, p):
+        cx, cy, R, _ = self._geometry()
         grad = QRadialGradient(cx, cy, R)
-        g1   = QColor(c_main); g1.setAlpha(30 if self._state != "idle" else 0)
+        g1   = self._colors(); g1.setAlpha(30 if self._state != "idle" else 0)
         grad.setColorAt(0.4, g1)
         grad.setColorAt(1.0, QColor(Qt.transparent))
         p.setPen(Qt.NoPen); p.setBrush(grad)
         p.drawEllipse(int(cx - R), int(cy - R), int(R * 2), int(R * 2))
 
-        # ripple rings
-        for radius, alpha in self._ripple:
-            rc = QColor(c_main); rc.setAlpha(int(alpha))
-            p.setPen(QPen(rc, 1.5)); p.setBrush(Qt.NoBrush)
-            rr = R * 0.4 + radius
-            p.drawEllipse(int(cx - rr), int(cy - rr), int(rr * 2), int(rr * 2))
-
-        # outer track
+    def _paint_track(self, p):
+        cx, cy, R, _ = self._geometry()
         p.setPen(QPen(QColor(C["border"]), 3)); p.setBrush(Qt.NoBrush)
         p.drawEllipse(int(cx - R), int(cy - R), int(R * 2), int(R * 2))
-
-        if self._state == "scanning":
-            sweep   = 110
-            pen_arc = QPen(c_main, 4); pen_arc.setCapStyle(Qt.RoundCap)
-            p.setPen(pen_arc)
-            p.drawArc(int(cx - R), int(cy - R), int(R * 2), int(R * 2),
-                      self._angle * 16, sweep * 16)
-            c_trail = QColor(c_main); c_trail.setAlpha(60)
-            pen_t   = QPen(c_trail, 2); pen_t.setCapStyle(Qt.RoundCap)
-            p.setPen(pen_t)
-            p.drawArc(int(cx - R), int(cy - R), int(R * 2), int(R * 2),
-                      (self._angle + sweep) * 16, 80 * 16)
-        else:
-            p.setPen(QPen(c_main, 3 if self._state == "idle" else 4))
+        if self._state != "scanning":
+            p.setPen(QPen(self._colors(), 3 if self._state == "idle" else 4))
             p.drawEllipse(int(cx - R), int(cy - R), int(R * 2), int(R * 2))
 
-        # inner disc
-        ir = R * 0.52
+    def _paint_disc(self, p):
+        cx, cy, _, ir = self._geometry()
         ig = QRadialGradient(cx, cy, ir)
         ib1 = QColor(C["card"]); ib1.setAlpha(240)
         ib2 = QColor(C["surface"]); ib2.setAlpha(200)
@@ -227,26 +943,26 @@ class ScannerRing(QWidget):
         p.setPen(Qt.NoPen); p.setBrush(ig)
         p.drawEllipse(int(cx - ir), int(cy - ir), int(ir * 2), int(ir * 2))
 
-        # ridge lines
-        pulse_val = math.sin(self._pulse)
+    def _paint_ridges(self, p, alpha):
+        cx, cy, _, ir = self._geometry()
+        rc = self._colors(); rc.setAlpha(alpha)
+        p.setBrush(Qt.NoBrush)
         for i, (rr, span, offset) in enumerate([
             (ir * 0.72, 150, 20),
             (ir * 0.52, 170, 10),
             (ir * 0.33, 180,  0),
             (ir * 0.16, 360,  0),
         ]):
-            rc    = QColor(c_main)
-            alpha = 180 if self._state != "idle" else 70
-            if self._state == "scanning":
-                alpha = int(100 + 80 * pulse_val)
-            rc.setAlpha(alpha)
-            p.setPen(QPen(rc, 1.8 if i < 2 else 1.4)); p.setBrush(Qt.NoBrush)
+            p.setPen(QPen(rc, 1.8 if i < 2 else 1.4))
             if i == 3:
                 p.drawEllipse(int(cx - rr), int(cy - rr), int(rr * 2), int(rr * 2))
             else:
                 p.drawArc(int(cx - rr), int(cy - rr), int(rr * 2), int(rr * 2),
                           int((200 + offset) * 16), int(span * 16))
 
+    def _paint_front(self, p):
+        cx, cy, R, ir = self._geometry()
+        c_main = self._colors()
         # center dot
         dr = ir * 0.10
         p.setPen(Qt.NoPen); p.setBrush(c_main)
@@ -264,12 +980,13 @@ class ScannerRing(QWidget):
             p.drawLine(bx, by, bx + int(bw * dx * 0.5), by)
             p.drawLine(bx, by, bx, by + int(bh * dy * 0.5))
 
-        p.end()
-
 
 class StatusBar(QWidget):
     """Top status bar with clock and system info."""
 
+    db_status      = pyqtSignal(bool, object)   # thread-safe route to set_db_status
+    gallery_status = pyqtSignal(int, int)       # ... and to set_gallery_status
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setFixedHeight(52)
@@ -294,6 +1011,15 @@ class StatusBar(QWidget):
         sep.setStyleSheet(f"color: {C['border_hi']};")
         layout.addWidget(sep)
 
+        self.gallery_indicator = QLabel("◌ GALLERY")
+        self.gallery_indicator.setFont(QFont(FONT_MONO, 11))
+        self.gallery_indicator.setStyleSheet(f"color: {C['text_dim']};")
+        layout.addWidget(self.gallery_indicator)
+
+        sep = QLabel(" | ")
+        sep.setStyleSheet(f"color: {C['border_hi']};")
+        layout.addWidget(sep)
+
         self.clock = QLabel()
         self.clock.setFont(QFont(FONT_MONO, 13, QFont.Bold))
         self.clock.setStyleSheet(f"color: {C['text']};")
@@ -303,14 +1029,38 @@ class StatusBar(QWidget):
         t.timeout.connect(self._tick)
         t.start(1000)
         self._tick()
+        self.db_status.connect(self.set_db_status)
+        self.gallery_status.connect(self.set_gallery_status)
 
     def _tick(self):
         self.clock.setText(datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
 
-    def set_db_status(self, ok):
-        self.db_indicator.setStyleSheet(
-            f"color: {C['green']};" if ok else f"color: {C['red']};"
-        )
+    def set_db_status(self, ok, latency_ms=None):
+        if not ok:
+            color, text = C["red"], "● DATABASE OFFLINE"
+        elif latency_ms is None:
+            color, text = C["green"], "● DATABASE"
+        else:
+            color = C["amber"] if latency_ms > DB_SLOW_MS else C["green"]
+            text  = f"● DATABASE {latency_ms:.0f} ms"
+        queued = WRITER.pending()
+        if queued:
+            text += f"  · {queued} QUEUED"
+        self.db_indicator.setText(text)
+        self.db_indicator.setStyleSheet(f"color: {color};")
+
+    def set_gallery_status(self, done, total):
+        """GALLERY.on_progress: load progress, then size and where it came from."""
+        if 0 <= done < total:
+            color, text = C["amber"], f"◌ GALLERY {done * 100 // total}%"
+        elif not GALLERY.is_loaded():
+            color, text = C["red"], "● GALLERY NOT LOADED"
+        elif GALLERY.source == "snapshot":
+            color, text = C["amber"], f"● GALLERY {len(GALLERY):,} · SNAPSHOT"
+        else:
+            color, text = C["green"], f"● GALLERY {len(GALLERY):,}"
+        self.gallery_indicator.setText(text)
+        self.gallery_indicator.setStyleSheet(f"color: {color};")
 
 
 class NavButton(QPushButton):
@@ -458,6 +1208,10 @@ def outline_btn(text):
             color: {C['text']};
             border-color: {C['border_hi']};
         }}
+        QPushButton:checked {{
+            color: {C['cyan']};
+            border-color: {C['cyan']};
+        }}
     """)
     return btn
 
@@ -490,6 +1244,44 @@ def styled_input(placeholder=""):
     return inp
 
 
+def table_style(body_pt, hdr_pt):
+    """Stylesheet shared by the RECORDS and HISTORY tables."""
+    return f"""
+        QTableView {{
+            background-color: {C['surface']};
+            border: 1px solid {C['border']};
+            border-radius: 4px;
+            font-family: {FONT_MONO};
+            font-size: {body_pt}px;
+            color: {C['text']};
+            outline: none;
+        }}
+        QTableView::item {{
+            padding: 10px 16px;
+            border-bottom: 1px solid {C['elevated']};
+        }}
+        QTableView::item:selected {{
+            background-color: {C['cyan_glow']};
+            color: {C['cyan']};
+        }}
+        QTableView::item:alternate {{
+            background-color: {C['bg']};
+        }}
+        QHeaderView::section {{
+            background-color: {C['elevated']};
+            color: {C['text_dim']};
+            font-family: {FONT_MONO};
+            font-size: {hdr_pt}px;
+            font-weight: 700;
+            letter-spacing: 2px;
+            border: none;
+            border-bottom: 1px solid {C['border']};
+            border-right: 1px solid {C['border']};
+            padding: 10px 16px;
+        }}
+    """
+
+
 def status_badge(text, color):
     lbl = QLabel(f" {text} ")
     lbl.setFont(QFont(FONT_MONO, 10, QFont.Bold))
@@ -509,12 +1301,25 @@ def status_badge(text, color):
 # REGISTER PAGE
 # ══════════════════════════════════════════════════════════════
 class RegisterPage(QWidget):
+    # WRITER callbacks arrive on the writer thread; these hop to the GUI thread
+    written      = pyqtSignal(str, object)       # user_id, fid
+    write_failed = pyqtSignal(str, str)          # user_id, error
+
     def __init__(self):
         super().__init__()
         self._template = None
         self._worker   = None
+        self._dup      = None
         self.setStyleSheet(f"background: {C['bg']};")
         self._build()
+        self.written.connect(self._on_written)
+        self.write_failed.connect(self._on_write_failed)
+
+    def watch_writer(self):
+        """WRITER results → this page.  Called by start_services() so that
+        building the page does not create the write-behind queue."""
+        WRITER.on_written(self._writer_written)
+        WRITER.on_failed(self._writer_failed)
 
     def _build(self):
         root = QVBoxLayout(self)
@@ -655,6 +1460,7 @@ class RegisterPage(QWidget):
         self._worker = ScanWorker()
         self._worker.captured.connect(self._on_captured)
         self._worker.failed.connect(self._on_failed)
+        self._worker.progress.connect(self.scan_detail.setText)
         self._worker.start()
 
     def _on_captured(self, template):
@@ -688,19 +1494,78 @@ class RegisterPage(QWidget):
         if not self._template:
             Dialog.error(self, "ข้อผิดพลาด", "ไม่มี Template — กรุณาสแกนก่อน")
             return
+        self.save_btn.setEnabled(False)
+        self.scan_detail.setText("กำลังตรวจสอบลายนิ้วมือซ้ำ...")
+        self._dup = DuplicateWorker(self._template)
+        self._dup.exact.connect(self._on_exact_dup)
+        self._dup.similar.connect(lambda found: self._on_similar(name, found))
+        self._dup.clear.connect(lambda: self._insert(name))
+        self._dup.error.connect(self._on_dup_error)
+        self._dup.start()
+
+    def _on_exact_dup(self, user_id):
+        Dialog.warning(self, "ลายนิ้วมือซ้ำ",
+                       f"Template นี้ถูกบันทึกไว้แล้วในชื่อ '{user_id}' — ไม่บันทึกซ้ำ")
+        self.scan_detail.setText("ข้อมูลซ้ำ — กด CAPTURE เพื่อสแกนใหม่ หรือ CANCEL")
+
+    def _on_similar(self, name, found):
+        if not self._template:          # cancelled / re-scanned meanwhile
+            return
+        users = list(dict.fromkeys(uid for _, uid, _ in found))
+        if users == [name]:             # another finger / re-scan of the same person
+            self._insert(name)
+            return
+        best = found[0]
+        lines = "\n".join(f"• {uid}  (score {score})" for _, uid, score in found)
+        if Dialog.confirm(self, "พบลายนิ้วมือที่คล้ายกัน",
+                          f"ลายนิ้วมือนี้ตรงกับผู้ใช้ที่มีอยู่แล้ว:\n{lines}\n\n"
+                          f"บันทึกเพิ่มเป็นของ '{best[1]}' (รวมกับผู้ใช้เดิม) หรือไม่?\n"
+                          f"ยกเลิก = ไม่บันทึก"):
+            self._insert(best[1])
+        else:
+            self.save_btn.setEnabled(True)
+            self.scan_detail.setText("ยกเลิกการบันทึก — ตรวจสอบชื่อหรือสแกนใหม่")
+
+    def _on_dup_error(self, msg):
+        self.save_btn.setEnabled(True)
+        Dialog.error(self, "ข้อผิดพลาด", msg)
+
+    def _insert(self, name):
+        if not self._template:
+            return
         try:
-            conn = get_connection()
-            cur  = conn.cursor()
-            cur.execute(
-                "INSERT INTO fingerprints (user_id, template, template_size) VALUES (%s, %s, %s)",
-                (name, self._template.encode(), len(self._template))
-            )
-            conn.commit(); cur.close(); conn.close()
-            Dialog.success(self, "บันทึกสำเร็จ", f"บันทึก '{name}' เรียบร้อยแล้ว")
-            self._reset()
-        except Exception as e:
+            encode_template(self._template)             # reject bad data now, not in the writer
+            WRITER.submit("fingerprints", {"user_id": name, "template": self._template})
+        except (ValueError, OSError, sqlite3.Error) as e:
+            self.save_btn.setEnabled(True)
             Dialog.error(self, "ข้อผิดพลาด", str(e))
-    
+            return
+        offline = POOL.ok is False
+        if offline:
+            Dialog.warning(self, "บันทึกไว้ในคิว",
+                           f"ฐานข้อมูลไม่ตอบสนอง — '{name}' จะถูกบันทึกอัตโนมัติเมื่อเชื่อมต่อได้")
+        self._reset()
+        if not offline:             # success is reported by _on_written, once it is in PostgreSQL
+            self.scan_detail.setText(f"กำลังบันทึก '{name}' ลงฐานข้อมูล...")
+
+    def _writer_written(self, kind, qid, fid, p):
+        if kind == "fingerprints":
+            self.written.emit(p["user_id"], fid)
+
+    def _writer_failed(self, kind, qid, error, p):
+        if kind == "fingerprints":
+            self.write_failed.emit(p["user_id"], error)
+
+    def _on_written(self, name, fid):
+        """WRITER confirmed the INSERT — the only place success is reported."""
+        busy = self._template is not None or (self._worker is not None and self._worker.isRunning())
+        if not busy:                # a scan in progress keeps its own status line
+            self.scan_detail.setText("กด CAPTURE เพื่อเริ่มการสแกน")
+        Dialog.success(self, "บันทึกสำเร็จ", f"บันทึก '{name}' ลงฐานข้อมูลเรียบร้อยแล้ว (ID {fid})")
+
+    def _on_write_failed(self, name, error):
+        Dialog.error(self, "บันทึกไม่สำเร็จ", f"ฐานข้อมูลไม่รับข้อมูลของ '{name}':\n{error}")
+
     def _flash_error(self, msg):
         Dialog.error(self, "ข้อผิดพลาด", msg)
 
@@ -734,6 +1599,7 @@ class VerifyPage(QWidget):
     def __init__(self):
         super().__init__()
         self._worker = None
+        self._kiosk  = None
         self.setStyleSheet(f"background: {C['bg']};")
         self._build()
 
@@ -785,10 +1651,20 @@ class VerifyPage(QWidget):
         scan_panel.body_layout.addLayout(s_body)
         left.addWidget(scan_panel)
 
+        left.addWidget(field_label("user id (optional — 1:1 verify)"))
+        self.claim_input = styled_input("ว่าง = ค้นทั้งระบบ / ใส่รหัสเพื่อตรวจเฉพาะคนนั้น")
+        self.claim_input.returnPressed.connect(self._verify)
+        left.addWidget(self.claim_input)
+
         self.verify_btn = big_btn("VERIFY FINGERPRINT", "cyan", "⬤")
         self.verify_btn.setMinimumHeight(58)
         self.verify_btn.clicked.connect(self._verify)
         left.addWidget(self.verify_btn)
+
+        self.kiosk_btn = outline_btn("▶  KIOSK MODE — สแกนต่อเนื่อง")
+        self.kiosk_btn.setCheckable(True)
+        self.kiosk_btn.toggled.connect(self._toggle_kiosk)
+        left.addWidget(self.kiosk_btn)
         cols.addLayout(left, 50)
 
         # RIGHT — result + log
@@ -839,7 +1715,75 @@ class VerifyPage(QWidget):
         self.sub_lbl.setFont(QFont(FONT_UI,       max(10, min(15, int(h * 0.017)))))
         self.pg_title.setFont(QFont(FONT_MONO,    max(12, min(20, int(w * 0.013))), QFont.Bold))
 
+    def _toggle_kiosk(self, on):
+        if on and self._worker is not None and self._worker.isRunning():
+            self.kiosk_btn.setChecked(False)    # one capture at a time
+            return
+        if on:
+            self.verify_btn.setEnabled(False)
+            self.claim_input.setEnabled(False)
+            self.kiosk_btn.setText("■  STOP KIOSK")
+            self._kiosk_ready()
+            self._kiosk = KioskWorker()
+            self._kiosk.matched.connect(self._on_match)
+            self._kiosk.no_match.connect(self._on_no_match)
+            self._kiosk.inconclusive.connect(self._on_inconclusive)
+            self._kiosk.error.connect(self._on_error)
+            self._kiosk.finished.connect(self._kiosk_stopped)
+            self._kiosk.start()
+        elif self._kiosk is not None:
+            self.kiosk_btn.setEnabled(False)
+            self._kiosk.stop()
+
+    def stop_kiosk(self, wait=False):
+        kiosk = self._kiosk
+        if self.kiosk_btn.isChecked():
+            self.kiosk_btn.setChecked(False)
+        if wait and kiosk is not None:
+            kiosk.wait(3000)
+
+    def _kiosk_stopped(self):
+        self._kiosk = None
+        self.kiosk_btn.setEnabled(True)
+        self.kiosk_btn.setChecked(False)
+        self.kiosk_btn.setText("▶  KIOSK MODE — สแกนต่อเนื่อง")
+        self.verify_btn.setEnabled(True)
+        self.claim_input.setEnabled(True)
+        self._set_mode_badge("STANDBY", C["text_dim"])
+
+    def _kiosk_ready(self):
+        """Back to "place finger" a moment after each kiosk result."""
+        if self._kiosk is None and not self.kiosk_btn.isChecked():
+            return
+        self.ring.set_state("scanning")
+        self.status_lbl.setText("PLACE FINGER")
+        self.status_lbl.setStyleSheet(f"color: {C['cyan']}; letter-spacing: 4px;")
+        rate = self._kiosk.rate() if self._kiosk else 0.0
+        self.sub_lbl.setText(f"KIOSK — วางนิ้วได้เลย  ({rate:.0f} คน/นาที)")
+        self._set_mode_badge("KIOSK", C["cyan"])
+
+    def _after_result(self):
+        if self._kiosk is not None:
+            QTimer.singleShot(1200, self._kiosk_ready)
+
+    def verify_claim(self, user_id):
+        """Entry point for a keypad / badge reader: 1:1 verify of `user_id`.
+        → False when rejected: a scan is already running, or kiosk mode owns
+        the reader (a second capture would share its cancel flag and queue)."""
+        if self._busy():
+            return False
+        self.claim_input.setText(str(user_id))
+        self._verify()
+        return True
+
+    def _busy(self):
+        return (self._kiosk is not None
+                or self._worker is not None and self._worker.isRunning())
+
     def _verify(self):
+        if self._busy():
+            return
+        claim = self.claim_input.text().strip() or None
         self.verify_btn.setEnabled(False)
         self.ring.set_state("scanning")
         self.status_lbl.setText("SCANNING...")
@@ -850,15 +1794,17 @@ class VerifyPage(QWidget):
         self.result_icon.setStyleSheet(f"color: {C['cyan']};")
         self.result_name.setText("PROCESSING...")
         self.result_name.setStyleSheet(f"color: {C['cyan']}; letter-spacing: 2px;")
-        self._worker = VerifyWorker()
+        self._worker = VerifyWorker(claim=claim)
         self._worker.matched.connect(self._on_match)
         self._worker.no_match.connect(self._on_no_match)
+        self._worker.inconclusive.connect(self._on_inconclusive)
         self._worker.progress.connect(lambda m: self.sub_lbl.setText(m))
         self._worker.error.connect(self._on_error)
         self._worker.finished.connect(lambda: self.verify_btn.setEnabled(True))
+        self._worker.finished.connect(self.claim_input.clear)
         self._worker.start()
 
-    def _on_match(self, uid):
+    def _on_match(self, uid, score):
         self.ring.set_state("success")
         self.status_lbl.setText("ACCESS GRANTED")
         self.status_lbl.setStyleSheet(f"color: {C['green']}; letter-spacing: 4px;")
@@ -868,9 +1814,10 @@ class VerifyPage(QWidget):
         self.result_name.setText(uid)
         self.result_name.setStyleSheet(f"color: {C['green']}; font-size:18px; letter-spacing:2px;")
         now = datetime.now()
-        self.result_time.setText(f"เวลา {now:%H:%M:%S — %d/%m/%Y}")
+        self.result_time.setText(f"เวลา {now:%H:%M:%S — %d/%m/%Y}  |  SCORE {score}")
         self._set_mode_badge("GRANTED", C["green"])
         self._add_log(uid, "GRANTED", C["green"])
+        self._after_result()
 
     def _on_no_match(self):
         self.ring.set_state("fail")
@@ -885,6 +1832,22 @@ class VerifyPage(QWidget):
         self.result_time.setText(f"เวลา {now:%H:%M:%S — %d/%m/%Y}")
         self._set_mode_badge("DENIED", C["red"])
         self._add_log("UNKNOWN", "DENIED", C["red"])
+        self._after_result()
+
+    def _on_inconclusive(self, coverage):
+        self.ring.set_state("ready")
+        self.status_lbl.setText("INCONCLUSIVE")
+        self.status_lbl.setStyleSheet(f"color: {C['amber']}; letter-spacing: 4px;")
+        self.sub_lbl.setText("หมดเวลาตรวจสอบ — กรุณาสแกนอีกครั้ง")
+        self.result_icon.setText("?")
+        self.result_icon.setStyleSheet(f"color: {C['amber']}; font-size: 52px;")
+        self.result_name.setText("NOT CONFIRMED")
+        self.result_name.setStyleSheet(f"color: {C['amber']}; font-size:18px; letter-spacing:2px;")
+        now = datetime.now()
+        self.result_time.setText(f"เวลา {now:%H:%M:%S — %d/%m/%Y}  |  COVERAGE {coverage:.0%}")
+        self._set_mode_badge("RETRY", C["amber"])
+        self._add_log("UNKNOWN", "TIMEOUT", C["amber"])
+        self._after_result()
 
     def _on_error(self, msg):
         self.ring.set_state("fail")
@@ -895,6 +1858,7 @@ class VerifyPage(QWidget):
         self.result_icon.setStyleSheet(f"color: {C['amber']};")
         self.result_name.setText("SYSTEM ERROR")
         self.result_name.setStyleSheet(f"color: {C['amber']}; letter-spacing: 2px;")
+        self._after_result()
 
     def _set_mode_badge(self, text, color):
         self.mode_badge.setText(f" {text} ")
@@ -928,7 +1892,212 @@ class VerifyPage(QWidget):
 # ══════════════════════════════════════════════════════════════
 # RECORDS PAGE
 # ══════════════════════════════════════════════════════════════
+class RecordsModel(QAbstractTableModel):
+    """fingerprints rows, newest first, fetched `page` rows at a time as the
+    view scrolls (canFetchMore / fetchMore) — each page on a RecordsWorker,
+    keyset-paged on id and streamed in chunks, so the GUI thread only ever
+    inserts finished rows.  reload() cancels the query it replaces.
+
+    refresh() keeps what is loaded and applies only what changed since the
+    watermark (RecordsDeltaWorker): changed rows are updated in place, new
+    ones inserted at their position, deleted ones removed, and the count is
+    adjusted — no full query, no model reset.  drop(fid) removes a row the
+    app itself deleted right away."""
+
+    HEADERS = ["#", "USER ID / NAME", "TEMPLATE SIZE", "REGISTERED"]
+
+    counted = pyqtSignal(int)          # rows matching the current filter
+    failed  = pyqtSignal(str)
+
+    def __init__(self, page=200, parent=None):
+        super().__init__(parent)
+        self._page   = page
+        self._rows   = []
+        self._text   = ""
+        self._gen    = 0              # bumped per reload; older pages are dropped
+        self._done   = True
+        self._worker = None
+        self._mark   = None           # (server time, max id) the rows are current to
+        self._total  = None
+        self._gone   = set()          # deleted ids already counted (outside the loaded range)
+
+    # ── Qt model interface ────────────────────────────────────
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        fid, uid, sz, ts = self._rows[index.row()]
+        col = index.column()
+        if col == 0:
+            return str(fid)
+        if col == 1:
+            return str(uid)
+        if col == 2:
+            return f"{sz:,} B"
+        return str(ts)[:19] if ts else "—"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._done and self._worker is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetch()
+
+    # ── Loading ───────────────────────────────────────────────
+    def reload(self, text=""):
+        """Drop everything and start again from the newest row."""
+        if self._worker is not None:
+            self._worker.cancel()
+        self._gen += 1
+        self.beginResetModel()
+        self._rows, self._text, self._done = [], text, False
+        self.endResetModel()
+        self._mark, self._total = None, None
+        self._gone.clear()
+        self._fetch(count=True)
+
+    def refresh(self, text=""):
+        """Bring the loaded rows up to date — a full reload only the first
+        time, after an error or when the search changed."""
+        if self._mark is None or text != self._text:
+            if self._worker is None or text != self._text:
+                self.reload(text)
+            return
+        if self._worker is not None:
+            return                  # a page or delta is already on its way
+        w = self._worker = RecordsDeltaWorker(self._gen, self._mark, self._text, self._page, parent=self)
+        w.delta.connect(self._apply_delta)
+        w.overflow.connect(self._on_overflow)
+        w.error.connect(self._on_delta_error)
+        w.finished.connect(lambda: self._retire(w))
+        w.start()
+
+    def drop(self, fid):
+        """Remove one row now (it was deleted in this process)."""
+        for i, row in enumerate(self._rows):
+            if row[0] == fid:
+                self._remove(i)
+                self._gone.add(fid)
+                self._recount(-1)
+                return
+
+    def _fetch(self, count=False):
+        after = self._rows[-1][0] if self._rows else None
+        w = self._worker = RecordsWorker(self._gen, after, self._text, self._page, count, parent=self)
+        w.rows.connect(self._on_rows)
+        w.done.connect(self._on_done)
+        w.error.connect(self._on_error)
+        w.finished.connect(lambda: self._retire(w))
+        w.start()
+
+    def _retire(self, worker):
+        # one QThread per page / delta / keystroke — delete each when it ends
+        if self._worker is worker:
+            self._worker = None
+        worker.deleteLater()
+
+    def _on_rows(self, gen, rows):
+        if gen != self._gen:
+            return
+        n = len(self._rows)
+        self.beginInsertRows(QModelIndex(), n, n + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def _on_done(self, gen, n, total, mark):
+        if gen != self._gen:
+            return
+        self._worker = None
+        self._done   = n < self._page
+        if mark is not None:
+            self._mark = mark
+        if total is not None:
+            self._total = total
+            self.counted.emit(total)
+
+    # ── Incremental refresh ───────────────────────────────────
+    def _apply_delta(self, gen, changed, deleted, mark):
+        if gen != self._gen:
+            return
+        self._worker = None
+        self._mark   = mark
+        pos   = {row[0]: i for i, row in enumerate(self._rows)}
+        floor = None if self._done or not self._rows else self._rows[-1][0]
+        drop, diff = set(), 0
+        for fid, hit in deleted:
+            if fid in pos:
+                drop.add(fid)
+            elif floor is not None and fid < floor and hit and fid not in self._gone:
+                diff -= 1           # matched, but not scrolled into view yet
+            self._gone.add(fid)
+        fresh = []
+        for fid, uid, sz, ts, hit in changed:
+            if fid in self._gone:
+                continue
+            if fid in pos:
+                if not hit:         # no longer matches the search
+                    drop.add(fid)
+                else:
+                    i = pos[fid]
+                    self._rows[i] = (fid, uid, sz, ts)
+                    self.dataChanged.emit(self.index(i, 0), self.index(i, len(self.HEADERS) - 1))
+            elif hit and (floor is None or fid > floor):
+                fresh.append((fid, uid, sz, ts))
+        for i in sorted((pos[f] for f in drop), reverse=True):
+            self._remove(i)
+        diff -= len(drop)
+        for row in sorted(fresh, reverse=True):
+            i = 0
+            while i < len(self._rows) and self._rows[i][0] > row[0]:
+                i += 1
+            self.beginInsertRows(QModelIndex(), i, i)
+            self._rows.insert(i, row)
+            self.endInsertRows()
+        self._recount(diff + len(fresh))
+
+    def _on_delta_error(self, gen, msg):
+        if gen == self._gen:
+            self._worker = None     # rows and watermark kept; the next visit retries
+            self.failed.emit(msg)
+
+    def _on_overflow(self, gen):
+        if gen == self._gen:
+            self._worker = None
+            self.reload(self._text)
+
+    def _remove(self, i):
+        self.beginRemoveRows(QModelIndex(), i, i)
+        del self._rows[i]
+        self.endRemoveRows()
+
+    def _recount(self, diff):
+        # a capped count (COUNT_CAP+) stays capped; REFRESH recounts exactly
+        if diff and self._total is not None and self._total <= RecordsWorker.COUNT_CAP:
+            self._total = max(0, self._total + diff)
+            self.counted.emit(self._total)
+
+    def _on_error(self, gen, msg):
+        if gen != self._gen:
+            return
+        self._worker = None
+        self._done   = True           # no retry loop; REFRESH starts over
+        self._mark   = None
+        self.failed.emit(msg)
+
+
 class RecordsPage(QWidget):
+    changed = pyqtSignal(str, int)      # GALLERY event → GUI thread
+
     def __init__(self):
         super().__init__()
         self.setStyleSheet(f"background: {C['bg']};")
@@ -961,63 +2130,49 @@ class RecordsPage(QWidget):
         srch_row = QHBoxLayout()
         self.search = styled_input("ค้นหา ID หรือชื่อ...")
         self.search.setMaximumHeight(38)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(int(os.getenv("SEARCH_DEBOUNCE_MS", "250")))
+        self._debounce.timeout.connect(self._load)
         self.search.textChanged.connect(self._filter)
+        # rows written / removed by this process: applied as soon as they land
+        self._soon = QTimer(self)
+        self._soon.setSingleShot(True)
+        self._soon.setInterval(300)
+        self._soon.timeout.connect(self.refresh)
+        self.changed.connect(self._on_change)
+        GALLERY.subscribe(lambda event, *args: self.changed.emit(event, args[0] if args else 0))
         srch_row.addWidget(self.search)
         root.addLayout(srch_row)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["#", "USER ID / NAME", "TEMPLATE SIZE", "REGISTERED"])
-        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
-        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        self.table.setColumnWidth(0, 50)
+        self.model = RecordsModel(int(os.getenv("RECORDS_PAGE", "200")), self)
+        self.model.counted.connect(self._set_count)
+        self.model.failed.connect(lambda msg: Dialog.error(self, "Database Error", msg))
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        # fixed widths and one row height: nothing is measured per row
+        hh = self.table.horizontalHeader()
+        hh.setSectionResizeMode(QHeaderView.Fixed)
+        hh.setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.setColumnWidth(0, 90)
+        self.table.setColumnWidth(2, 160)
+        self.table.setColumnWidth(3, 210)
+        vh = self.table.verticalHeader()
+        vh.setVisible(False)
+        vh.setSectionResizeMode(QHeaderView.Fixed)
+        vh.setDefaultSectionSize(44)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setAlternatingRowColors(True)
         self.table.setShowGrid(False)
-        self.table.verticalHeader().setVisible(False)
         self._apply_table_style(13, 11)
         root.addWidget(self.table)
 
-        self._all_rows = []
         self._load()
 
     def _apply_table_style(self, body_pt, hdr_pt):
-        self.table.setStyleSheet(f"""
-            QTableWidget {{
-                background-color: {C['surface']};
-                border: 1px solid {C['border']};
-                border-radius: 4px;
-                font-family: {FONT_MONO};
-                font-size: {body_pt}px;
-                color: {C['text']};
-                outline: none;
-            }}
-            QTableWidget::item {{
-                padding: 10px 16px;
-                border-bottom: 1px solid {C['elevated']};
-            }}
-            QTableWidget::item:selected {{
-                background-color: {C['cyan_glow']};
-                color: {C['cyan']};
-            }}
-            QTableWidget::item:alternate {{
-                background-color: {C['bg']};
-            }}
-            QHeaderView::section {{
-                background-color: {C['elevated']};
-                color: {C['text_dim']};
-                font-family: {FONT_MONO};
-                font-size: {hdr_pt}px;
-                font-weight: 700;
-                letter-spacing: 2px;
-                border: none;
-                border-bottom: 1px solid {C['border']};
-                border-right: 1px solid {C['border']};
-                padding: 10px 16px;
-            }}
-        """)
+        self.table.setStyleSheet(table_style(body_pt, hdr_pt))
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -1027,37 +2182,31 @@ class RecordsPage(QWidget):
             max(11, min(16, int(h * 0.018))),
             max(9,  min(14, int(h * 0.015)))
         )
-        row_h = max(38, min(56, int(h * 0.065)))
-        for i in range(self.table.rowCount()):
-            self.table.setRowHeight(i, row_h)
+        self.table.verticalHeader().setDefaultSectionSize(max(38, min(56, int(h * 0.065))))
 
     def _load(self):
-        try:
-            conn = get_connection()
-            cur  = conn.cursor()
-            cur.execute(
-                "SELECT id, user_id, template_size, created_at FROM fingerprints ORDER BY id DESC"
-            )
-            self._all_rows = cur.fetchall()
-            cur.close(); conn.close()
-            self._render(self._all_rows)
-        except Exception as e:
-            Dialog.error(self, "Database Error", str(e))
+        self._debounce.stop()
+        self.model.reload(self.search.text().strip())
 
-    def _render(self, rows):
-        self.table.setRowCount(len(rows))
-        row_h = max(38, min(56, int(self.height() * 0.065)))
-        for i, row in enumerate(rows):
-            fid = row[0]; uid = row[1]; sz = row[2]
-            ts  = row[3] if len(row) > 3 and row[3] else "—"
-            self.table.setItem(i, 0, QTableWidgetItem(str(fid)))
-            self.table.setItem(i, 1, QTableWidgetItem(str(uid)))
-            self.table.setItem(i, 2, QTableWidgetItem(f"{sz:,} B"))
-            self.table.setItem(i, 3, QTableWidgetItem(str(ts)[:19] if ts != "—" else "—"))
-            self.table.setRowHeight(i, row_h)
-        n     = len(rows)
+    def refresh(self):
+        """Tab revisited: fetch only what changed since the last load."""
+        if self._debounce.isActive():
+            self._load()
+        else:
+            self.model.refresh(self.search.text().strip())
+
+    def _on_change(self, event, fid):
+        if event == "remove":
+            self.model.drop(fid)
+        elif event == "add" and self.isVisible():
+            self._soon.start()
+
+    def _set_count(self, n):
         color = C["cyan"] if n > 0 else C["text_dim"]
-        self.count_badge.setText(f" {n} RECORD{'S' if n != 1 else ''} ")
+        if n > RecordsWorker.COUNT_CAP:
+            self.count_badge.setText(f" {RecordsWorker.COUNT_CAP:,}+ RECORDS ")
+        else:
+            self.count_badge.setText(f" {n:,} RECORD{'S' if n != 1 else ''} ")
         self.count_badge.setStyleSheet(
             f"color:{color}; border:1px solid {color}; border-radius:2px; "
             f"padding:3px 8px; letter-spacing:1px; "
@@ -1065,22 +2214,212 @@ class RecordsPage(QWidget):
         )
 
     def _filter(self, text):
-        if not text:
-            self._render(self._all_rows)
-            return
-        self._render([r for r in self._all_rows if text.lower() in str(r[1]).lower()])
+        self._debounce.start()          # one query once typing pauses
+
+
+# ══════════════════════════════════════════════════════════════
+# HISTORY PAGE
+# ══════════════════════════════════════════════════════════════
+class HistoryPage(QWidget):
+    """access_events browser: time range + user filter, paged on the server
+    (HISTORY_PAGE rows per page, keyset on occurred_at / id)."""
+
+    RANGES = [("1H", 3600), ("24H", 86400), ("7D", 7 * 86400), ("30D", 30 * 86400)]
+    RESULT = {
+        "match":        ("GRANTED", "green"),
+        "no_match":     ("DENIED",  "red"),
+        "inconclusive": ("TIMEOUT", "amber"),
+        "no_capture":   ("NO SCAN", "text_dim"),
+        "error":        ("ERROR",   "amber"),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self._range   = 86400
+        self._until   = None
+        self._cursors = [None]        # `after` of every page visited; last = current
+        self._rows    = []
+        self._worker  = None
+        self._limit   = int(os.getenv("HISTORY_PAGE", "100"))
+        self.setStyleSheet(f"background: {C['bg']};")
+        self._build()
+
+    def _build(self):
+        root = QVBoxLayout(self)
+        root.setContentsMargins(28, 24, 28, 28)
+        root.setSpacing(14)
+
+        hdr = QHBoxLayout()
+        self.pg_title = QLabel("ACCESS HISTORY")
+        self.pg_title.setFont(QFont(FONT_MONO, 17, QFont.Bold))
+        self.pg_title.setStyleSheet(f"color: {C['text_hi']}; letter-spacing: 2px;")
+        hdr.addWidget(self.pg_title)
+        hdr.addStretch()
+        self.page_badge = status_badge("PAGE 1", C["text_dim"])
+        hdr.addWidget(self.page_badge)
+        refresh = outline_btn("↺ REFRESH")
+        refresh.setMinimumHeight(36); refresh.setMaximumWidth(130)
+        refresh.setFont(QFont(FONT_UI, 9))
+        refresh.clicked.connect(self.reload)
+        hdr.addWidget(refresh)
+        root.addLayout(hdr)
+
+        rule = QFrame(); rule.setFrameShape(QFrame.HLine)
+        rule.setStyleSheet(f"color: {C['border']};")
+        root.addWidget(rule)
+
+        flt = QHBoxLayout(); flt.setSpacing(8)
+        self._range_btns = []
+        for label, secs in self.RANGES:
+            b = outline_btn(label)
+            b.setCheckable(True); b.setChecked(secs == self._range)
+            b.setMinimumHeight(38); b.setMaximumWidth(80)
+            b.setFont(QFont(FONT_MONO, 10, QFont.Bold))
+            b.clicked.connect(lambda _, s=secs: self._set_range(s))
+            flt.addWidget(b)
+            self._range_btns.append((b, secs))
+        self.denied_btn = outline_btn("DENIED ONLY")
+        self.denied_btn.setCheckable(True)
+        self.denied_btn.setMinimumHeight(38); self.denied_btn.setMaximumWidth(140)
+        self.denied_btn.setFont(QFont(FONT_MONO, 10, QFont.Bold))
+        self.denied_btn.toggled.connect(lambda _: self.reload())
+        flt.addWidget(self.denied_btn)
+        self.user_filter = styled_input("USER ID ขึ้นต้นด้วย...")
+        self.user_filter.setMaximumHeight(38)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(300)
+        self._debounce.timeout.connect(self.reload)
+        self.user_filter.textChanged.connect(lambda _: self._debounce.start())
+        flt.addWidget(self.user_filter, 1)
+        root.addLayout(flt)
+
+        self.table = QTableWidget()
+        self.table.setColumnCount(8)
+        self.table.setHorizontalHeaderLabels(
+            ["TIME", "USER ID", "RESULT", "SCORE", "CAPTURE", "SEARCH", "TOTAL", "STATION"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.setShowGrid(False)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setStyleSheet(table_style(13, 11))
+        root.addWidget(self.table)
+
+        pager = QHBoxLayout()
+        self.newer_btn = outline_btn("◀  NEWER")
+        self.newer_btn.setMinimumHeight(38); self.newer_btn.setMaximumWidth(140)
+        self.newer_btn.clicked.connect(self._newer)
+        self.older_btn = outline_btn("OLDER  ▶")
+        self.older_btn.setMinimumHeight(38); self.older_btn.setMaximumWidth(140)
+        self.older_btn.clicked.connect(self._older)
+        self.info_lbl = QLabel("")
+        self.info_lbl.setFont(QFont(FONT_MONO, 10))
+        self.info_lbl.setStyleSheet(f"color: {C['text_muted']};")
+        pager.addWidget(self.newer_btn)
+        pager.addStretch()
+        pager.addWidget(self.info_lbl)
+        pager.addStretch()
+        pager.addWidget(self.older_btn)
+        root.addLayout(pager)
+
+    # ── Paging ────────────────────────────────────────────────
+    def _set_range(self, secs):
+        self._range = secs
+        for b, s in self._range_btns:
+            b.setChecked(s == secs)
+        self.reload()
+
+    def reload(self):
+        """Back to the newest page; the window end is pinned until the next
+        reload so paging is not shifted by events arriving meanwhile."""
+        self._until   = datetime.now(timezone.utc)
+        self._cursors = [None]
+        self._fetch()
+
+    def _older(self):
+        if self._rows:
+            last = self._rows[-1]
+            self._cursors.append((last[1], last[0]))
+            self._fetch()
+
+    def _newer(self):
+        if len(self._cursors) > 1:
+            self._cursors.pop()
+            self._fetch()
+
+    def _fetch(self):
+        if self._worker is not None and self._worker.isRunning():
+            self._worker.loaded.disconnect()      # a newer request wins
+            self._worker.error.disconnect()
+        self.newer_btn.setEnabled(False)
+        self.older_btn.setEnabled(False)
+        self.info_lbl.setText("กำลังโหลด...")
+        w = self._worker = HistoryWorker(
+            self._until - timedelta(seconds=self._range), self._until,
+            after=self._cursors[-1],
+            user=self.user_filter.text().strip() or None,
+            result="no_match" if self.denied_btn.isChecked() else None,
+            limit=self._limit, parent=self)
+        w.loaded.connect(self._render)
+        w.error.connect(self._on_error)
+        w.finished.connect(lambda: self._retire(w))
+        w.start()
+
+    def _retire(self, worker):
+        if self._worker is worker:
+            self._worker = None
+        worker.deleteLater()
+
+    def _on_error(self, msg):
+        self.info_lbl.setText(msg)
+        self.newer_btn.setEnabled(len(self._cursors) > 1)
+
+    def _render(self, rows):
+        self._rows = rows
+        self.table.setRowCount(len(rows))
+        for i, (eid, at, station, mode, result, uid, score, cap, srch, total) in enumerate(rows):
+            text, color = self.RESULT.get(result, (result.upper(), "text"))
+            cells = [
+                at.astimezone().strftime("%d/%m/%Y %H:%M:%S"),
+                uid or "—",
+                text,
+                "—" if score is None else str(score),
+                "—" if cap   is None else f"{cap:,.0f} ms",
+                "—" if srch  is None else f"{srch:,.0f} ms",
+                "—" if total is None else f"{total:,.0f} ms",
+                f"{station or '—'} · {mode}",
+            ]
+            for col, val in enumerate(cells):
+                item = QTableWidgetItem(val)
+                if col == 2:
+                    item.setForeground(QColor(C[color]))
+                self.table.setItem(i, col, item)
+        n = len(self._cursors)
+        self.page_badge.setText(f" PAGE {n} ")
+        self.info_lbl.setText(f"{len(rows)} EVENTS" if rows else "ไม่มีรายการในช่วงเวลานี้")
+        self.newer_btn.setEnabled(n > 1)
+        self.older_btn.setEnabled(len(rows) == self._limit)
 
 
 # ══════════════════════════════════════════════════════════════
 # MAIN WINDOW
 # ══════════════════════════════════════════════════════════════
 class MainWindow(QMainWindow):
+    # stack order = tab order; only the first is built before the window shows
+    PAGES = (("page_reg", RegisterPage), ("page_verify", VerifyPage),
+             ("page_rec", RecordsPage), ("page_hist", HistoryPage))
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Fingerprint Access Control System")
         self.setMinimumSize(1000, 660)
         self.resize(1200, 740)
         self.setStyleSheet(f"background: {C['bg']}; color: {C['text']};")
+        self._painted = False
+        self._pages   = [None] * len(self.PAGES)
         self._build()
 
     def _build(self):
@@ -1093,6 +2432,7 @@ class MainWindow(QMainWindow):
         # Status bar
         self.status_bar = StatusBar()
         root_v.addWidget(self.status_bar)
+        GALLERY.on_progress(self.status_bar.gallery_status.emit)
 
         # Nav bar
         self.nav_bar = QFrame()
@@ -1107,9 +2447,11 @@ class MainWindow(QMainWindow):
         self.tab_register = NavButton("✋", "REGISTER")
         self.tab_verify   = NavButton("◉",  "VERIFY")
         self.tab_records  = NavButton("☰",  "RECORDS")
+        self.tab_history  = NavButton("⏱",  "HISTORY")
         self.tab_register.setChecked(True)
+        self.tabs = [self.tab_register, self.tab_verify, self.tab_records, self.tab_history]
 
-        for tab in [self.tab_register, self.tab_verify, self.tab_records]:
+        for tab in self.tabs:
             tab.setMinimumWidth(180)
             tab.setFixedHeight(80)
             tab.setFont(QFont(FONT_UI, 11, QFont.Bold))
@@ -1125,12 +2467,10 @@ class MainWindow(QMainWindow):
         # Page stack
         self.stack = QStackedWidget()
         self.stack.setStyleSheet(f"background: {C['bg']};")
-        self.page_reg    = RegisterPage()
-        self.page_verify = VerifyPage()
-        self.page_rec    = RecordsPage()
-        self.stack.addWidget(self.page_reg)
-        self.stack.addWidget(self.page_verify)
-        self.stack.addWidget(self.page_rec)
+        for attr, _ in self.PAGES:
+            setattr(self, attr, None)
+            self.stack.addWidget(QWidget())     # placeholder until first visit
+        self._page(0)
         root_v.addWidget(self.stack)
 
         # Footer
@@ -1139,10 +2479,10 @@ class MainWindow(QMainWindow):
         footer.setStyleSheet(f"background: {C['surface']}; border-top: 1px solid {C['border']};")
         f_layout = QHBoxLayout(footer)
         f_layout.setContentsMargins(24, 0, 24, 0)
-        left_f = QLabel("● READY")
-        left_f.setFont(QFont(FONT_MONO, 10))
-        left_f.setStyleSheet(f"color: {C['green']};")
-        f_layout.addWidget(left_f)
+        self.ready_lbl = QLabel("● READY")
+        self.ready_lbl.setFont(QFont(FONT_MONO, 10))
+        self.ready_lbl.setStyleSheet(f"color: {C['green']};")
+        f_layout.addWidget(self.ready_lbl)
         f_layout.addStretch()
         right_f = QLabel("© 2025 Fingerprint ACS | Powered by INTEGRATED SUPPLIES")
         right_f.setFont(QFont(FONT_MONO, 10))
@@ -1154,13 +2494,50 @@ class MainWindow(QMainWindow):
         self.tab_register.clicked.connect(lambda: self._nav(0))
         self.tab_verify.clicked.connect(lambda: self._nav(1))
         self.tab_records.clicked.connect(lambda: self._nav(2))
+        self.tab_history.clicked.connect(lambda: self._nav(3))
+
+    def _page(self, idx):
+        """The page at idx, built (and swapped in for its placeholder) on first use."""
+        page = self._pages[idx]
+        if page is None:
+            attr, cls = self.PAGES[idx]
+            page = cls()
+            placeholder = self.stack.widget(idx)
+            self.stack.removeWidget(placeholder)
+            placeholder.deleteLater()
+            self.stack.insertWidget(idx, page)
+            self._pages[idx] = page
+            setattr(self, attr, page)
+        return page
 
     def _nav(self, idx):
+        page = self._page(idx)
         self.stack.setCurrentIndex(idx)
-        for i, t in enumerate([self.tab_register, self.tab_verify, self.tab_records]):
+        for i, t in enumerate(self.tabs):
             t.setChecked(i == idx)
+        if idx != 1 and self.page_verify is not None:
+            self.page_verify.stop_kiosk()
         if idx == 2:
-            self.page_rec._load()
+            page.refresh()
+        if idx == 3:
+            page.reload()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            QTimer.singleShot(0, self._first_frame)
+
+    def _first_frame(self):
+        STARTUP.mark("first frame")
+        ms = STARTUP.report()
+        self.ready_lbl.setText(f"● READY · START {ms:,.0f} ms")
+        threading.Thread(target=start_services, args=(self,), daemon=True).start()
+
+    def closeEvent(self, event):
+        if self.page_verify is not None:
+            self.page_verify.stop_kiosk(wait=True)
+        super().closeEvent(event)
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
@@ -1168,7 +2545,7 @@ class MainWindow(QMainWindow):
         nav_h    = max(60, min(100, int(h * 0.11)))
         tab_font = max(9,  min(14,  int(h * 0.015)))
         self.nav_bar.setFixedHeight(nav_h)
-        for tab in [self.tab_register, self.tab_verify, self.tab_records]:
+        for tab in self.tabs:
             tab.setFixedHeight(nav_h - 4)
             tab.setFont(QFont(FONT_UI, tab_font, QFont.Bold))
         self.status_bar.setFixedHeight(max(40, min(60, int(h * 0.07))))
@@ -1178,6 +2555,7 @@ class MainWindow(QMainWindow):
 # ENTRY
 # ══════════════════════════════════════════════════════════════
 if __name__ == "__main__":
+    STARTUP.profile()
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     pal = QPalette()
@@ -1193,6 +2571,9 @@ if __name__ == "__main__":
     pal.setColor(QPalette.Mid,             QColor(C["border"]))
     pal.setColor(QPalette.Dark,            QColor(C["border_hi"]))
     app.setPalette(pal)
+    app.aboutToQuit.connect(shutdown)
+    STARTUP.mark("qt")
     w = MainWindow()
+    STARTUP.mark("window")
     w.show()
     sys.exit(app.exec_())
\ No newline at end of file
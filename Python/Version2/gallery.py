@@ -0,0 +1,485 @@
+"""
+gallery.py
+──────────
+Process-wide, in-memory cache of enrolled fingerprint templates.
+
+The gallery is pulled from PostgreSQL once, decoded once, and then handed
+to the matcher for every verify.  Writers (RegisterPage, sync jobs) keep it
+current through add() / remove() instead of forcing a full reload.
+
+Usage:
+    from gallery import TemplateGallery, HitStats
+
+    gallery = TemplateGallery(get_connection, stats=HitStats("hit_stats.json"))
+    for fid, uid, tpl in gallery.entries():      # loads on first use
+        ...
+    gallery.add(fid, "EMP-0042", template_b64)    # after INSERT
+    gallery.invalidate()                          # next access reloads
+    gallery.record_hit(fid)                       # after a successful match
+    gallery.ordered_entries()                     # frequent / recent users first
+    gallery.find_exact(template_b64)              # same bytes already enrolled?
+
+With snapshot=path the gallery is also kept in a memory-mapped file
+(gallery_snapshot.py): load_snapshot() fills it without touching the
+database, every DB load and add() / remove() rewrites the file shortly
+after, and ensure_loaded() falls back to it when the database is down.
+`source` says where the current rows came from ("db" / "snapshot").
+
+refresh() streams the table through a server-side cursor, LOAD_BATCH rows
+at a time, and reports on_progress(fn) as it goes.  Only one load runs at
+a time: a second refresh() / ensure_loaded() waits for the one in flight
+and shares its result.
+
+Storage format (fingerprints.template_format):
+    0  legacy — the base64 text encoded to bytes
+    1  raw template bytes, with template_hash = sha256(raw) and
+       template_size = len(raw)      (migrate_templates.py converts old rows)
+In memory every template is base64 text, which is what the matchers take.
+"""
+
+import base64, binascii, hashlib, json, math, os, threading, time
+
+import gallery_snapshot
+
+TEMPLATE_BASE64 = 0
+TEMPLATE_RAW    = 1
+
+
+def decode_template(raw, fmt=TEMPLATE_BASE64):
+    """BYTEA column → base64 str (what compare.exe expects)."""
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        return raw
+    if fmt == TEMPLATE_RAW:
+        return base64.b64encode(bytes(raw)).decode()
+    return bytes(raw).decode()
+
+
+def encode_template(b64):
+    """base64 str → (raw bytes, sha256 digest) for a TEMPLATE_RAW row.
+    Raises ValueError on text that is not valid base64."""
+    try:
+        raw = base64.b64decode(b64, validate=True)
+    except binascii.Error as e:
+        raise ValueError(f"invalid template: {e}")
+    return raw, hashlib.sha256(raw).digest()
+
+
+def template_digest(b64):
+    """sha256 of the raw template bytes — the template_hash column — or None
+    for text that is not valid base64."""
+    try:
+        return hashlib.sha256(base64.b64decode(b64, validate=True)).digest()
+    except binascii.Error:
+        return None
+
+
+class HitStats:
+    """Exponentially decayed match counts per fid, bounded and persisted.
+
+    score(fid) = hits decayed with a half-life, so a user seen daily outranks
+    one seen often last month.  Only `capacity` fids are kept; the coldest are
+    evicted.  The table is saved as JSON (write-then-rename) every
+    `save_every` hits and on save().
+    """
+
+    def __init__(self, path=None, half_life_h=72.0, capacity=2000, save_every=20):
+        self.path       = path
+        self.capacity   = capacity
+        self.save_every = save_every
+        self._lambda    = math.log(2) / (half_life_h * 3600.0)
+        self._lock      = threading.Lock()
+        self._hits      = {}          # fid -> (decayed count, last hit epoch)
+        self._dirty     = 0
+        self._load()
+
+    def _decayed(self, fid, now):
+        count, last = self._hits[fid]
+        return count * math.exp(-self._lambda * (now - last))
+
+    def record(self, fid, now=None):
+        now = now or time.time()
+        with self._lock:
+            base = self._decayed(fid, now) if fid in self._hits else 0.0
+            self._hits[fid] = (base + 1.0, now)
+            if len(self._hits) > self.capacity:
+                self._evict(now)
+            self._dirty += 1
+            flush = self.path and self._dirty >= self.save_every
+        if flush:
+            self.save()
+
+    def forget(self, fid):
+        with self._lock:
+            self._hits.pop(fid, None)
+
+    def ranked(self, now=None):
+        """fids hottest first."""
+        now = now or time.time()
+        with self._lock:
+            return sorted(self._hits, key=lambda f: self._decayed(f, now), reverse=True)
+
+    def _evict(self, now):
+        keep = sorted(self._hits, key=lambda f: self._decayed(f, now), reverse=True)
+        keep = keep[:int(self.capacity * 0.9)]
+        self._hits = {f: self._hits[f] for f in keep}
+
+    # ── Persistence ───────────────────────────────────────────
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self._hits = {int(k): (float(c), float(t)) for k, (c, t) in data["hits"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print("hit stats ignored:", e)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"version": 1, "hits": {str(k): list(v) for k, v in self._hits.items()}}
+            self._dirty = 0
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print("hit stats not saved:", e)
+
+
+class TemplateGallery:
+    """Thread-safe fid → (user_id, template) cache with change listeners."""
+
+    SAVE_DELAY = 2.0                  # s to gather changes before rewriting the snapshot
+    LOAD_BATCH = 500                  # rows per server-side cursor fetch
+
+    def __init__(self, connect, stats=None, snapshot=None):
+        self._connect   = connect
+        self.stats      = stats
+        self.snapshot_path = snapshot
+        self.source     = None        # "db" | "snapshot" once loaded
+        self._save_timer = None
+        self._lock      = threading.RLock()
+        self._rows      = {}          # fid -> (user_id, template_b64)
+        self._by_user   = {}          # user_id -> [fid, ...] for 1:1 verify
+        self._by_hash   = {}          # sha256(raw template) -> fid, exact duplicates
+        self._snapshot  = None        # cached tuple for readers
+        self._ordered   = None        # cached tuple, hottest fids first
+        self._loaded    = False
+        self._listeners = []
+        self._progress  = []
+        self._inflight  = None        # Event of the load in progress
+        self._replay    = None        # [(op, ...)] add / remove made during that load
+        self._load_error = None
+        self.version    = 0
+
+    # ── Loading ───────────────────────────────────────────────
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        try:
+            self.refresh()          # joins a load already in flight
+        except Exception as e:
+            if self._loaded or self.load_snapshot():
+                print("gallery: database unavailable, matching against the snapshot:", e)
+            else:
+                raise
+
+    def refresh(self):
+        """Full reload from the database; concurrent callers share one load."""
+        with self._lock:
+            done = self._inflight
+            if done is None:
+                self._inflight = threading.Event()
+                self._replay   = []
+        if done is not None:
+            done.wait()
+            if self._load_error is not None:
+                raise self._load_error
+            return
+        try:
+            self._load_error = None
+            self._load()
+        except Exception as e:
+            self._load_error = e
+            self._report(-1, 0)
+            raise
+        finally:
+            with self._lock:
+                done, self._inflight = self._inflight, None
+                self._replay = None
+            done.set()
+        self._schedule_save()
+
+    def _load(self):
+        fresh, by_user, by_hash = {}, {}, {}
+        conn = self._connect()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT count(*) FROM fingerprints")
+                total = cur.fetchone()[0]
+            self._report(0, total)
+            # server-side cursor: rows arrive LOAD_BATCH at a time, decoded as they come
+            with conn.cursor(name="gallery_load") as cur:
+                cur.itersize = self.LOAD_BATCH
+                cur.execute("SELECT id, user_id, template, template_format, template_hash "
+                            "FROM fingerprints ORDER BY id")
+                done = 0
+                while True:
+                    rows = cur.fetchmany(self.LOAD_BATCH)
+                    if not rows:
+                        break
+                    for fid, uid, raw, fmt, digest in rows:
+                        tpl = decode_template(raw, fmt)
+                        if tpl:
+                            fresh[fid] = (str(uid), tpl)
+                            by_user.setdefault(str(uid), []).append(fid)
+                            digest = bytes(digest) if digest else template_digest(tpl)   # legacy rows
+                            if digest:
+                                by_hash.setdefault(digest, fid)
+                    done += len(rows)
+                    self._report(done, max(total, done))
+        finally:
+            conn.close()
+        self._install(fresh, by_user, by_hash, "db")
+        self._report(len(fresh), len(fresh))
+
+    def loading(self):
+        """True while a refresh() is in flight."""
+        return self._inflight is not None
+
+    def on_progress(self, fn):
+        """fn(done, total) while loading — called on the loading thread.
+        done == total when finished, done == -1 when the load failed."""
+        self._progress.append(fn)
+
+    def _report(self, done, total):
+        for fn in list(self._progress):
+            try:
+                fn(done, total)
+            except Exception as e:
+                print("gallery progress listener error:", e)
+
+    def _install(self, fresh, by_user, by_hash, source):
+        with self._lock:
+            if source == "snapshot" and self.source == "db":
+                return              # a database load won the race; keep it
+            self._rows    = fresh
+            self._by_user = by_user
+            self._by_hash = by_hash
+            # enrollments / deletions made while the rows were streaming in
+            # may be missing from (or still in) `fresh`
+            for op in self._replay or ():
+                if op[0] == "add":
+                    self._put(*op[1:])
+                else:
+                    self._drop(op[1])
+            self._loaded  = True
+            self.source   = source
+            self._changed()
+        self._notify("reset")
+
+    # ── Snapshot file ─────────────────────────────────────────
+    def load_snapshot(self):
+        """Fill the gallery from the snapshot file → False when there is none
+        (or it is unreadable).  No database access."""
+        if not self.snapshot_path:
+            return False
+        if self.source == "db":
+            return True             # already current
+        try:
+            snap = gallery_snapshot.Snapshot.open(self.snapshot_path)
+        except gallery_snapshot.SnapshotError as e:
+            if os.path.exists(self.snapshot_path):
+                print("gallery snapshot ignored:", e)
+            return False
+        fresh, by_user, by_hash = {}, {}, {}
+        with snap:
+            for fid, uid, raw in snap:
+                fresh[fid] = (uid, base64.b64encode(raw).decode())
+                by_user.setdefault(uid, []).append(fid)
+                by_hash.setdefault(hashlib.sha256(raw).digest(), fid)
+            raw = None              # last slice released, so close() can unmap
+            age = snap.age()
+        self._install(fresh, by_user, by_hash, "snapshot")
+        self._report(len(fresh), len(fresh))
+        print(f"gallery: {len(fresh)} templates from snapshot ({age / 3600:.1f} h old)")
+        return True
+
+    def save_snapshot(self):
+        """Write the current rows to the snapshot file now → entries written."""
+        if not self.snapshot_path:
+            return 0
+        with self._lock:
+            if not self._loaded:
+                return 0
+            items = list(self._rows.items())
+        rows = []
+        for fid, (uid, tpl) in sorted(items):
+            try:
+                rows.append((fid, uid, encode_template(tpl)[0]))
+            except ValueError:
+                pass                # not base64 — cannot be matched anyway
+        try:
+            return gallery_snapshot.write(self.snapshot_path, rows,
+                                          stamp=rows[-1][0] if rows else 0)
+        except OSError as e:
+            print("gallery snapshot not saved:", e)
+            return 0
+
+    def _schedule_save(self):
+        if not self.snapshot_path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return              # one write covers every change until then
+            self._save_timer = threading.Timer(self.SAVE_DELAY, self._save_due)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _save_due(self):
+        with self._lock:
+            self._save_timer = None
+        self.save_snapshot()
+
+    def invalidate(self):
+        """Drop the cache; the next reader triggers a reload."""
+        with self._lock:
+            self._loaded   = False
+            self.source    = None
+            self._rows     = {}
+            self._by_user  = {}
+            self._by_hash  = {}
+            self._changed()
+        self._notify("reset")
+
+    # ── Incremental updates ───────────────────────────────────
+    def add(self, fid, user_id, template):
+        template = decode_template(template)
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(("add", fid, str(user_id), template))
+            if not self._loaded:
+                return              # replayed onto the load in flight, or the next one
+            self._put(fid, str(user_id), template)
+            self._changed()
+        self._notify("add", fid, str(user_id), template)
+        self._schedule_save()
+
+    def remove(self, fid):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(("remove", fid))
+            if not self._drop(fid):
+                return
+            self._changed()
+        if self.stats:
+            self.stats.forget(fid)
+        self._notify("remove", fid)
+        self._schedule_save()
+
+    def _put(self, fid, user_id, template):
+        self._unindex(fid)
+        self._rows[fid] = (user_id, template)
+        self._by_user.setdefault(user_id, []).append(fid)
+        digest = template_digest(template)
+        if digest:
+            self._by_hash.setdefault(digest, fid)
+
+    def _drop(self, fid):
+        self._unindex(fid)
+        return self._rows.pop(fid, None) is not None
+
+    def _unindex(self, fid):
+        row = self._rows.get(fid)
+        if row is not None:
+            fids = self._by_user.get(row[0], [])
+            if fid in fids:
+                fids.remove(fid)
+            if not fids:
+                self._by_user.pop(row[0], None)
+            digest = template_digest(row[1])
+            if self._by_hash.get(digest) == fid:
+                del self._by_hash[digest]
+
+    def record_hit(self, fid):
+        """Successful identification — moves fid towards the front of ordered_entries()."""
+        if self.stats:
+            self.stats.record(fid)
+            with self._lock:
+                self._ordered = None
+
+    # ── Readers ───────────────────────────────────────────────
+    def entries(self):
+        """Immutable tuple of (fid, user_id, template) — safe to iterate unlocked."""
+        self.ensure_loaded()
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = tuple(
+                    (fid, uid, tpl) for fid, (uid, tpl) in self._rows.items()
+                )
+            return self._snapshot
+
+    def ordered_entries(self):
+        """entries() with recently / frequently matched fids first, rest in DB order."""
+        if not self.stats:
+            return self.entries()
+        with self._lock:
+            entries = self.entries()
+            if self._ordered is None:
+                by_fid = {e[0]: e for e in entries}
+                hot    = [by_fid[f] for f in self.stats.ranked() if f in by_fid]
+                seen   = {e[0] for e in hot}
+                self._ordered = tuple(hot) + tuple(e for e in entries if e[0] not in seen)
+            return self._ordered
+
+    def entries_of(self, user_id):
+        """(fid, user_id, template) rows enrolled under one user_id — the
+        candidate set of a 1:1 verify, independent of the gallery size."""
+        self.ensure_loaded()
+        with self._lock:
+            return tuple((fid,) + self._rows[fid] for fid in self._by_user.get(str(user_id), ()))
+
+    def find_exact(self, template):
+        """(fid, user_id) of a stored template with the same bytes, else None.
+        One hash lookup — no biometric compare."""
+        digest = template_digest(template)
+        self.ensure_loaded()
+        with self._lock:
+            fid = self._by_hash.get(digest)
+            return (fid, self._rows[fid][0]) if fid in self._rows else None
+
+    def get(self, fid):
+        with self._lock:
+            return self._rows.get(fid)
+
+    def is_loaded(self):
+        return self._loaded
+
+    def __len__(self):
+        return len(self._rows)
+
+    # ── Listeners ─────────────────────────────────────────────
+    def subscribe(self, fn):
+        """fn(event, *args) with event in {"reset", "add", "remove"}."""
+        self._listeners.append(fn)
+
+    def unsubscribe(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def _changed(self):
+        self._snapshot = None
+        self._ordered  = None
+        self.version  += 1
+
+    def _notify(self, event, *args):
+        for fn in list(self._listeners):
+            try:
+                fn(event, *args)
+            except Exception as e:
+                print(f"gallery listener error ({event}):", e)
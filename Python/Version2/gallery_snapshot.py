@@ -0,0 +1,160 @@
+"""
+gallery_snapshot.py
+───────────────────
+The template gallery as one compact file, read through mmap — the app can
+match right after start-up, and while PostgreSQL is unreachable.
+
+    write(path, rows, stamp)            rows: (fid, user_id, raw template bytes)
+    with Snapshot.open(path) as snap:
+        for fid, uid, raw in snap:      # raw is a memoryview into the mapping
+            ...
+
+Layout (little-endian, version 2):
+
+    header     magic "FPGSNAP\\0", version, count, created (epoch s),
+               stamp (max fid at write time), crc32 of the offsets table,
+               size of the data area, crc32 of the data area
+    offsets    count × (fid, template offset, template length,
+                        user_id offset, user_id length)
+    data       all raw template bytes back to back, then all user_ids (UTF-8)
+
+write() goes to a per-process temp file that is fsync'ed and then renamed
+over `path`, so a reader always sees a whole snapshot — old or new — and
+several kiosk processes on one host can write and read the same file.
+"""
+
+import mmap, os, struct, time, zlib
+
+MAGIC   = b"FPGSNAP\0"
+VERSION = 2                            # 2: data area checksummed too
+
+HEADER = struct.Struct("<8sHHIdqIQI")  # magic, version, reserved, count, created, stamp, crc, data size, data crc
+ENTRY  = struct.Struct("<qQIQH")       # fid, tpl offset, tpl length, uid offset, uid length
+
+
+class SnapshotError(Exception):
+    """Missing, truncated, corrupt or other-version snapshot file."""
+
+
+def write(path, rows, stamp=0):
+    """Write rows atomically (temp file + rename) → number of entries."""
+    rows  = list(rows)
+    uids  = [str(uid).encode("utf-8") for _, uid, _ in rows]
+    index = bytearray()
+    tpl_off = 0
+    uid_off = sum(len(raw) for _, _, raw in rows)
+    data_size = uid_off + sum(len(u) for u in uids)
+    data_crc  = 0
+    for (fid, _, raw), uid in zip(rows, uids):
+        index += ENTRY.pack(fid, tpl_off, len(raw), uid_off, len(uid))
+        tpl_off += len(raw)
+        uid_off += len(uid)
+        data_crc = zlib.crc32(raw, data_crc)
+    for uid in uids:                    # same order as written below
+        data_crc = zlib.crc32(uid, data_crc)
+    header = HEADER.pack(MAGIC, VERSION, 0, len(rows), time.time(), stamp,
+                         zlib.crc32(index), data_size, data_crc)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(index)
+            for _, _, raw in rows:
+                f.write(raw)
+            for uid in uids:
+                f.write(uid)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return len(rows)
+
+
+def _replace(tmp, path, attempts=5):
+    # Windows refuses to replace a file another process has open; readers
+    # only hold it while loading, so a short retry is enough.
+    for i in range(attempts):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            if i == attempts - 1:
+                raise
+            time.sleep(0.1 * (i + 1))
+
+
+class Snapshot:
+    """Read-only view of a snapshot file.  Templates are memoryview slices of
+    the mapping: nothing is copied until the caller converts them."""
+
+    def __init__(self, mm, count, created, stamp):
+        self._mm     = mm
+        self._view   = memoryview(mm)
+        self.count   = count
+        self.created = created
+        self.stamp   = stamp
+
+    @classmethod
+    def open(cls, path):
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:       # ValueError: empty file
+            raise SnapshotError(f"{path}: {e}")
+        try:
+            if len(mm) < HEADER.size:
+                raise SnapshotError(f"{path}: truncated header")
+            magic, version, _, count, created, stamp, crc, data_size, data_crc = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path}: not a gallery snapshot")
+            if version != VERSION:
+                raise SnapshotError(f"{path}: version {version}, expected {VERSION}")
+            end = HEADER.size + count * ENTRY.size
+            if len(mm) != end + data_size:
+                raise SnapshotError(f"{path}: size {len(mm)}, expected {end + data_size}")
+            if zlib.crc32(mm[HEADER.size:end]) != crc:
+                raise SnapshotError(f"{path}: offsets table checksum mismatch")
+            with memoryview(mm) as view:    # torn / bit-rotted templates or user_ids
+                if zlib.crc32(view[end:]) != data_crc:
+                    raise SnapshotError(f"{path}: data checksum mismatch")
+        except BaseException:
+            mm.close()
+            raise
+        return cls(mm, count, created, stamp)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """(fid, user_id, raw template memoryview), in the order written."""
+        base = HEADER.size + self.count * ENTRY.size
+        view = self._view
+        for i in range(self.count):
+            fid, t_off, t_len, u_off, u_len = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+            uid = str(view[base + u_off:base + u_off + u_len], "utf-8")
+            yield fid, uid, view[base + t_off:base + t_off + t_len]
+
+    def age(self):
+        """Seconds since the snapshot was written."""
+        return time.time() - self.created
+
+    def close(self):
+        if self._mm is not None:
+            try:
+                self._view.release()
+                self._mm.close()
+            except BufferError:     # a caller still holds a template slice;
+                pass                # the mapping goes when that is dropped
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,175 @@
+"""
+gallery_sync.py
+───────────────
+Keeps this process's TemplateGallery in step with the other kiosks that
+share the fingerprints table, via LISTEN / NOTIFY
+(Database/Notify_Fingerprint_Changes.sql).
+
+    listener = ChangeListener(POOL, GALLERY)
+    listener.start()
+    ...
+    listener.close()
+
+A thread holds one dedicated connection (outside the pool) listening on
+fingerprints_changed.  Each notification names a changed id; a burst is
+applied together — one SELECT ... WHERE id = ANY(...) for inserts and
+updates, GALLERY.remove() for deletes — and the gallery's listeners
+(matchers, pivot index, RECORDS page) follow through add() / remove().
+
+Every notification carries a sequence number.  A number that is still
+missing GAP_GRACE s later, or a dropped connection, means changes were
+missed: the whole gallery is reloaded instead (GALLERY.refresh()).
+"""
+
+import select, threading, time
+
+import psycopg2
+from psycopg2 import extensions
+
+from gallery import decode_template
+
+CHANNEL = "fingerprints_changed"
+
+
+class ChangeListener:
+    POLL      = 1.0            # s between checks for gaps / deferred changes
+    GAP_GRACE = 2.0            # s a skipped number may still arrive (commit order)
+    MAX_GAP   = 1000           # a wider gap (or backlog) reloads at once
+
+    def __init__(self, pool, gallery, channel=CHANNEL, max_backoff=30.0):
+        self._pool        = pool
+        self._gallery     = gallery
+        self._channel     = channel
+        self._max_backoff = max_backoff
+        self._stop        = threading.Event()
+        self._thread      = None
+        self._conn        = None
+        self._pending     = {}     # fid -> "I" | "U" | "D", waiting to be applied
+        self._missing     = {}     # sequence number -> give-up time
+        self._last        = None   # highest sequence number seen
+        self._stale       = False  # a reload is owed
+        self.applied      = 0
+        self.resyncs      = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.POLL + 1.0)
+
+    # ── Connection ────────────────────────────────────────────
+    def _run(self):
+        backoff, connected = 1.0, False
+        while not self._stop.is_set():
+            try:
+                self._conn = self._pool.dedicated()
+                self._conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with self._conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self._channel}")
+                if connected:
+                    self._stale = True          # whatever happened while away is unknown
+                connected, backoff = True, 1.0
+                self._listen()
+            except psycopg2.Error as e:
+                print(f"gallery sync: {str(e).strip()} — retry in {backoff:.0f}s")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+            except Exception as e:              # bad row / bug — keep syncing, reload to be safe
+                print(f"gallery sync: {type(e).__name__}: {e} — retry in {backoff:.0f}s")
+                self._stale = True
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+            finally:
+                if self._conn is not None:
+                    try:
+                        self._conn.close()
+                    except psycopg2.Error:
+                        pass
+                    self._conn = None
+
+    def _listen(self):
+        conn = self._conn
+        while not self._stop.is_set():
+            if select.select([conn], [], [], self.POLL) != ([], [], []):
+                conn.poll()
+                while conn.notifies:
+                    self._note(conn.notifies.pop(0).payload)
+            now = time.monotonic()
+            if any(t <= now for t in self._missing.values()):
+                self._stale = True
+            if not self._ready():
+                continue                        # the load in flight may miss these; retry after
+            if self._stale:
+                self._resync()
+            elif self._pending:
+                self._apply()
+
+    # ── Notifications ─────────────────────────────────────────
+    def _note(self, payload):
+        try:
+            op, fid, seq = payload.split(":")
+            fid, seq = int(fid), int(seq)
+        except ValueError:
+            print("gallery sync: bad payload", payload)
+            return
+        if self._last is None or seq == self._last + 1:
+            self._last = seq
+        elif seq > self._last + 1:
+            if seq - self._last > self.MAX_GAP:
+                self._stale = True
+            else:
+                give_up = time.monotonic() + self.GAP_GRACE
+                for n in range(self._last + 1, seq):
+                    self._missing[n] = give_up
+            self._last = seq
+        else:
+            self._missing.pop(seq, None)        # late, but arrived
+        self._pending[fid] = op
+        if len(self._pending) > self.MAX_GAP:   # cheaper to reload than to fetch them all
+            self._pending.clear()
+            self._stale = True
+
+    def _ready(self):
+        return self._gallery.is_loaded() and not self._gallery.loading()
+
+    def _apply(self):
+        batch, self._pending = self._pending, {}
+        upsert = [fid for fid, op in batch.items() if op != "D"]
+        rows = []
+        if upsert:
+            try:
+                with self._pool.connection() as conn, conn.cursor() as cur:
+                    cur.execute("SELECT id, user_id, template, template_format FROM fingerprints "
+                                "WHERE id = ANY(%s)", (upsert,))
+                    rows = cur.fetchall()
+            except psycopg2.Error as e:
+                print("gallery sync: fetch failed, retrying:", str(e).strip())
+                self._pending = {**batch, **self._pending}
+                return
+        found = set()
+        for fid, uid, raw, fmt in rows:
+            found.add(fid)
+            tpl = decode_template(raw, fmt)
+            if tpl and self._gallery.get(fid) != (str(uid), tpl):   # our own INSERTs are already in
+                self._gallery.add(fid, uid, tpl)
+        for fid in batch:
+            if fid not in found:                # deleted (or gone before we looked)
+                self._gallery.remove(fid)
+        self.applied += len(batch)
+
+    def _resync(self):
+        self._pending.clear()
+        self._missing.clear()
+        self._last = None
+        try:
+            self._gallery.refresh()
+        except psycopg2.Error as e:
+            print("gallery sync: reload failed:", str(e).strip())
+            return
+        self._stale = False
+        self.resyncs += 1
+        print("gallery sync: missed changes, gallery reloaded")
@@ -0,0 +1,680 @@
+"""
+matcher.py
+──────────
+Fingerprint matcher backends used by VerifyWorker.
+
+    SpawnMatcher     one compare.exe per pair  (legacy path, always available)
+    ParallelMatcher  compare.exe across a worker pool, first hit cancels the rest
+    ResidentMatcher  one long-lived matcher_service.py process that keeps the
+                     gallery loaded and answers identify / compare requests
+    SdkMatcher       in-process libzkfp DB cache (zkfp.py), 1:N in one call
+
+All expose the same interface:
+
+    matcher.compare(a_b64, b_b64)                -> int score | None
+    matcher.compare_many([(a, b), ...])          -> [score | None, ...]
+    matcher.identify(probe_b64, entries, policy, subset=False, deadline=None)
+                                                 -> IdentifyResult
+
+`entries` is the (fid, user_id, template) tuple from TemplateGallery, already
+in the order candidates should be tried (ordered_entries(): hottest first).
+The resident service keeps its own copy and only receives the head of that
+order as a hint (HOT_HINT fids).  subset=True means `entries` is a shortlist
+(pivot_index.py) and nothing outside it may be compared.  `deadline` is a
+time.monotonic() value; the search stops there and reports what it covered.
+`policy` is a SearchPolicy (accept / high thresholds, top-k).
+
+Wire protocol (stdin / stdout of the service):
+    every frame = 4-byte big-endian length + UTF-8 JSON object
+    request  {"id": n, "op": "...", ...}
+    reply    {"id": n, "ok": true, ...} | {"id": n, "ok": false, "error": "..."}
+"""
+
+import heapq, json, os, queue, struct, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+COMPARE_EXE = "Application/compare.exe"
+HOT_HINT    = 256           # fids sent to the resident service as "try these first"
+SERVICE     = os.path.join(os.path.dirname(os.path.abspath(__file__)), "matcher_service.py")
+
+
+class MatcherError(Exception):
+    pass
+
+
+# ══════════════════════════════════════════════════════════════
+# SEARCH POLICY / RESULT
+# ══════════════════════════════════════════════════════════════
+class SearchPolicy:
+    """How far a 1:N search goes and what it reports.
+
+    accept  a candidate is a match when score > accept  (old fixed `> 60`)
+    high    score >= high is treated as certain and stops the search early;
+            None scans the whole gallery and returns the true best match
+    top_k      number of best-scoring candidates kept in the result
+    budget_ms  default latency budget for one identification (None = unbounded)
+    """
+
+    def __init__(self, accept=60, high=None, top_k=1, budget_ms=None):
+        self.accept    = accept
+        self.high      = high
+        self.top_k     = max(1, top_k)
+        self.budget_ms = budget_ms
+
+    @classmethod
+    def from_env(cls):
+        """MATCH_ACCEPT (60), MATCH_HIGH (85, 0 = exhaustive), MATCH_TOP_K (3),
+        MATCH_BUDGET_MS (0 = no deadline)"""
+        return cls(
+            accept=int(os.getenv("MATCH_ACCEPT", "60")),
+            high=int(os.getenv("MATCH_HIGH", "85")) or None,
+            top_k=int(os.getenv("MATCH_TOP_K", "3")),
+            budget_ms=int(os.getenv("MATCH_BUDGET_MS", "0")) or None,
+        )
+
+    def to_dict(self):
+        return {"accept": self.accept, "high": self.high, "top_k": self.top_k,
+                "budget_ms": self.budget_ms}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(**d) if d else cls()
+
+
+class IdentifyResult:
+    """Top-k candidates of one search plus how much work it did.
+
+    Workers feed it through offer(); it is safe to share between threads.
+    When `deadline` passes, offer() asks the search to stop and the result
+    keeps the best-so-far candidates with timed_out set.
+    """
+
+    def __init__(self, policy, total=0, deadline=None):
+        self.policy      = policy
+        self.total       = total          # gallery size at search time
+        self.deadline    = deadline       # time.monotonic() or None
+        self.comparisons = 0
+        self.early_exit  = False
+        self.timed_out   = False
+        self._heap       = []             # (score, -seq, fid, user_id), min-heap of size top_k
+        self._seq        = 0
+        self._lock       = threading.Lock()
+
+    def offer(self, fid, uid, score, count=1):
+        """Record a scored candidate; returns True when the search should stop."""
+        with self._lock:
+            self.comparisons += count
+            if score is None:
+                return self.early_exit
+            self._seq += 1
+            item = (score, -self._seq, fid, uid)
+            if len(self._heap) < self.policy.top_k:
+                heapq.heappush(self._heap, item)
+            elif item > self._heap[0]:
+                heapq.heapreplace(self._heap, item)
+            if self.policy.high is not None and score >= self.policy.high:
+                self.early_exit = True
+            return self.early_exit or self.expired()
+
+    def expired(self):
+        if not self.timed_out and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out = True
+        return self.timed_out
+
+    def remaining(self):
+        """Seconds left before the deadline (None when unbounded)."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def candidates(self):
+        """[(fid, user_id, score)] best first."""
+        with self._lock:
+            ranked = sorted(self._heap, reverse=True)
+        return [(fid, uid, score) for score, _, fid, uid in ranked]
+
+    @property
+    def best(self):
+        c = self.candidates
+        return c[0] if c else None
+
+    @property
+    def match(self):
+        """Best candidate if it clears the accept threshold, else None."""
+        b = self.best
+        return b if b and b[2] > self.policy.accept else None
+
+    @property
+    def status(self):
+        """"match" | "no_match" | "inconclusive" (deadline hit before a match)."""
+        if self.match:
+            return "match"
+        return "inconclusive" if self.timed_out else "no_match"
+
+    @property
+    def coverage(self):
+        """Fraction of the gallery actually compared."""
+        return min(1.0, self.comparisons / self.total) if self.total else 1.0
+
+    def merge(self, other):
+        """Fold a follow-up search (e.g. the rest of the gallery) into this one."""
+        for fid, uid, score in other.candidates:
+            self.offer(fid, uid, score, count=0)
+        self.comparisons += other.comparisons
+        self.early_exit   = self.early_exit or other.early_exit
+        self.timed_out    = self.timed_out or other.timed_out
+        return self
+
+    def to_dict(self):
+        return {"candidates": self.candidates, "comparisons": self.comparisons,
+                "early_exit": self.early_exit, "timed_out": self.timed_out,
+                "total": self.total}
+
+    @classmethod
+    def from_dict(cls, policy, d):
+        r = cls(policy, d.get("total", 0))
+        for fid, uid, score in d["candidates"]:
+            r.offer(fid, uid, score, count=0)
+        r.comparisons = d["comparisons"]
+        r.early_exit  = d["early_exit"]
+        r.timed_out   = d.get("timed_out", False)
+        return r
+
+    def __repr__(self):
+        return (f"IdentifyResult({self.status}, match={self.match}, candidates={self.candidates}, "
+                f"comparisons={self.comparisons}/{self.total}, early_exit={self.early_exit}, "
+                f"timed_out={self.timed_out})")
+
+
+def prioritise(fids, order, subset=False):
+    """fids with those listed in `order` first, the rest in their original order
+    (or dropped when subset=True — then only `order` is walked, so a dict or set
+    of fids keeps the cost independent of the gallery size)."""
+    if not order:
+        return [] if subset else list(fids)
+    present = fids if isinstance(fids, (dict, set, frozenset)) else set(fids)
+    head    = [f for f in order if f in present]
+    if subset:
+        return head
+    first   = set(head)
+    return head + [f for f in fids if f not in first]
+
+
+# ══════════════════════════════════════════════════════════════
+# FRAMING
+# ══════════════════════════════════════════════════════════════
+def write_frame(stream, obj):
+    data = json.dumps(obj, separators=(",", ":")).encode()
+    stream.write(struct.pack(">I", len(data)) + data)
+    stream.flush()
+
+
+def read_frame(stream):
+    """Returns the decoded object, or None on EOF."""
+    head = stream.read(4)
+    if len(head) < 4:
+        return None
+    (n,) = struct.unpack(">I", head)
+    body = stream.read(n)
+    if len(body) < n:
+        return None
+    return json.loads(body.decode())
+
+
+# ══════════════════════════════════════════════════════════════
+# SPAWN MATCHER — one compare.exe per pair
+# ══════════════════════════════════════════════════════════════
+def spawn_compare(a, b, timeout=10):
+    r = subprocess.run([COMPARE_EXE, a, b], capture_output=True, text=True, timeout=timeout)
+    try:
+        return int(r.stdout.strip())
+    except ValueError:
+        return None
+
+
+class SpawnMatcher:
+    def compare(self, a, b):
+        return spawn_compare(a, b)
+
+    def compare_many(self, pairs):
+        return [spawn_compare(a, b) for a, b in pairs]
+
+    def identify(self, probe, entries, policy, subset=False, deadline=None):
+        res = IdentifyResult(policy, len(entries), deadline)
+        for fid, uid, tpl in entries:
+            if res.expired():
+                break
+            left = res.remaining()
+            try:
+                score = spawn_compare(probe, tpl, 10 if left is None else max(0.05, left))
+            except subprocess.TimeoutExpired:
+                res.expired()
+                break
+            if res.offer(fid, uid, score):
+                break
+        return res
+
+    def close(self):
+        pass
+
+
+# ══════════════════════════════════════════════════════════════
+# PARALLEL MATCHER — compare.exe fan-out with first-match cancel
+# ══════════════════════════════════════════════════════════════
+class ParallelMatcher:
+    """Splits the gallery across MATCH_WORKERS threads (default: CPU count).
+
+    Each worker drives its own compare.exe children; the first score at the
+    policy's `high` threshold — or the deadline — sets a stop flag and kills
+    every compare.exe still running.
+    Slices are interleaved (entries[i::n]) so the front of the gallery is
+    still scanned first.
+    """
+
+    def __init__(self, workers=None, timeout=10):
+        self.workers  = workers or int(os.getenv("MATCH_WORKERS", "0")) or os.cpu_count() or 1
+        self._timeout = timeout
+        self._pool    = ThreadPoolExecutor(self.workers, thread_name_prefix="match")
+
+    def compare(self, a, b):
+        return spawn_compare(a, b, self._timeout)
+
+    def compare_many(self, pairs):
+        return list(self._pool.map(lambda ab: spawn_compare(ab[0], ab[1], self._timeout), pairs))
+
+    def identify(self, probe, entries, policy, subset=False, deadline=None):
+        res = IdentifyResult(policy, len(entries), deadline)
+        if not entries:
+            return res
+        stop  = threading.Event()
+        lock  = threading.Lock()
+        procs = set()
+
+        def cancel_all():
+            stop.set()
+            for p in list(procs):
+                try:
+                    p.kill()
+                except OSError:
+                    pass
+
+        def work(chunk):
+            try:
+                scan(chunk)
+            except BaseException:
+                cancel_all()            # the other slices would fail the same way
+                raise
+
+        def scan(chunk):
+            for fid, uid, tpl in chunk:
+                if stop.is_set() or res.expired():
+                    return
+                p = subprocess.Popen([COMPARE_EXE, probe, tpl], stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, text=True)
+                with lock:
+                    procs.add(p)
+                if stop.is_set():
+                    p.kill()
+                try:
+                    out, _ = p.communicate(timeout=self._timeout)
+                except subprocess.TimeoutExpired:
+                    p.kill(); p.communicate()
+                    out = ""
+                finally:
+                    with lock:
+                        procs.discard(p)
+                if stop.is_set():
+                    return
+                try:
+                    score = int(out.strip())
+                except ValueError:
+                    score = None
+                if res.offer(fid, uid, score):
+                    cancel_all()
+                    return
+
+        n    = min(self.workers, len(entries))
+        futs = [self._pool.submit(work, entries[i::n]) for i in range(n)]
+        _, pending = wait(futs, timeout=res.remaining())
+        if pending:                 # deadline hit with compares still in flight
+            res.timed_out = True
+            cancel_all()
+            wait(futs)
+        errors = [f.exception() for f in futs if f.exception() is not None]
+        if errors and res.match is None:    # a failed compare.exe is not a "no match"
+            raise MatcherError(f"compare.exe failed: {errors[0]}") from errors[0]
+        return res
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+
+# ══════════════════════════════════════════════════════════════
+# RESIDENT MATCHER — one service process, gallery loaded once
+# ══════════════════════════════════════════════════════════════
+class ResidentMatcher:
+    """Client for matcher_service.py with health checks and auto-restart.
+
+    The service mirrors the TemplateGallery it is bound to: a full "load"
+    after every (re)start or gallery reset, then add / remove deltas.
+    Requests that still fail after one restart are served by `fallback`.
+    """
+
+    HEALTH_INTERVAL = 30.0     # idle seconds before a ping precedes the next request
+    REPLY_MARGIN    = 2.0      # s past the caller's deadline before the service counts as hung
+    PER_TEMPLATE    = 0.05     # s per template added to `timeout` when there is no deadline
+
+    def __init__(self, gallery, fallback=None, timeout=10.0, cmd=None):
+        self._gallery  = gallery
+        self._fallback = fallback or ParallelMatcher()
+        self._timeout  = timeout              # base reply timeout, see _reply_timeout()
+        self._cmd      = cmd or [sys.executable, SERVICE]
+        self._lock     = threading.Lock()
+        self._state    = threading.Lock()     # _synced / _pending / _load_token
+        self._proc     = None
+        self._replies  = None
+        self._seq      = 0
+        self._synced   = False
+        self._pending  = []
+        self._load_token = None               # identifies the "load" in flight
+        self._last_ok  = 0.0
+        self.restarts  = 0
+        gallery.subscribe(self._on_gallery)
+
+    # ── Public API ────────────────────────────────────────────
+    def compare(self, a, b):
+        try:
+            reply = self._request({"op": "compare", "pairs": [[a, b]]})
+            return reply["scores"][0]
+        except MatcherError as e:
+            print("resident matcher unavailable, using fallback:", e)
+            return self._fallback.compare(a, b)
+
+    def compare_many(self, pairs, batch=256):
+        out = []
+        for i in range(0, len(pairs), batch):
+            chunk = [list(p) for p in pairs[i:i + batch]]
+            try:
+                out += self._request({"op": "compare", "pairs": chunk},
+                                     timeout=self._reply_timeout(len(chunk)))["scores"]
+            except MatcherError as e:
+                print("resident matcher unavailable, using fallback:", e)
+                out += self._fallback.compare_many(chunk)
+        return out
+
+    def identify(self, probe, entries, policy, subset=False, deadline=None):
+        try:
+            head  = entries if subset else (entries or ())[:HOT_HINT]
+            req   = {"op": "identify", "probe": probe, "order": [e[0] for e in head],
+                     "subset": subset, "policy": policy.to_dict()}
+            if deadline is not None:
+                req["budget_ms"] = max(0, int((deadline - time.monotonic()) * 1000))
+            reply = self._request(req, sync=True, deadline=deadline,
+                                  timeout=self._reply_timeout(len(entries) if subset else len(self._gallery)))
+        except MatcherError as e:
+            print("resident matcher unavailable, using fallback:", e)
+            return self._fallback.identify(probe, entries, policy, subset, deadline)
+        res = IdentifyResult.from_dict(policy, reply["result"])
+        res.deadline = deadline
+        return res
+
+    def ping(self):
+        try:
+            self._request({"op": "ping"})
+            return True
+        except MatcherError:
+            return False
+
+    def close(self):
+        with self._lock:
+            self._stop()
+        self._gallery.unsubscribe(self._on_gallery)
+        self._fallback.close()
+
+    # ── Process management ────────────────────────────────────
+    def _start(self):
+        self._proc = subprocess.Popen(
+            self._cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+        self._replies = queue.Queue()
+        threading.Thread(target=self._reader, args=(self._proc, self._replies),
+                         daemon=True).start()
+        self._unsync()
+        self._call({"op": "ping"})
+
+    def _stop(self):
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait(timeout=2)
+            except Exception:
+                pass
+        self._proc = None
+        self._unsync()
+
+    def _restart(self):
+        if self._proc is not None or self._seq:
+            self.restarts += 1
+        self._stop()
+        self._start()
+
+    @staticmethod
+    def _reader(proc, replies):
+        while True:
+            try:
+                msg = read_frame(proc.stdout)
+            except Exception:
+                msg = None
+            replies.put(msg)
+            if msg is None:
+                return
+
+    # ── Request plumbing ──────────────────────────────────────
+    def _reply_timeout(self, n):
+        """Reply timeout for a request touching n templates without a deadline —
+        a fixed one would kill a slow but healthy search of a large gallery."""
+        return self._timeout + n * self.PER_TEMPLATE
+
+    def _request(self, req, sync=False, timeout=None, deadline=None):
+        """timeout: s to wait for the reply (default self._timeout); with a
+        deadline the wait ends REPLY_MARGIN s after it instead."""
+        with self._lock:
+            for attempt in (0, 1):
+                try:
+                    if self._proc is None or self._proc.poll() is not None:
+                        self._restart()
+                    elif time.monotonic() - self._last_ok > self.HEALTH_INTERVAL:
+                        self._call({"op": "ping"}, timeout=2.0)
+                    if sync:
+                        self._sync()
+                    if deadline is not None:
+                        timeout = max(0.0, deadline - time.monotonic()) + self.REPLY_MARGIN
+                    return self._call(req, timeout)
+                except (OSError, MatcherError) as e:
+                    self._stop()
+                    if attempt:
+                        raise MatcherError(str(e))
+
+    def _call(self, req, timeout=None):
+        self._seq += 1
+        req = dict(req, id=self._seq)
+        write_frame(self._proc.stdin, req)
+        deadline = time.monotonic() + (self._timeout if timeout is None else timeout)
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise MatcherError(f"timeout waiting for '{req['op']}'")
+            try:
+                reply = self._replies.get(timeout=left)
+            except queue.Empty:
+                continue
+            if reply is None:
+                raise MatcherError("matcher service exited")
+            if reply.get("id") != req["id"]:
+                continue            # stale reply from a timed-out request
+            if not reply.get("ok"):
+                raise MatcherError(reply.get("error", "matcher error"))
+            self._last_ok = time.monotonic()
+            return reply
+
+    def _sync(self):
+        # Called with self._lock held.  Deltas that arrive while "load" is in
+        # flight stay queued and are replayed after it (add / remove are
+        # idempotent); a reset during the load voids it.
+        with self._state:
+            synced = self._synced
+            if not synced:
+                self._pending    = []
+                self._load_token = token = object()
+        if not synced:
+            entries = [list(e) for e in self._gallery.entries()]
+            self._call({"op": "load", "entries": entries})
+            with self._state:
+                if self._load_token is not token:
+                    return              # reset meanwhile — the next request reloads
+                self._synced, self._load_token = True, None
+        while True:
+            with self._state:
+                if not self._synced or not self._pending:
+                    return
+                op = self._pending[0]
+            self._call(op)
+            with self._state:
+                if self._pending and self._pending[0] is op:
+                    self._pending.pop(0)
+
+    def _unsync(self):
+        with self._state:
+            self._synced, self._pending, self._load_token = False, [], None
+
+    def _on_gallery(self, event, *args):
+        # runs on the writer / listener thread — only queue, never block on the pipe
+        with self._state:
+            if event == "reset":
+                self._synced, self._pending, self._load_token = False, [], None
+            elif not self._synced and self._load_token is None:
+                return                  # the next "load" sends the whole gallery
+            elif event == "add":
+                fid, uid, tpl = args
+                self._pending.append({"op": "add", "entry": [fid, uid, tpl]})
+            elif event == "remove":
+                self._pending.append({"op": "remove", "fid": args[0]})
+
+
+# ══════════════════════════════════════════════════════════════
+# SDK MATCHER — libzkfp DB cache in this process
+# ══════════════════════════════════════════════════════════════
+def sdk_identify(cache, probe, policy, order=None, subset=False, deadline=None):
+    """1:N on a zkfp.DBCache.
+
+    The decision is a single ZKFPM_DBIdentify (the SDK scans every FID and
+    cannot be interrupted): no hit, a hit at or above `high`, or top_k == 1
+    ends there.  Only a hit in the uncertain band (accept < score < high)
+    with top_k > 1 scores the other FIDs with ZKFPM_VerifyByID — fids in
+    `order` first — so near-ties are visible, still honouring the deadline.
+    A subset (shortlist / 1:1 verify) is always scored FID by FID.
+    """
+    if subset:                      # shortlist / 1:1 verify: never touch the whole cache
+        fids = [f for f in order or () if cache.user_of(f) is not None]
+        res  = IdentifyResult(policy, len(fids), deadline)
+    else:
+        res  = IdentifyResult(policy, len(cache), deadline)
+        hit  = cache.identify(probe)
+        if hit is None:
+            res.comparisons = len(cache)
+            return res
+        if res.offer(*hit) or policy.top_k == 1 or hit[2] <= policy.accept:
+            res.comparisons = len(cache)
+            return res
+        fids = [f for f in prioritise(cache.fids(), order) if f != hit[0]]
+    blob = cache.to_blob(probe)
+    for fid in fids:
+        if res.offer(fid, cache.user_of(fid), cache.verify_by_id(fid, blob)):
+            break
+    return res
+
+
+class SdkMatcher:
+    """Mirrors the gallery into a zkfp.DBCache and searches it in-process."""
+
+    def __init__(self, gallery, lib=None):
+        from zkfp import DBCache
+        self._gallery = gallery
+        self._cache   = DBCache(lib)
+        self._lock    = threading.Lock()
+        self._state   = threading.Lock()     # _synced / _pending / _load_token
+        self._synced  = False
+        self._pending = []                   # deltas that arrived during the load
+        self._load_token = None
+        gallery.subscribe(self._on_gallery)
+
+    def compare(self, a, b):
+        return self._cache.match(a, b)
+
+    def compare_many(self, pairs):
+        return [self._cache.match(a, b) for a, b in pairs]
+
+    def identify(self, probe, entries, policy, subset=False, deadline=None):
+        with self._lock:
+            self._sync()
+        order = [e[0] for e in entries] if entries else None
+        return sdk_identify(self._cache, probe, policy, order, subset, deadline)
+
+    def close(self):
+        self._gallery.unsubscribe(self._on_gallery)
+        self._cache.close()
+
+    def _sync(self):
+        # self._lock held.  Same scheme as ResidentMatcher._sync: deltas during
+        # the load are queued and replayed, a reset during it voids the load.
+        with self._state:
+            if self._synced:
+                return
+            self._pending    = []
+            self._load_token = token = object()
+        self._cache.load(self._gallery.entries())
+        while True:
+            with self._state:
+                if self._load_token is not token:
+                    return              # reset meanwhile — the next identify reloads
+                if not self._pending:
+                    self._synced, self._load_token = True, None
+                    return
+                late, self._pending = self._pending, []
+            for event, args in late:
+                self._apply(event, args)
+
+    def _apply(self, event, args):
+        if event == "add":
+            self._cache.add(*args)
+        elif event == "remove":
+            self._cache.remove(args[0])
+
+    def _on_gallery(self, event, *args):
+        with self._state:
+            if event == "reset":
+                self._synced, self._pending, self._load_token = False, [], None
+                return
+            if not self._synced:
+                if self._load_token is not None:
+                    self._pending.append((event, args))
+                return              # otherwise the next load sends the whole gallery
+        self._apply(event, args)
+
+
+# ══════════════════════════════════════════════════════════════
+# FACTORY
+# ══════════════════════════════════════════════════════════════
+def make_matcher(gallery):
+    """MATCHER_MODE=resident (default) | sdk | parallel | spawn"""
+    mode = os.getenv("MATCHER_MODE", "resident").lower()
+    if mode == "spawn":
+        return SpawnMatcher()
+    if mode == "parallel":
+        return ParallelMatcher()
+    if mode == "sdk":
+        try:
+            return SdkMatcher(gallery)
+        except Exception as e:
+            print("libzkfp unavailable, using resident matcher:", e)
+    return ResidentMatcher(gallery)
@@ -0,0 +1,144 @@
+"""
+matcher_service.py
+──────────────────
+Resident matcher process, started and supervised by matcher.ResidentMatcher.
+
+Holds the gallery in memory and answers framed requests on stdin/stdout
+(see matcher.py for the wire format):
+
+    ping                               -> {"backend": "sdk" | "compare.exe", "count": n}
+    load      {"entries": [[fid, uid, tpl], ...]}
+    add       {"entry": [fid, uid, tpl]}
+    remove    {"fid": fid}
+    identify  {"probe": tpl, "policy": {...}, "order": [fid, ...], "subset": false,
+               "budget_ms": 400}
+                                       -> {"result": IdentifyResult.to_dict()}
+    compare   {"pairs": [[a, b], ...]}         -> {"scores": [...]}
+
+Matching uses the libzkfp DB cache (zkfp.py) when the SDK library can be
+loaded, otherwise it falls back to compare.exe over a worker pool.
+"""
+
+import sys, time
+
+from matcher import (read_frame, write_frame, ParallelMatcher, SearchPolicy,
+                     sdk_identify, prioritise)
+
+
+# ══════════════════════════════════════════════════════════════
+# BACKENDS
+# ══════════════════════════════════════════════════════════════
+class SdkBackend:
+    """libzkfp DB cache — identify is one ZKFPM_DBIdentify call."""
+    name = "sdk"
+
+    def __init__(self):
+        from zkfp import DBCache
+        self.cache = DBCache()
+
+    def load(self, entries):
+        self.cache.load(entries)
+
+    def add(self, fid, uid, tpl):
+        self.cache.add(fid, uid, tpl)
+
+    def remove(self, fid):
+        self.cache.remove(fid)
+
+    def identify(self, probe, policy, order=None, subset=False, deadline=None):
+        return sdk_identify(self.cache, probe, policy, order, subset, deadline)
+
+    def compare(self, a, b):
+        return self.cache.match(a, b)
+
+    def __len__(self):
+        return len(self.cache)
+
+
+class ExeBackend:
+    """Plain dict + compare.exe fanned out over ParallelMatcher."""
+    name = "compare.exe"
+
+    def __init__(self):
+        self.gallery = {}           # fid -> (user_id, template)
+        self.matcher = ParallelMatcher()
+
+    def load(self, entries):
+        self.gallery = {fid: (uid, tpl) for fid, uid, tpl in entries}
+
+    def add(self, fid, uid, tpl):
+        self.gallery[fid] = (uid, tpl)
+
+    def remove(self, fid):
+        self.gallery.pop(fid, None)
+
+    def identify(self, probe, policy, order=None, subset=False, deadline=None):
+        g       = self.gallery
+        entries = [(fid,) + g[fid] for fid in prioritise(g, order, subset)]
+        return self.matcher.identify(probe, entries, policy, subset, deadline)
+
+    def compare(self, a, b):
+        return self.matcher.compare(a, b)
+
+    def __len__(self):
+        return len(self.gallery)
+
+
+def make_backend():
+    try:
+        return SdkBackend()
+    except Exception as e:          # library missing / symbol missing / init failed
+        print("libzkfp unavailable, using compare.exe:", e, file=sys.stderr)
+        return ExeBackend()
+
+
+# ══════════════════════════════════════════════════════════════
+# SERVICE LOOP
+# ══════════════════════════════════════════════════════════════
+class MatcherService:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def handle(self, req):
+        op, b = req.get("op"), self.backend
+        if op == "ping":
+            return {"backend": b.name, "count": len(b)}
+        if op == "load":
+            b.load(req["entries"])
+            return {"count": len(b)}
+        if op == "add":
+            b.add(*req["entry"])
+            return {"count": len(b)}
+        if op == "remove":
+            b.remove(req["fid"])
+            return {"count": len(b)}
+        if op == "identify":
+            policy = SearchPolicy.from_dict(req.get("policy"))
+            budget   = req.get("budget_ms")
+            deadline = None if budget is None else time.monotonic() + budget / 1000.0
+            res      = b.identify(req["probe"], policy, req.get("order"),
+                                  req.get("subset", False), deadline)
+            return {"result": res.to_dict()}
+        if op == "compare":
+            return {"scores": [b.compare(x, y) for x, y in req["pairs"]]}
+        raise ValueError(f"unknown op {op!r}")
+
+
+def main():
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr         # stray prints must not corrupt the frame stream
+    service = MatcherService(make_backend())
+    while True:
+        req = read_frame(stdin)
+        if req is None:
+            break
+        try:
+            reply = dict(service.handle(req), ok=True)
+        except Exception as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        reply["id"] = req.get("id")
+        write_frame(stdout, reply)
+
+
+if __name__ == "__main__":
+    main()
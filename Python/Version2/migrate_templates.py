@@ -0,0 +1,107 @@
+"""
+migrate_templates.py
+────────────────────
+Converts legacy fingerprints rows (base64 text stored as bytes) to raw
+template bytes with template_hash / template_size, in batches.
+
+    python migrate_templates.py                 # schema + convert everything
+    python migrate_templates.py --dry-run       # count and validate only
+    python migrate_templates.py --batch 1000
+
+The schema step is Database/Migrate_Raw_Templates.sql (idempotent).  Each
+batch is its own transaction, keyed on id, so the tool can be stopped and
+re-run at any time; the app reads both formats meanwhile.  Rows whose text
+is not valid base64 are reported and left untouched.
+"""
+
+import argparse, os, time
+from dotenv import load_dotenv
+import psycopg2
+from psycopg2.extras import execute_values
+
+from db_pool import ConnectionPool
+from gallery import encode_template, TEMPLATE_BASE64, TEMPLATE_RAW
+
+load_dotenv()
+
+SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      "..", "..", "Database", "Migrate_Raw_Templates.sql")
+
+
+def apply_schema(conn):
+    with open(SCHEMA, encoding="utf-8") as f:
+        sql = f.read()
+    with conn.cursor() as cur:
+        cur.execute(sql)
+    conn.commit()
+
+
+def has_format_column(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'fingerprints' AND column_name = 'template_format'")
+        return cur.fetchone() is not None
+
+
+def convert(conn, batch, dry_run=False):
+    # before the schema step (dry run on an old database) every row is legacy
+    legacy = "template_format = %d AND " % TEMPLATE_BASE64 if has_format_column(conn) else ""
+    last_id, done, bad, saved = 0, 0, [], 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, template FROM fingerprints "
+                f"WHERE {legacy}id > %s ORDER BY id LIMIT %s",
+                (last_id, batch))
+            rows = cur.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            for fid, text in rows:
+                try:
+                    raw, digest = encode_template(bytes(text).decode())
+                except (UnicodeDecodeError, ValueError) as e:
+                    bad.append((fid, str(e)))
+                    continue
+                saved += len(text) - len(raw)
+                updates.append((fid, psycopg2.Binary(raw), len(raw), psycopg2.Binary(digest)))
+            if updates and not dry_run:
+                execute_values(cur, """
+                    UPDATE fingerprints AS f
+                       SET template = v.template, template_size = v.size,
+                           template_hash = v.hash, template_format = %s
+                      FROM (VALUES %%s) AS v (id, template, size, hash)
+                     WHERE f.id = v.id AND f.template_format = %s
+                """ % (TEMPLATE_RAW, TEMPLATE_BASE64), updates)
+        conn.commit()
+        done += len(updates)
+        print(f"  ..id {last_id}: {done} converted")
+    return done, bad, saved
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--batch",   type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = ap.parse_args()
+
+    pool = ConnectionPool.from_env()
+    conn = pool.getconn()
+    try:
+        if not args.dry_run:
+            apply_schema(conn)
+        t0 = time.perf_counter()
+        done, bad, saved = convert(conn, args.batch, args.dry_run)
+    finally:
+        conn.close()
+        pool.close()
+    verb = "would convert" if args.dry_run else "converted"
+    print(f"\n{verb} {done} rows in {time.perf_counter() - t0:.1f}s, "
+          f"{saved / 1024:.1f} KiB smaller")
+    for fid, err in bad:
+        print(f"  skipped id {fid}: {err}")
+
+
+if __name__ == "__main__":
+    main()
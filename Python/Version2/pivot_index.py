@@ -0,0 +1,224 @@
+"""
+pivot_index.py
+──────────────
+LAESA-style pivot index over the template gallery.
+
+A handful of pivot templates is picked once; every gallery template stores
+its score against each pivot.  A probe is scored against the pivots only and
+the gallery is ranked by how close its pivot-score vector is to the probe's
+(L∞ distance — the LAESA lower bound).  Only the best-ranked `shortlist`
+candidates need full compares.
+
+Build cost is N × P compares (P = pivots), each enroll costs P compares and a
+query costs P compares plus the shortlist.  The index follows the gallery
+through its listener hooks (add / remove / reset).  A reset rebuilds it on a
+background thread; until that finishes rank() keeps using the previous
+vectors (entries without one go last), so a scan never waits for N × P
+compares.
+
+Usage:
+    index = PivotIndex(MATCHER, GALLERY, pivots=8, shortlist=32)
+    head, rest = index.split(probe_b64, GALLERY.ordered_entries())
+
+bench_pivot.py measures recall versus speedup for a given pivots/shortlist.
+"""
+
+import random, threading
+
+
+class PivotIndex:
+    def __init__(self, matcher, gallery, pivots=8, shortlist=32, sample=64, seed=7):
+        self._matcher   = matcher
+        self._gallery   = gallery
+        self.n_pivots   = pivots
+        self.shortlist  = shortlist
+        self._sample    = sample
+        self._rng       = random.Random(seed)
+        self._lock      = threading.RLock()
+        self._pivots    = []          # [(fid, template)] — templates kept even if fid is deleted
+        self._vectors   = {}          # fid -> tuple of pivot scores
+        self._built     = False
+        self._gen       = 0           # bumped by every gallery reset
+        self._changes   = None        # fid -> template | None, while a build runs
+        self._builder   = None        # background thread: rebuilds and new vectors
+        self._todo      = {}          # fid -> template enrolled, vector not scored yet
+        gallery.subscribe(self._on_gallery)
+
+    # ── Build ─────────────────────────────────────────────────
+    def build(self, entries=None):
+        """Synchronous build — N × P compares, outside the lock so queries keep
+        using the previous vectors.  Adds / removes meanwhile are applied
+        before the new vectors are installed."""
+        with self._lock:
+            self._changes = {}              # before the read: nothing slips between
+        try:
+            entries = list(entries if entries is not None else self._gallery.entries())
+            pivots  = self._choose_pivots(entries)
+            vectors = {}
+            if pivots:
+                scores = self._matcher.compare_many(
+                    [(tpl, p) for _, _, tpl in entries for _, p in pivots])
+                k = len(pivots)
+                for i, (fid, _, _) in enumerate(entries):
+                    vectors[fid] = self._vector(scores[i * k:(i + 1) * k])
+            while True:
+                with self._lock:
+                    late, self._changes = self._changes, {}
+                    if not late:
+                        self._pivots, self._vectors = pivots, vectors
+                        self._built = True
+                        return
+                for fid, tpl in late.items():
+                    if tpl is None:
+                        vectors.pop(fid, None)
+                    elif pivots:
+                        vectors[fid] = self._vector(
+                            self._matcher.compare_many([(tpl, p) for _, p in pivots]))
+        finally:
+            with self._lock:
+                self._changes = None
+
+    def _choose_pivots(self, entries):
+        """Farthest-first over a random sample: each new pivot is the sample
+        template least similar to the pivots already chosen."""
+        if not entries:
+            return []
+        pool   = self._rng.sample(entries, min(len(entries), self._sample))
+        chosen = [pool.pop(0)]
+        best   = {e[0]: -1 for e in pool}           # fid -> max score to any chosen pivot
+        while pool and len(chosen) < self.n_pivots:
+            last   = chosen[-1][2]
+            scores = self._matcher.compare_many([(e[2], last) for e in pool])
+            for e, s in zip(pool, scores):
+                best[e[0]] = max(best[e[0]], s if s is not None else 0)
+            nxt = min(pool, key=lambda e: best[e[0]])
+            pool.remove(nxt)
+            chosen.append(nxt)
+        return [(fid, tpl) for fid, _, tpl in chosen]
+
+    @staticmethod
+    def _vector(scores):
+        return tuple(s if s is not None else 0 for s in scores)
+
+    def ensure_built(self):
+        """Build now if needed (blocks) — for tools such as bench_pivot.py."""
+        if not self._built:
+            self.build()
+
+    def rebuild_async(self):
+        """Start the background thread (one at a time).  It rebuilds while the
+        index is not built — again if a reset arrives meanwhile — and scores
+        the vectors of new enrollments."""
+        with self._lock:
+            if self._builder is not None:
+                return
+            self._builder = threading.Thread(target=self._background, daemon=True)
+            self._builder.start()
+
+    def _background(self):
+        while True:
+            with self._lock:
+                gen, build = self._gen, not self._built
+                todo, self._todo = self._todo, {}
+                pivots = list(self._pivots)
+                if not build and not todo:
+                    self._builder = None
+                    return
+            if build:                       # the gallery read includes `todo`
+                try:
+                    self.build()
+                except Exception as e:      # retried by the next rank() / reset
+                    print("pivot index rebuild failed:", e)
+                    with self._lock:
+                        self._builder = None
+                    return
+                with self._lock:
+                    if self._gen != gen:
+                        self._built = False
+                continue
+            for fid, tpl in todo.items():
+                scores = self._matcher.compare_many([(tpl, p) for _, p in pivots])
+                with self._lock:
+                    if self._pivots == pivots and fid not in self._todo:
+                        self._vectors[fid] = self._vector(scores)
+
+    # ── Incremental maintenance ───────────────────────────────
+    def add(self, fid, tpl):
+        """Called on the writer / listener thread: only queues — the P
+        compares run on the background thread; until then the fid ranks
+        with the entries that have no vector."""
+        with self._lock:
+            self._vectors.pop(fid, None)    # re-enrolled: the old vector is stale
+            if self._changes is not None:
+                self._changes[fid] = tpl    # the build in progress scores it
+                return
+            if not self._pivots:            # first enrollee of an empty gallery
+                if self._built:
+                    self._built = False
+                    self.rebuild_async()
+                return
+            self._todo[fid] = tpl
+        self.rebuild_async()
+
+    def remove(self, fid):
+        with self._lock:
+            if self._changes is not None:
+                self._changes[fid] = None
+            self._todo.pop(fid, None)
+            self._vectors.pop(fid, None)
+
+    def _on_gallery(self, event, *args):
+        if event == "reset":
+            with self._lock:
+                self._built = False
+                self._gen  += 1
+            self.rebuild_async()
+        elif event == "add":
+            fid, _, tpl = args
+            self.add(fid, tpl)
+        elif event == "remove":
+            self.remove(args[0])
+
+    # ── Query ─────────────────────────────────────────────────
+    def rank(self, probe, entries):
+        """entries sorted by pivot distance to the probe (closest first).
+        Entries without a vector keep their relative order at the end.
+        Never builds: an index that is not built yet is built in the background."""
+        if not self._built:
+            self.rebuild_async()
+        with self._lock:
+            pivots  = list(self._pivots)
+            vectors = self._vectors
+        if not pivots:
+            return list(entries)
+        q      = self._vector(self._matcher.compare_many([(probe, p) for _, p in pivots]))
+        known  = []
+        rest   = []
+        for e in entries:
+            v = vectors.get(e[0])
+            if v is None:
+                rest.append(e)
+            else:
+                known.append((max(abs(a - b) for a, b in zip(v, q)), e))
+        known.sort(key=lambda x: x[0])      # stable: ties keep caller's (hit-stat) order
+        return [e for _, e in known] + rest
+
+    def split(self, probe, entries):
+        """(shortlist, remainder) — full compares go to the shortlist first."""
+        ranked = self.rank(probe, entries)
+        return ranked[:self.shortlist], ranked[self.shortlist:]
+
+    @property
+    def pivot_count(self):
+        return len(self._pivots)
+
+    @property
+    def query_cost(self):
+        """Compares per query: pivots + shortlist."""
+        return self.pivot_count + self.shortlist
+
+    def close(self):
+        self._gallery.unsubscribe(self._on_gallery)
+
+    def __len__(self):
+        return len(self._vectors)
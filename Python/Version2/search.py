@@ -0,0 +1,87 @@
+"""
+search.py
+─────────
+GallerySearch — the one entry point VerifyWorker uses for identification.
+
+Puts the pieces together:
+    TemplateGallery.ordered_entries()   candidate order (hit statistics)
+    PivotIndex.split()                  optional shortlist (pivot_index.py)
+    matcher.identify()                  the actual compares (matcher.py)
+    latency budget                      one deadline for the whole search
+
+verify() is the 1:1 path for a claimed identity (keypad / badge): only the
+claimed user's templates are compared, so its cost does not grow with N.
+
+duplicates() is the enrollment check: an exact content-hash lookup first,
+then a 1:N identify with a looser policy only if that finds nothing.
+"""
+
+import time
+
+from matcher import SearchPolicy
+
+
+class GallerySearch:
+    def __init__(self, gallery, matcher, policy, index=None, index_fallback=True):
+        self.gallery        = gallery
+        self.matcher        = matcher
+        self.policy         = policy
+        self.index          = index
+        self.index_fallback = index_fallback
+
+    def identify(self, probe, budget_ms=None, policy=None):
+        """1:N search → matcher.IdentifyResult.
+
+        budget_ms (default: policy.budget_ms) bounds the whole search; when it
+        runs out the result carries the best-so-far candidates, timed_out and
+        coverage, and status "inconclusive" if nothing was accepted.
+
+        With a pivot index only the shortlist is compared first; the rest of
+        the gallery is searched afterwards only if nothing was accepted and
+        index_fallback is on.  `policy` overrides self.policy for this call.
+        """
+        policy   = policy or self.policy
+        budget   = budget_ms if budget_ms is not None else policy.budget_ms
+        deadline = time.monotonic() + budget / 1000.0 if budget else None
+        rows     = self.gallery.ordered_entries()
+        if self.index is None:
+            return self.matcher.identify(probe, rows, policy, deadline=deadline)
+        head, rest = self.index.split(probe, rows)
+        res = self.matcher.identify(probe, head, policy, subset=True, deadline=deadline)
+        if res.match is None and rest and self.index_fallback and not res.expired():
+            res.merge(self.matcher.identify(probe, rest, policy, subset=True,
+                                            deadline=deadline))
+        res.comparisons += self.index.pivot_count
+        res.total        = len(rows)
+        return res
+
+    def verify(self, probe, user_id, budget_ms=None):
+        """1:1 against the templates enrolled under `user_id` → IdentifyResult.
+
+        Runs through matcher.identify(subset=True), which on the SDK backends
+        is one ZKFPM_VerifyByID per enrolled finger and otherwise a single
+        compare each.  total is the number of templates of that user.
+        """
+        budget   = budget_ms if budget_ms is not None else self.policy.budget_ms
+        deadline = time.monotonic() + budget / 1000.0 if budget else None
+        rows     = self.gallery.entries_of(user_id)
+        return self.matcher.identify(probe, rows, self.policy, subset=True, deadline=deadline)
+
+    def duplicates(self, probe, min_score=None, top_k=3):
+        """Is `probe` already enrolled? → (exact, candidates)
+
+        exact       (fid, user_id) of a stored template with identical bytes —
+                    found by hash, and then no compare runs at all
+        candidates  [(fid, user_id, score)] best first with score > min_score
+                    (default policy.accept); empty when exact is set
+
+        The identify is unbounded (no budget_ms): a missed duplicate costs
+        more than a slow save.
+        """
+        exact = self.gallery.find_exact(probe)
+        if exact is not None:
+            return exact, []
+        accept = self.policy.accept if min_score is None else min_score
+        policy = SearchPolicy(accept=accept, high=self.policy.high, top_k=top_k)
+        res    = self.identify(probe, policy=policy)
+        return None, [c for c in res.candidates if c[2] > accept]
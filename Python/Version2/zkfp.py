@@ -0,0 +1,326 @@
+"""
+zkfp.py
+───────
+ctypes binding for the ZKFinger SDK matcher (libzkfp), see C/libs/include/libzkfp.h.
+
+The algorithm side — DB cache, 1:N identify, 1:1 match, enrollment merge and
+the base64 helpers — lets the matcher run in-process instead of compare.exe;
+Device keeps a reader open for capture_service.py instead of one verify.exe /
+save.exe per scan.
+
+Library lookup order:
+    1. explicit path passed to ZKFPLib(...)
+    2. $ZKFP_LIB
+    3. libzkfp.dll (Windows) / libzkfp.so (elsewhere) on the loader path
+
+On Linux the stub in C/stub/libzkfp_stub.c exports the same symbols:
+    gcc -shared -fPIC -O2 -o libzkfp.so C/stub/libzkfp_stub.c
+    ZKFP_LIB=./libzkfp.so MATCHER_MODE=sdk python fingerprint_app.py
+
+Usage:
+    cache = DBCache()
+    cache.add(fid, "EMP-0042", template_b64)
+    hit = cache.identify(probe_b64)        # -> (fid, user_id, score) | None
+
+    dev = Device()                         # ZKFPM_OpenDevice(0)
+    blob = dev.acquire()                   # -> template bytes | None (no finger)
+"""
+
+import ctypes, os, sys, threading
+
+MAX_TEMPLATE_SIZE  = 2048
+FP_THRESHOLD_CODE  = 1
+FP_MTHRESHOLD_CODE = 2
+PARAM_IMAGE_WIDTH  = 1
+PARAM_IMAGE_HEIGHT = 2
+
+ERRORS = {
+    1:   "ALREADY_INIT",   -1:  "INITLIB",       -2:  "INIT",
+    -3:  "NO_DEVICE",      -4:  "NOT_SUPPORT",   -5:  "INVALID_PARAM",
+    -6:  "OPEN",           -7:  "INVALID_HANDLE", -8: "CAPTURE",
+    -9:  "EXTRACT_FP",     -10: "ABSORT",        -11: "MEMORY_NOT_ENOUGH",
+    -12: "BUSY",           -13: "ADD_FINGER",    -14: "DEL_FINGER",
+    -17: "FAIL",           -18: "CANCEL",        -20: "VERIFY_FP",
+    -22: "MERGE",          -23: "NOT_OPENED",    -24: "NOT_INIT",
+    -25: "ALREADY_OPENED", -26: "LOADIMAGE",     -27: "ANALYSE_IMG",
+    -28: "TIMEOUT",
+}
+
+
+class ZKFPError(Exception):
+    def __init__(self, func, code):
+        self.func = func
+        self.code = code
+        super().__init__(f"{func} failed: {code} ({ERRORS.get(code, 'UNKNOWN')})")
+
+
+def default_library_path():
+    return os.getenv("ZKFP_LIB") or ("libzkfp.dll" if sys.platform == "win32" else "libzkfp.so")
+
+
+# ══════════════════════════════════════════════════════════════
+# LIBRARY
+# ══════════════════════════════════════════════════════════════
+_H    = ctypes.c_void_p
+_BUF  = ctypes.c_char_p
+_UINT = ctypes.c_uint
+_PU   = ctypes.POINTER(ctypes.c_uint)
+
+_SIGNATURES = {
+    "ZKFPM_Init":               (ctypes.c_int, []),
+    "ZKFPM_Terminate":          (ctypes.c_int, []),
+    "ZKFPM_GetDeviceCount":     (ctypes.c_int, []),
+    "ZKFPM_OpenDevice":         (_H,           [ctypes.c_int]),
+    "ZKFPM_CloseDevice":        (ctypes.c_int, [_H]),
+    "ZKFPM_GetParameters":      (ctypes.c_int, [_H, ctypes.c_int, _BUF, _PU]),
+    "ZKFPM_AcquireFingerprint": (ctypes.c_int, [_H, _BUF, _UINT, _BUF, _PU]),
+    "ZKFPM_DBInit":             (_H,           []),
+    "ZKFPM_DBFree":             (ctypes.c_int, [_H]),
+    "ZKFPM_DBAdd":              (ctypes.c_int, [_H, _UINT, _BUF, _UINT]),
+    "ZKFPM_DBDel":              (ctypes.c_int, [_H, _UINT]),
+    "ZKFPM_DBClear":            (ctypes.c_int, [_H]),
+    "ZKFPM_DBCount":            (ctypes.c_int, [_H, _PU]),
+    "ZKFPM_DBIdentify":         (ctypes.c_int, [_H, _BUF, _UINT, _PU, _PU]),
+    "ZKFPM_DBMatch":            (ctypes.c_int, [_H, _BUF, _UINT, _BUF, _UINT]),
+    "ZKFPM_DBMerge":            (ctypes.c_int, [_H, _BUF, _BUF, _BUF, _BUF, _PU]),
+    "ZKFPM_VerifyByID":         (ctypes.c_int, [_H, _UINT, _BUF, _UINT]),
+    "ZKFPM_Base64ToBlob":       (ctypes.c_int, [ctypes.c_char_p, _BUF, _UINT]),
+    "ZKFPM_BlobToBase64":       (ctypes.c_int, [_BUF, _UINT, ctypes.c_char_p, _UINT]),
+}
+
+
+class ZKFPLib:
+    """Loaded libzkfp with ZKFPM_Init / ZKFPM_Terminate reference counting."""
+
+    _instances = {}
+    _guard     = threading.Lock()
+
+    @classmethod
+    def get(cls, path=None):
+        """Shared instance per library path."""
+        path = path or default_library_path()
+        with cls._guard:
+            if path not in cls._instances:
+                cls._instances[path] = cls(path)
+            return cls._instances[path]
+
+    def __init__(self, path=None):
+        self.path  = path or default_library_path()
+        loader     = ctypes.WinDLL if sys.platform == "win32" else ctypes.CDLL
+        self._dll  = loader(self.path)
+        self._refs = 0
+        self._lock = threading.Lock()
+        for name, (res, args) in _SIGNATURES.items():
+            fn = getattr(self._dll, name)
+            fn.restype, fn.argtypes = res, args
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._dll, name)
+
+    def acquire(self):
+        with self._lock:
+            if self._refs == 0:
+                rc = self._dll.ZKFPM_Init()
+                if rc not in (0, 1):        # 1 = ALREADY_INIT
+                    raise ZKFPError("ZKFPM_Init", rc)
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs == 0:
+                self._dll.ZKFPM_Terminate()
+
+    # ── Base64 helpers ────────────────────────────────────────
+    def base64_to_blob(self, b64):
+        if isinstance(b64, str):
+            b64 = b64.encode()
+        buf = ctypes.create_string_buffer(MAX_TEMPLATE_SIZE)
+        n   = self._dll.ZKFPM_Base64ToBlob(b64, buf, MAX_TEMPLATE_SIZE)
+        if n <= 0:
+            raise ZKFPError("ZKFPM_Base64ToBlob", n)
+        return buf.raw[:n]
+
+    def blob_to_base64(self, blob):
+        size = (len(blob) + 2) // 3 * 4 + 1
+        buf  = ctypes.create_string_buffer(size)
+        n    = self._dll.ZKFPM_BlobToBase64(blob, len(blob), buf, size)
+        if n <= 0:
+            raise ZKFPError("ZKFPM_BlobToBase64", n)
+        return buf.value.decode()
+
+
+# ══════════════════════════════════════════════════════════════
+# DB CACHE
+# ══════════════════════════════════════════════════════════════
+class DBCache:
+    """One SDK DB cache handle plus the FID ↔ user_id map.
+
+    FIDs are the fingerprints.id primary keys, so no extra numbering is kept.
+    Every SDK call on the handle is serialised by an internal lock.
+    """
+
+    def __init__(self, lib=None):
+        self.lib   = lib if isinstance(lib, ZKFPLib) else ZKFPLib.get(lib)
+        self._lock = threading.RLock()
+        self.lib.acquire()
+        self._h = self.lib.ZKFPM_DBInit()
+        if not self._h:
+            self.lib.release()
+            raise ZKFPError("ZKFPM_DBInit", 0)
+        self._users = {}            # fid -> user_id
+
+    def to_blob(self, tpl):
+        """base64 str → raw template bytes (bytes pass through)."""
+        return tpl if isinstance(tpl, bytes) else self.lib.base64_to_blob(tpl)
+
+    # ── Gallery maintenance ───────────────────────────────────
+    def load(self, entries):
+        """Replace the cache with (fid, user_id, template) entries."""
+        with self._lock:
+            self.clear()
+            for fid, uid, tpl in entries:
+                try:
+                    self.add(fid, uid, tpl)
+                except ZKFPError as e:
+                    print(f"skip fid {fid}:", e)
+
+    def add(self, fid, user_id, tpl):
+        blob = self.to_blob(tpl)
+        with self._lock:
+            if fid in self._users:
+                self.lib.ZKFPM_DBDel(self._h, fid)
+            rc = self.lib.ZKFPM_DBAdd(self._h, fid, blob, len(blob))
+            if rc != 0:
+                raise ZKFPError("ZKFPM_DBAdd", rc)
+            self._users[fid] = user_id
+
+    def remove(self, fid):
+        with self._lock:
+            if self._users.pop(fid, None) is not None:
+                self.lib.ZKFPM_DBDel(self._h, fid)
+
+    def clear(self):
+        with self._lock:
+            self.lib.ZKFPM_DBClear(self._h)
+            self._users.clear()
+
+    def count(self):
+        n = ctypes.c_uint(0)
+        with self._lock:
+            rc = self.lib.ZKFPM_DBCount(self._h, ctypes.byref(n))
+        if rc != 0:
+            raise ZKFPError("ZKFPM_DBCount", rc)
+        return n.value
+
+    def user_of(self, fid):
+        return self._users.get(fid)
+
+    def fids(self):
+        with self._lock:
+            return list(self._users)
+
+    def fids_of(self, user_id):
+        return [f for f, u in self._users.items() if u == user_id]
+
+    # ── Matching ──────────────────────────────────────────────
+    def identify(self, probe):
+        """1:N in one SDK call → (fid, user_id, score) or None."""
+        blob  = self.to_blob(probe)
+        fid   = ctypes.c_uint(0)
+        score = ctypes.c_uint(0)
+        with self._lock:
+            rc = self.lib.ZKFPM_DBIdentify(self._h, blob, len(blob),
+                                           ctypes.byref(fid), ctypes.byref(score))
+            if rc != 0:
+                return None
+            return fid.value, self._users.get(fid.value), score.value
+
+    def match(self, a, b):
+        """1:1 score between two templates (None on SDK error)."""
+        a, b = self.to_blob(a), self.to_blob(b)
+        with self._lock:
+            s = self.lib.ZKFPM_DBMatch(self._h, a, len(a), b, len(b))
+        return s if s >= 0 else None
+
+    def merge(self, t1, t2, t3):
+        """Registration template from three presses of the same finger."""
+        a, b, c = self.to_blob(t1), self.to_blob(t2), self.to_blob(t3)
+        buf = ctypes.create_string_buffer(MAX_TEMPLATE_SIZE)
+        n   = ctypes.c_uint(MAX_TEMPLATE_SIZE)
+        with self._lock:
+            rc = self.lib.ZKFPM_DBMerge(self._h, a, b, c, buf, ctypes.byref(n))
+        if rc != 0:
+            raise ZKFPError("ZKFPM_DBMerge", rc)
+        return buf.raw[:n.value]
+
+    def verify_by_id(self, fid, probe):
+        """1:1 against a cached FID (None on SDK error / unknown FID)."""
+        blob = self.to_blob(probe)
+        with self._lock:
+            s = self.lib.ZKFPM_VerifyByID(self._h, fid, blob, len(blob))
+        return s if s >= 0 else None
+
+    def close(self):
+        with self._lock:
+            if self._h:
+                self.lib.ZKFPM_DBFree(self._h)
+                self._h = None
+                self._users.clear()
+                self.lib.release()
+
+    def __len__(self):
+        return len(self._users)
+
+
+# ══════════════════════════════════════════════════════════════
+# DEVICE
+# ══════════════════════════════════════════════════════════════
+class Device:
+    """An open fingerprint reader (ZKFPM_OpenDevice) kept across captures."""
+
+    # codes that mean "no finger yet" rather than a broken device
+    IDLE = (-8, -9, -10, -12, -18, -28)   # CAPTURE, EXTRACT_FP, ABSORT, BUSY, CANCEL, TIMEOUT
+
+    def __init__(self, index=0, lib=None):
+        self.lib = lib if isinstance(lib, ZKFPLib) else ZKFPLib.get(lib)
+        self.lib.acquire()
+        try:
+            if self.lib.ZKFPM_GetDeviceCount() <= index:
+                raise ZKFPError("ZKFPM_GetDeviceCount", -3)
+            self._h = self.lib.ZKFPM_OpenDevice(index)
+            if not self._h:
+                raise ZKFPError("ZKFPM_OpenDevice", -6)
+        except Exception:
+            self.lib.release()
+            raise
+        self.width  = self._param(PARAM_IMAGE_WIDTH)
+        self.height = self._param(PARAM_IMAGE_HEIGHT)
+        self._image = ctypes.create_string_buffer(max(1, self.width * self.height))
+
+    def _param(self, code):
+        v = ctypes.c_int(0)
+        n = ctypes.c_uint(ctypes.sizeof(v))
+        rc = self.lib.ZKFPM_GetParameters(self._h, code, ctypes.cast(ctypes.pointer(v), _BUF),
+                                          ctypes.byref(n))
+        return v.value if rc == 0 else 0
+
+    def acquire(self):
+        """One poll of the sensor → template bytes, or None while no finger is down."""
+        tpl = ctypes.create_string_buffer(MAX_TEMPLATE_SIZE)
+        n   = ctypes.c_uint(MAX_TEMPLATE_SIZE)
+        rc  = self.lib.ZKFPM_AcquireFingerprint(self._h, self._image, len(self._image),
+                                                tpl, ctypes.byref(n))
+        if rc == 0:
+            return tpl.raw[:n.value]
+        if rc in self.IDLE:
+            return None
+        raise ZKFPError("ZKFPM_AcquireFingerprint", rc)
+
+    def close(self):
+        if self._h:
+            self.lib.ZKFPM_CloseDevice(self._h)
+            self._h = None
+            self.lib.release()